@@ -1,22 +1,49 @@
 import os
+import time
+import asyncio
 import logging
 import tempfile
 import base64
-from typing import Optional, Tuple
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import io
 from PIL import Image
-import PyPDF2
-from pdf2image import convert_from_path
-import requests
+from page_rasterizer import PDFPageBudget
 import json
+from http_client import shared_http_client
+from ocr_executor import ocr_executor
+from ocr_planner import OCRFallbackPlan
+from document_artifact import DocumentArtifact, as_document
+from blank_page import is_blank_page
 
 logger = logging.getLogger(__name__)
 
+# Языки для Google Vision (немецкие письма, украинские и русские документы)
+GOOGLE_VISION_LANGUAGES = ['de', 'en', 'ru', 'uk']
+# Ограничения images:annotate: до 16 изображений в запросе, размер JSON запроса до ~10 МБ
+GOOGLE_VISION_MAX_BATCH_SIZE = 16
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
 class AlternativeOCRService:
     """Альтернативный OCR сервис с Google Vision API и fallback к простому text extraction"""
     
     def __init__(self):
+        self.google_vision_url = os.environ.get('GOOGLE_VISION_API_URL', 'https://vision.googleapis.com/v1/images:annotate')
         self.google_vision_available = self._check_google_vision_api()
+        # Страницы PDF отправляются пачками: одна пара запрос/ответ на batch_size страниц,
+        # одновременно выполняется до concurrent_batches запросов
+        self.batch_size = min(GOOGLE_VISION_MAX_BATCH_SIZE, max(1, _env_int('GOOGLE_VISION_BATCH_SIZE', 8)))
+        self.batch_max_bytes = max(1, _env_int('GOOGLE_VISION_BATCH_MAX_MB', 8)) * 1024 * 1024
+        self.concurrent_batches = max(1, _env_int('GOOGLE_VISION_CONCURRENT_BATCHES', 2))
+        self.batch_stats = {"batches": 0, "pages": 0, "round_trips_saved": 0}
         
     def _check_google_vision_api(self):
         """Проверка доступности Google Vision API"""
@@ -35,75 +62,81 @@ class AlternativeOCRService:
             logger.error(f"Error checking Google Vision API: {e}")
             return False
     
-    def extract_text_with_google_vision(self, image_content: bytes, languages: list = None) -> str:
-        """Извлечение текста с помощью Google Vision API"""
+    async def extract_text_with_google_vision(self, image_content: Union[bytes, DocumentArtifact], languages: list = None) -> str:
+        """Извлечение текста с помощью Google Vision API (для DocumentArtifact используется его общий base64)"""
         try:
-            api_key = os.environ.get('GOOGLE_VISION_API_KEY')
-            if not api_key:
-                raise Exception("Google Vision API key not found")
-            
-            url = f"https://vision.googleapis.com/v1/images:annotate?key={api_key}"
-            
             # Конвертируем в base64
-            image_base64 = base64.b64encode(image_content).decode('utf-8')
-            
-            # Создаем запрос к API
-            request_data = {
-                "requests": [{
-                    "image": {
-                        "content": image_base64
-                    },
-                    "features": [{
-                        "type": "DOCUMENT_TEXT_DETECTION"
-                    }]
-                }]
-            }
+            if isinstance(image_content, DocumentArtifact):
+                image_base64 = await ocr_executor.run(image_content.base64)
+            else:
+                image_base64 = base64.b64encode(image_content).decode('utf-8')
             
-            # Добавляем языковые hints если указаны
-            if languages:
-                request_data["requests"][0]["imageContext"] = {
-                    "languageHints": languages
-                }
-            
-            # Отправляем запрос
-            response = requests.post(url, json=request_data)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            # Извлекаем текст
-            if "responses" in result and len(result["responses"]) > 0:
-                response_data = result["responses"][0]
-                if "fullTextAnnotation" in response_data:
-                    extracted_text = response_data["fullTextAnnotation"]["text"]
-                    logger.info(f"Google Vision API extracted {len(extracted_text)} characters")
-                    return extracted_text
-                elif "textAnnotations" in response_data and len(response_data["textAnnotations"]) > 0:
-                    extracted_text = response_data["textAnnotations"][0]["description"]
-                    logger.info(f"Google Vision API extracted {len(extracted_text)} characters")
-                    return extracted_text
-            
-            logger.warning("No text found by Google Vision API")
-            return ""
+            extracted_text = (await self._annotate_images([image_base64], languages))[0]
+            if extracted_text:
+                logger.info(f"Google Vision API extracted {len(extracted_text)} characters")
+            else:
+                logger.warning("No text found by Google Vision API")
+            return extracted_text
             
         except Exception as e:
             logger.error(f"Google Vision API error: {e}")
             raise
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Извлечение текста из PDF файла"""
+    async def _annotate_images(self, images_base64: List[str], languages: list = None) -> List[str]:
+        """
+        Один запрос images:annotate для нескольких изображений.
+        Возвращает текст для каждого изображения в порядке запроса (ошибка отдельного изображения - пустая строка).
+        """
+        api_key = os.environ.get('GOOGLE_VISION_API_KEY')
+        if not api_key:
+            raise Exception("Google Vision API key not found")
+        
+        url = f"{self.google_vision_url}?key={api_key}"
+        
+        # Создаем запрос к API; языковые hints если указаны
+        requests = []
+        for image_base64 in images_base64:
+            request = {
+                "image": {"content": image_base64},
+                "features": [{"type": "DOCUMENT_TEXT_DETECTION"}]
+            }
+            if languages:
+                request["imageContext"] = {"languageHints": languages}
+            requests.append(request)
+        
+        # Отправляем запрос (общий пул соединений, без блокировки event loop)
+        response = await shared_http_client.post(url, json={"requests": requests})
+        response.raise_for_status()
+        
+        responses = response.json().get("responses", [])
+        texts = []
+        for index in range(len(images_base64)):
+            # Ответы идут в порядке изображений запроса
+            response_data = responses[index] if index < len(responses) else {}
+            if "error" in response_data:
+                logger.warning(f"Google Vision error for image {index + 1}: {response_data['error'].get('message')}")
+            texts.append(_annotation_text(response_data))
+        return texts
+    
+    def _extract_pdf_text_layer(self, document: DocumentArtifact) -> str:
+        """Текстовый слой PDF (блокирующая операция, выполняется в пуле OCR)"""
+        extracted_text = ""
+        for text in document.pdf_page_texts():
+            if text.strip():
+                extracted_text += text + "\n"
+        return extracted_text
+    
+    async def extract_text_from_pdf(self, pdf_path: Union[str, DocumentArtifact], plan: Optional[OCRFallbackPlan] = None,
+                                    page_budget: Optional[PDFPageBudget] = None) -> str:
+        """Извлечение текста из PDF файла (page_budget - бюджет страниц/времени запроса)"""
+        plan = plan or OCRFallbackPlan()
+        document = as_document(pdf_path, 'application/pdf')
         try:
+            # Сначала пробуем извлечь текст напрямую из PDF (если основной сервис этого еще не сделал)
             extracted_text = ""
-            
-            # Сначала пробуем извлечь текст напрямую из PDF
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    if text.strip():
-                        extracted_text += text + "\n"
+            if plan.should_try("pdf_text_layer"):
+                with plan.attempt("pdf_text_layer") as attempt:
+                    extracted_text = attempt["text"] = await ocr_executor.run(self._extract_pdf_text_layer, document)
             
             # Если текст извлечен успешно, возвращаем его
             if extracted_text.strip():
@@ -113,7 +146,7 @@ class AlternativeOCRService:
             # Если текст не извлечен, пробуем OCR с Google Vision
             if self.google_vision_available:
                 logger.info("Direct PDF text extraction failed, trying OCR with Google Vision...")
-                return self._extract_text_from_pdf_with_google_vision(pdf_path)
+                return await self._extract_text_from_pdf_with_google_vision(document, page_budget, plan)
             
             logger.warning("No text extraction method available for PDF")
             return "PDF содержит изображения, но OCR не доступен"
@@ -122,27 +155,25 @@ class AlternativeOCRService:
             logger.error(f"Error extracting text from PDF: {e}")
             return "Ошибка при извлечении текста из PDF файла"
     
-    def _extract_text_from_pdf_with_google_vision(self, pdf_path: str) -> str:
-        """Извлечение текста из PDF с помощью Google Vision API"""
+    async def _extract_text_from_pdf_with_google_vision(self, pdf_path: Union[str, DocumentArtifact], page_budget: Optional[PDFPageBudget] = None,
+                                                        plan: Optional[OCRFallbackPlan] = None) -> str:
+        """Извлечение текста из PDF с помощью Google Vision API (все страницы в пределах бюджета страниц/времени)"""
+        page_budget = page_budget or PDFPageBudget()
+        plan = plan or OCRFallbackPlan()
+        document = as_document(pdf_path, 'application/pdf')
         try:
-            # Конвертируем PDF в изображения
-            images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=5)
+            # Конвертируем PDF в изображения по одной странице (уже растеризованные страницы берутся из документа)
+            page_count = await ocr_executor.run(lambda: document.page_count)
+            pages = document.iter_pages(page_budget.limit(range(1, page_count + 1)), dpi=300)
+            page_texts = await self.annotate_pdf_pages(pages, plan)
             
             extracted_text = ""
-            for i, image in enumerate(images):
-                # Конвертируем изображение в bytes
-                img_byte_arr = io.BytesIO()
-                image.save(img_byte_arr, format='PNG')
-                img_byte_arr = img_byte_arr.getvalue()
-                
-                # Извлекаем текст с помощью Google Vision
-                try:
-                    page_text = self.extract_text_with_google_vision(img_byte_arr, ['de', 'en', 'ru', 'uk'])
-                    if page_text:
-                        extracted_text += f"--- Страница {i+1} ---\n{page_text}\n\n"
-                except Exception as e:
-                    logger.warning(f"Google Vision failed for page {i+1}: {e}")
-                    continue
+            for page_number in sorted(page_texts):
+                if page_texts[page_number]:
+                    extracted_text += f"--- Страница {page_number} ---\n{page_texts[page_number]}\n\n"
+            
+            if page_budget.truncated:
+                extracted_text += page_budget.truncation_marker()
             
             logger.info(f"Extracted text from PDF with Google Vision: {len(extracted_text)} characters")
             return extracted_text.strip()
@@ -151,17 +182,102 @@ class AlternativeOCRService:
             logger.error(f"Error extracting text from PDF with Google Vision: {e}")
             return "Ошибка при извлечении текста из PDF с помощью OCR"
     
-    def extract_text_from_image(self, image_path: str) -> str:
+    async def annotate_pdf_pages(self, pages: Iterator[Tuple[int, Image.Image]],
+                                 plan: Optional[OCRFallbackPlan] = None) -> Dict[int, str]:
+        """
+        Google Vision для страниц PDF пачками: до batch_size страниц (и batch_max_bytes) в одном
+        запросе images:annotate, до concurrent_batches запросов одновременно. Следующая пачка
+        растеризуется, пока предыдущие ждут ответа; в памяти не больше concurrent_batches + 1 пачек.
+        Возвращает {номер страницы: текст}; порядок восстанавливается по номерам страниц.
+        Пустые страницы и страницы, которые план запроса не разрешает, не отправляются.
+        """
+        plan = plan or OCRFallbackPlan()
+        page_texts: Dict[int, str] = {}
+        in_flight = set()
+        batch, batch_bytes, stack = [], 0, ExitStack()
+        
+        async def send(batch, stack):
+            # Окно одновременных запросов: ждем, пока освободится место
+            while len(in_flight) >= self.concurrent_batches:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.ensure_future(self._annotate_page_batch(batch, stack, page_texts))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            # Задача, отмененная до старта, не войдет в "with stack": попытки пачки закрываются здесь
+            task.add_done_callback(lambda _: stack.close())
+        
+        try:
+            while True:
+                # Растеризация и PNG кодирование страницы - в пуле OCR, запросы к API - асинхронно
+                page = await ocr_executor.run(_next_page_png, pages)
+                if page is None:
+                    break
+                page_number, img_byte_arr = page
+                if img_byte_arr is None:
+                    # Пустая страница не отправляется в платный API
+                    continue
+                
+                target = f"page {page_number}"
+                if not plan.should_try("google_vision", target=target):
+                    continue
+                page_base64 = base64.b64encode(img_byte_arr).decode('utf-8')
+                if batch and batch_bytes + len(page_base64) > self.batch_max_bytes:
+                    await send(batch, stack)
+                    batch, batch_bytes, stack = [], 0, ExitStack()
+                # Попытка начинается при добавлении в пачку: стоимость страницы учитывается в бюджете плана сразу
+                attempt = stack.enter_context(plan.attempt("google_vision", target=target))
+                batch.append((page_number, page_base64, attempt))
+                batch_bytes += len(page_base64)
+                if len(batch) >= self.batch_size:
+                    await send(batch, stack)
+                    batch, batch_bytes, stack = [], 0, ExitStack()
+            
+            if batch:
+                await send(batch, stack)
+                batch, batch_bytes, stack = [], 0, ExitStack()
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        finally:
+            # Ошибка растеризации или отмена запроса: закрываем попытки неотправленной пачки
+            # и отменяем запросы в полете, чтобы они не пережили вызов
+            stack.close()
+            pending = list(in_flight)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return page_texts
+    
+    async def _annotate_page_batch(self, batch: List[Tuple[int, str, dict]], stack: ExitStack, page_texts: Dict[int, str]):
+        """Один запрос для пачки страниц; ошибка запроса записывается в план для всех страниц пачки"""
+        page_numbers = [page_number for page_number, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            with stack:
+                texts = await self._annotate_images([page_base64 for _, page_base64, _ in batch], GOOGLE_VISION_LANGUAGES)
+                for (page_number, _, attempt), text in zip(batch, texts):
+                    attempt["text"] = page_texts[page_number] = text
+        except Exception as e:
+            logger.warning(f"Google Vision failed for pages {page_numbers}: {e}")
+            return
+        self.batch_stats["batches"] += 1
+        self.batch_stats["pages"] += len(batch)
+        self.batch_stats["round_trips_saved"] += len(batch) - 1
+        logger.info(f"Google Vision batch of {len(batch)} pages {page_numbers[0]}-{page_numbers[-1]}: "
+                    f"{time.perf_counter() - started:.2f}s")
+    
+    async def extract_text_from_image(self, image_path: Union[str, DocumentArtifact], plan: Optional[OCRFallbackPlan] = None) -> str:
         """Извлечение текста из изображения"""
+        plan = plan or OCRFallbackPlan()
         try:
-            # Читаем изображение как bytes
-            with open(image_path, 'rb') as f:
-                image_content = f.read()
+            # Изображение читается и кодируется в base64 один раз на документ
+            image_content = as_document(image_path)
             
             # Если доступен Google Vision API, используем его
-            if self.google_vision_available:
+            if self.google_vision_available and plan.should_try("google_vision", target="image"):
                 try:
-                    text = self.extract_text_with_google_vision(image_content, ['de', 'en', 'ru', 'uk'])
+                    with plan.attempt("google_vision", target="image") as attempt:
+                        text = attempt["text"] = await self.extract_text_with_google_vision(image_content, GOOGLE_VISION_LANGUAGES)
                     if text:
                         logger.info(f"Google Vision extracted {len(text)} characters from image")
                         return text
@@ -176,17 +292,24 @@ class AlternativeOCRService:
             logger.error(f"Error extracting text from image: {e}")
             return "Ошибка при извлечении текста из изображения"
     
-    def process_document(self, file_path: str, file_type: str) -> Tuple[str, str]:
-        """Обработка документа - извлечение текста и определение типа обработки"""
+    async def process_document(self, file_path: Union[str, DocumentArtifact], file_type: str,
+                               plan: Optional[OCRFallbackPlan] = None,
+                               page_budget: Optional[PDFPageBudget] = None) -> Tuple[str, str]:
+        """
+        Обработка документа - извлечение текста и определение типа обработки.
+        page_budget - бюджет страниц/времени запроса: при fallback продолжается, а не начинается заново.
+        """
+        document = as_document(file_path, file_type)
+        file_path = document.path
         try:
             extracted_text = ""
             processing_method = "unknown"
             
             if file_type.lower() == 'pdf' or file_path.lower().endswith('.pdf'):
-                extracted_text = self.extract_text_from_pdf(file_path)
+                extracted_text = await self.extract_text_from_pdf(document, plan, page_budget)
                 processing_method = "pdf_extraction" if not self.google_vision_available else "pdf_google_vision"
             elif file_type.startswith('image/') or any(file_path.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']):
-                extracted_text = self.extract_text_from_image(file_path)
+                extracted_text = await self.extract_text_from_image(document, plan)
                 processing_method = "google_vision_ocr" if self.google_vision_available else "no_ocr"
             else:
                 # Пробуем как текстовый файл
@@ -221,5 +344,25 @@ class AlternativeOCRService:
         
         return len(meaningful_words) > 3
 
+def _annotation_text(response_data: dict) -> str:
+    """Текст из ответа Google Vision для одного изображения"""
+    if "fullTextAnnotation" in response_data:
+        return response_data["fullTextAnnotation"]["text"]
+    if response_data.get("textAnnotations"):
+        return response_data["textAnnotations"][0]["description"]
+    return ""
+
+def _next_page_png(pages) -> Optional[Tuple[int, Optional[bytes]]]:
+    """Следующая страница PDF в виде PNG байтов (None, если страниц больше нет; байты None - пустая страница)"""
+    page = next(pages, None)
+    if page is None:
+        return None
+    page_number, image = page
+    if is_blank_page(image):
+        return page_number, None
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format='PNG')
+    return page_number, img_byte_arr.getvalue()
+
 # Глобальный экземпляр альтернативного OCR сервиса
 alternative_ocr_service = AlternativeOCRService()
\ No newline at end of file
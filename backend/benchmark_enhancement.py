@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк профилей улучшения изображений (fast/balanced/accurate).
+Для каждого профиля: миллисекунды на каждый этап цепочки и, если доступен Tesseract,
+время каскада и точность (CER по эталонному тексту).
+
+Запуск:
+    python benchmark_enhancement.py [каталог_с_изображениями] [--repeat N] [--profiles fast accurate]
+Для каждого изображения в каталоге может лежать эталон <имя>.txt.
+"""
+import sys
+import time
+import argparse
+sys.path.append('.')
+
+from PIL import Image
+from image_enhancement import enhancement_pipeline, ENHANCEMENT_PROFILES
+from image_normalizer import normalize_for_ocr
+from improved_ocr_service import improved_ocr_service
+from benchmark_utils import load_corpus, character_error_rate
+
+
+def run_profile(corpus, profile: str, repeat: int):
+    """Прогон корпуса с одним профилем: (мс по этапам, мс цепочки, секунды OCR, средний CER)"""
+    stage_ms = {stage_name: 0.0 for stage_name in ENHANCEMENT_PROFILES[profile]}
+    total_ms = 0.0
+    ocr_seconds = 0.0
+    cers = []
+    for image_path, reference in corpus:
+        image = normalize_for_ocr(Image.open(image_path))
+        image.load()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            _, timings = enhancement_pipeline.run(image, profile)
+            total_ms += (time.perf_counter() - started) * 1000 / repeat
+            for stage_name, elapsed_ms in timings.items():
+                stage_ms[stage_name] += elapsed_ms / repeat
+
+        if improved_ocr_service.tesseract_available:
+            started = time.perf_counter()
+            text, _, _ = improved_ocr_service._run_tesseract_cascade(image, enhancement_profile=profile)
+            ocr_seconds += time.perf_counter() - started
+            if reference:
+                cers.append(character_error_rate(reference, text))
+
+    images = len(corpus) or 1
+    stage_ms = {stage_name: elapsed_ms / images for stage_name, elapsed_ms in stage_ms.items()}
+    mean_cer = sum(cers) / len(cers) if cers else None
+    return stage_ms, total_ms / images, ocr_seconds / images, mean_cer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR image enhancement profiles")
+    parser.add_argument('corpus_dir', nargs='?', help="Directory with page images and <name>.txt references")
+    parser.add_argument('--repeat', type=int, default=3, help="Enhancement runs per image")
+    parser.add_argument('--profiles', nargs='+', default=list(ENHANCEMENT_PROFILES), choices=list(ENHANCEMENT_PROFILES))
+    args = parser.parse_args()
+
+    print("🧪 БЕНЧМАРК ПРОФИЛЕЙ УЛУЧШЕНИЯ ИЗОБРАЖЕНИЙ")
+    print("=" * 60)
+
+    corpus = load_corpus(args.corpus_dir)
+    print(f"Изображений: {len(corpus)}, повторов: {args.repeat}")
+    if not improved_ocr_service.tesseract_available:
+        print("⚠️ Tesseract недоступен - измеряется только время этапов")
+
+    results = {}
+    for profile in args.profiles:
+        stage_ms, total_ms, ocr_seconds, mean_cer = run_profile(corpus, profile, args.repeat)
+        results[profile] = (total_ms, ocr_seconds, mean_cer)
+        print(f"\n📊 Профиль {profile}: {' -> '.join(ENHANCEMENT_PROFILES[profile])}")
+        for stage_name, elapsed_ms in stage_ms.items():
+            print(f"   {stage_name:20s} {elapsed_ms:8.1f} мс")
+        print(f"   {'итого':20s} {total_ms:8.1f} мс на изображение")
+        if improved_ocr_service.tesseract_available:
+            cer_text = f"{mean_cer:.3f}" if mean_cer is not None else "n/a"
+            print(f"   Каскад Tesseract: {ocr_seconds:.2f}s на изображение, средний CER={cer_text}")
+
+    print("\n" + "=" * 60)
+    print(f"{'Профиль':12s} {'Улучшение, мс':>14s} {'OCR, с':>8s} {'CER':>8s}")
+    for profile, (total_ms, ocr_seconds, mean_cer) in results.items():
+        ocr_text = f"{ocr_seconds:.2f}" if improved_ocr_service.tesseract_available else "n/a"
+        cer_text = f"{mean_cer:.3f}" if mean_cer is not None else "n/a"
+        print(f"{profile:12s} {total_ms:14.1f} {ocr_text:>8s} {cer_text:>8s}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк предварительного определения языков страницы.
+Сравнивает полный набор ukr+rus+deu+eng и набор, выбранный по письменности страницы:
+скорость (страниц в секунду) и точность (CER по эталонному тексту).
+
+Запуск:
+    python benchmark_language_detection.py [каталог_с_изображениями] [--repeat N]
+Для каждого изображения в каталоге может лежать эталон <имя>.txt.
+"""
+import sys
+import time
+import argparse
+sys.path.append('.')
+
+from PIL import Image
+from improved_ocr_service import improved_ocr_service
+from benchmark_utils import load_corpus, character_error_rate
+
+
+def run_mode(corpus, detect_languages: bool, repeat: int):
+    """Прогон корпуса в одном режиме: (секунды, средний CER, результаты по файлам)"""
+    improved_ocr_service.language_detection_enabled = detect_languages
+    full_languages = "+".join(improved_ocr_service.tesseract_languages)
+
+    total_seconds = 0.0
+    rows = []
+    for image_path, reference in corpus:
+        image = Image.open(image_path)
+        image.load()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            languages = None if detect_languages else full_languages
+            text, stage, _ = improved_ocr_service._run_tesseract_cascade(image, languages)
+        elapsed = (time.perf_counter() - started) / repeat
+        total_seconds += elapsed
+        cer = character_error_rate(reference, text) if reference else None
+        rows.append((image_path, elapsed, cer, stage))
+
+    cers = [cer for _, _, cer, _ in rows if cer is not None]
+    mean_cer = sum(cers) / len(cers) if cers else None
+    return total_seconds, mean_cer, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page language detection for Tesseract")
+    parser.add_argument('corpus_dir', nargs='?', help="Directory with page images and <name>.txt references")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per image")
+    args = parser.parse_args()
+
+    print("🔍 БЕНЧМАРК ОПРЕДЕЛЕНИЯ ЯЗЫКОВ СТРАНИЦЫ")
+    print("=" * 60)
+
+    if not improved_ocr_service.tesseract_available:
+        print("❌ Tesseract недоступен - бенчмарк невозможен")
+        return 1
+
+    corpus = load_corpus(args.corpus_dir)
+    print(f"Страниц в корпусе: {len(corpus)}, повторов: {args.repeat}")
+    print(f"OSD доступен: {improved_ocr_service.tesseract_osd_available}")
+
+    results = {}
+    for mode_name, detect in (("all_languages", False), ("detected_languages", True)):
+        seconds, mean_cer, rows = run_mode(corpus, detect, args.repeat)
+        results[mode_name] = (seconds, mean_cer)
+        print(f"\n📊 Режим {mode_name}:")
+        for image_path, elapsed, cer, stage in rows:
+            cer_text = f"{cer:.3f}" if cer is not None else "n/a"
+            print(f"   {image_path}: {elapsed:.2f}s, CER={cer_text}, stage={stage}")
+        pages_per_second = len(corpus) / seconds if seconds else 0.0
+        cer_text = f"{mean_cer:.3f}" if mean_cer is not None else "n/a"
+        print(f"   Итого: {pages_per_second:.2f} стр/с, средний CER={cer_text}")
+
+    base_seconds, base_cer = results["all_languages"]
+    detected_seconds, detected_cer = results["detected_languages"]
+    print("\n" + "=" * 60)
+    if detected_seconds:
+        print(f"⚡ Ускорение: x{base_seconds / detected_seconds:.2f}")
+    if base_cer is not None and detected_cer is not None:
+        print(f"🎯 Изменение CER: {detected_cer - base_cer:+.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
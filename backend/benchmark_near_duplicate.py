@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска повторных фото письма (near_duplicate.py).
+1. Качество хэша: расстояния Хэмминга между фото одного письма и между разными письмами,
+   доля найденных повторов и ложных совпадений при порогах OCR_NEAR_DUPLICATE_*.
+2. Скорость: время хэша одного фото и время поиска по индексу растущего размера.
+
+Запуск:
+    python benchmark_near_duplicate.py [каталог_с_фото] [--letters 8] [--photos 4] [--sizes 100 1000 10000 100000]
+В каталоге фото одного письма имеют общий префикс до последнего "_" (bescheid_1.jpg, bescheid_2.jpg).
+Без каталога используются синтетические письма по одному шаблону (шапка, адрес, реквизиты, подвал)
+и их "фото": поворот, фон вокруг листа, неравномерный свет, размытие, JPEG.
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+from itertools import combinations
+sys.path.append('.')
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from near_duplicate import (perceptual_hash, hash_words, hamming_distances, HASH_WORDS,
+                            OCR_NEAR_DUPLICATE_MAX_DISTANCE, OCR_NEAR_DUPLICATE_REUSE_DISTANCE)
+from benchmark_utils import _find_font, IMAGE_EXTENSIONS
+
+BODY_WORDS = ("Sehr geehrte Damen und Herren Bescheid Einkommensteuer Betrag Frist Einspruch "
+              "Zahlung Konto bitte innerhalb eines Monats Nachweis Unterlagen Antrag").split()
+
+
+def synthetic_letter(seed: int) -> Image.Image:
+    """Письмо A4 (150 dpi) по общему шаблону ведомства; отличается только текст письма"""
+    font, _ = _find_font(28)
+    image = Image.new('L', (1240, 1754), 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((100, 80), "Finanzamt Berlin-Mitte  Postfach 12 34  10115 Berlin", font=font, fill=0)
+    draw.multiline_text((100, 300), "Herrn Max Mustermann\nMusterstr. 1\n10115 Berlin", font=font, fill=0)
+    draw.multiline_text((800, 300), "Steuernummer 12/345/67890\nDatum 12.03.2024", font=font, fill=0)
+    rng = random.Random(seed)
+    for line in range(rng.randint(8, 22)):
+        words = " ".join(rng.choice(BODY_WORDS) for _ in range(rng.randint(3, 9)))
+        draw.text((100, 600 + line * 40), words, font=font, fill=0)
+    draw.text((100, 1650), "Bankverbindung IBAN DE12 3456 7890   Telefon 030 1234", font=font, fill=0)
+    return image
+
+
+def photograph(letter: Image.Image, seed: int) -> Image.Image:
+    """'Фото' письма: наклон, фон вокруг листа, градиент освещения, размытие, масштаб и JPEG"""
+    rng = random.Random(seed)
+    page = letter.rotate(rng.uniform(-4, 4), expand=True, fillcolor=255, resample=Image.BILINEAR)
+    photo = Image.new('L', (int(page.width * 1.15), int(page.height * 1.12)), rng.randint(60, 140))
+    photo.paste(page, (rng.randint(10, int(page.width * 0.15) - 10), rng.randint(10, int(page.height * 0.12) - 10)))
+    pixels = np.asarray(photo, dtype=np.float32)
+    light = np.linspace(rng.uniform(0.6, 1.0), rng.uniform(0.8, 1.1), pixels.shape[1])[None, :]
+    pixels = np.clip(pixels * light + rng.uniform(-20, 20), 0, 255).astype(np.uint8)
+    photo = Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(rng.uniform(0.5, 1.5)))
+    photo = photo.resize((int(photo.width * rng.uniform(0.6, 1.2)), int(photo.height * rng.uniform(0.6, 1.2))))
+    buffer = io.BytesIO()
+    photo.convert('RGB').save(buffer, 'JPEG', quality=70)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def synthetic_groups(letters: int, photos: int):
+    """{письмо: [фото]} - оригинал письма и несколько его фото"""
+    groups = {}
+    for letter_number in range(letters):
+        letter = synthetic_letter(letter_number)
+        groups[f"letter_{letter_number}"] = [letter] + [photograph(letter, letter_number * 100 + n) for n in range(photos)]
+    return groups
+
+
+def load_groups(corpus_dir: str):
+    """Фото из каталога, сгруппированные по префиксу имени до последнего '_'"""
+    groups = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            groups.setdefault(os.path.splitext(name)[0].rsplit('_', 1)[0], []).append(
+                Image.open(os.path.join(corpus_dir, name))
+            )
+    return groups
+
+
+def measure_quality(groups):
+    """Расстояния между фото одного письма и между фото разных писем; среднее время хэша"""
+    hashes, hash_seconds = {}, []
+    for name, images in groups.items():
+        for image in images:
+            started = time.perf_counter()
+            hashes.setdefault(name, []).append(hash_words(perceptual_hash(image)))
+            hash_seconds.append(time.perf_counter() - started)
+
+    same, different = [], []
+    for name, words in hashes.items():
+        for first, second in combinations(words, 2):
+            same.append(int(hamming_distances(first[None, :], second)[0]))
+    for first_name, second_name in combinations(hashes, 2):
+        for first in hashes[first_name]:
+            distances = hamming_distances(np.vstack(hashes[second_name]), first)
+            different.extend(int(distance) for distance in distances)
+    return same, different, sum(hash_seconds) / len(hash_seconds)
+
+
+def measure_lookup(sizes, repeat: int = 200):
+    """Время поиска ближайшего хэша в индексе из N случайных хэшей (миллисекунды)"""
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sizes:
+        index = rng.integers(0, 2 ** 63, size=(size, HASH_WORDS), dtype=np.uint64)
+        query = index[size // 2].copy()
+        query[0] ^= np.uint64(0b1011)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            distances = hamming_distances(index, query)
+            best = int(np.argmin(distances))
+        elapsed_ms = (time.perf_counter() - started) / repeat * 1000
+        assert best == size // 2 and distances[best] == 3
+        results.append((size, elapsed_ms))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark perceptual-hash near-duplicate detection")
+    parser.add_argument('corpus_dir', nargs='?', help="Directory with photos grouped by name prefix")
+    parser.add_argument('--letters', type=int, default=8, help="Synthetic letters")
+    parser.add_argument('--photos', type=int, default=4, help="Synthetic photos per letter")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000], help="Index sizes for lookup timing")
+    args = parser.parse_args()
+
+    print("🔍 БЕНЧМАРК ПОИСКА ПОВТОРНЫХ ФОТО ПИСЕМ")
+    print("=" * 60)
+
+    groups = load_groups(args.corpus_dir) if args.corpus_dir else synthetic_groups(args.letters, args.photos)
+    print(f"Писем: {len(groups)}, изображений: {sum(len(images) for images in groups.values())}")
+
+    same, different, hash_seconds = measure_quality(groups)
+    print(f"⏱️ Хэш одного изображения: {hash_seconds * 1000:.1f} мс")
+    print(f"📊 Одно письмо:   среднее {np.mean(same):.1f}, 95% {np.percentile(same, 95):.0f}, макс {max(same)} бит из 256")
+    if different:
+        print(f"📊 Разные письма: среднее {np.mean(different):.1f}, 5% {np.percentile(different, 5):.0f}, мин {min(different)} бит из 256")
+
+    print("\n" + "=" * 60)
+    print(f"{'Порог':>6s} {'Найдено повторов':>17s} {'Ложных совпадений':>18s}")
+    for threshold in sorted({OCR_NEAR_DUPLICATE_REUSE_DISTANCE, OCR_NEAR_DUPLICATE_MAX_DISTANCE, 16, 32}):
+        found = sum(distance <= threshold for distance in same) / len(same)
+        false_matches = sum(distance <= threshold for distance in different) / len(different) if different else 0.0
+        print(f"{threshold:6d} {found:17.1%} {false_matches:18.1%}")
+
+    print("\n" + "=" * 60)
+    print(f"{'Размер индекса':>15s} {'Поиск, мс':>10s}")
+    for size, elapsed_ms in measure_lookup(args.sizes):
+        print(f"{size:15d} {elapsed_ms:10.3f}")
+    print(f"\nПороги: OCR_NEAR_DUPLICATE_MAX_DISTANCE={OCR_NEAR_DUPLICATE_MAX_DISTANCE} (предложить), "
+          f"OCR_NEAR_DUPLICATE_REUSE_DISTANCE={OCR_NEAR_DUPLICATE_REUSE_DISTANCE} (использовать автоматически)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
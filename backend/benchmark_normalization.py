@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк нормализации изображений перед OCR.
+Сравнивает текущую обработку в полном разрешении (декодирование + улучшение изображения)
+и нормализацию (JPEG draft, EXIF ориентация, уменьшение до OCR_TARGET_DPI) перед улучшением:
+время подготовки, размер изображения и, если доступен Tesseract, время каскада и CER.
+
+Запуск:
+    python benchmark_normalization.py [каталог_с_фото] [--repeat N]
+Для каждого фото в каталоге может лежать эталон <имя>.txt.
+Без каталога используются синтетические фото письма 4000x3000 (JPEG).
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.append('.')
+
+from PIL import Image, ImageDraw
+
+import image_normalizer
+from improved_ocr_service import improved_ocr_service
+from image_enhancement import enhancement_pipeline
+from benchmark_utils import load_corpus, character_error_rate, SAMPLE_LETTERS, _find_font
+
+
+def create_synthetic_photos():
+    """Синтетические фото письма: 4000x3000 JPEG, текст занимает лист в кадре"""
+    font, has_cyrillic = _find_font(72)
+    corpus_dir = tempfile.mkdtemp(prefix="ocr_photo_bench_")
+    corpus = []
+    for lang, text in SAMPLE_LETTERS.items():
+        if lang != 'deu' and not has_cyrillic:
+            continue
+        image = Image.new('RGB', (4000, 3000), (235, 230, 220))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((300, 150, 3700, 2850), fill='white')
+        draw.multiline_text((450, 350), text, fill='black', font=font, spacing=40)
+        path = os.path.join(corpus_dir, f"photo_{lang}.jpg")
+        image.save(path, quality=90)
+        corpus.append((path, text))
+    return corpus
+
+
+def prepare(image_path: str, normalize: bool):
+    """Декодирование и подготовка изображения так, как это делает каскад Tesseract"""
+    image = Image.open(image_path)
+    if normalize:
+        image = image_normalizer.normalize_for_ocr(image)
+    image.load()
+    return enhancement_pipeline.enhance(image), image.size
+
+
+def run_mode(corpus, normalize: bool, repeat: int):
+    """Прогон корпуса в одном режиме: список (файл, секунды подготовки, размер, секунды OCR, CER)"""
+    image_normalizer.OCR_NORMALIZE_ENABLED = normalize
+    rows = []
+    for image_path, reference in corpus:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            _, size = prepare(image_path, normalize)
+        prepare_seconds = (time.perf_counter() - started) / repeat
+
+        ocr_seconds, cer = None, None
+        if improved_ocr_service.tesseract_available:
+            started = time.perf_counter()
+            text, _, _ = improved_ocr_service._run_tesseract_cascade(Image.open(image_path))
+            ocr_seconds = time.perf_counter() - started
+            cer = character_error_rate(reference, text) if reference else None
+        rows.append((image_path, prepare_seconds, size, ocr_seconds, cer))
+    return rows
+
+
+def _total(rows, index):
+    values = [row[index] for row in rows if row[index] is not None]
+    return sum(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image normalization before OCR")
+    parser.add_argument('corpus_dir', nargs='?', help="Directory with letter photos and <name>.txt references")
+    parser.add_argument('--repeat', type=int, default=3, help="Preparation runs per image")
+    args = parser.parse_args()
+
+    print("📐 БЕНЧМАРК НОРМАЛИЗАЦИИ ИЗОБРАЖЕНИЙ ПЕРЕД OCR")
+    print("=" * 60)
+
+    corpus = load_corpus(args.corpus_dir) if args.corpus_dir else create_synthetic_photos()
+    print(f"Изображений: {len(corpus)}, повторов подготовки: {args.repeat}, целевой DPI: {image_normalizer.OCR_TARGET_DPI:g}")
+    if not improved_ocr_service.tesseract_available:
+        print("⚠️ Tesseract недоступен - измеряется только подготовка изображений")
+
+    results = {}
+    for mode_name, normalize in (("full_resolution", False), ("normalized", True)):
+        rows = run_mode(corpus, normalize, args.repeat)
+        results[mode_name] = rows
+        print(f"\n📊 Режим {mode_name}:")
+        for image_path, prepare_seconds, size, ocr_seconds, cer in rows:
+            ocr_text = f", OCR {ocr_seconds:.2f}s" if ocr_seconds is not None else ""
+            cer_text = f", CER={cer:.3f}" if cer is not None else ""
+            print(f"   {os.path.basename(image_path)}: {size[0]}x{size[1]}, подготовка {prepare_seconds:.3f}s{ocr_text}{cer_text}")
+
+    image_normalizer.OCR_NORMALIZE_ENABLED = True
+    base, normalized = results["full_resolution"], results["normalized"]
+    print("\n" + "=" * 60)
+    base_prepare, normalized_prepare = _total(base, 1), _total(normalized, 1)
+    if normalized_prepare:
+        print(f"⚡ Ускорение подготовки: x{base_prepare / normalized_prepare:.2f}")
+    base_ocr, normalized_ocr = _total(base, 3), _total(normalized, 3)
+    if base_ocr and normalized_ocr:
+        print(f"⚡ Ускорение OCR: x{base_ocr / normalized_ocr:.2f}")
+    base_cers = [row[4] for row in base if row[4] is not None]
+    normalized_cers = [row[4] for row in normalized if row[4] is not None]
+    if base_cers and normalized_cers:
+        print(f"🎯 Изменение CER: {sum(normalized_cers) / len(normalized_cers) - sum(base_cers) / len(base_cers):+.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
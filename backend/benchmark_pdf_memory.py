@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти при растеризации PDF.
+Сравнивает convert_from_path для всех страниц сразу и постраничный iter_pdf_pages:
+пиковое потребление памяти (max RSS) процесса при разном числе страниц.
+Каждый прогон выполняется в отдельном процессе, чтобы max RSS не накапливался.
+
+Запуск:
+    python benchmark_pdf_memory.py [файл.pdf] [--pages 1 5 10 20] [--dpi 300]
+Без файла используется синтетический PDF со страницами A4.
+"""
+import os
+import sys
+import time
+import resource
+import argparse
+import tempfile
+import multiprocessing
+sys.path.append('.')
+
+from PIL import Image, ImageDraw
+
+
+def create_synthetic_pdf(pages: int) -> str:
+    """Синтетический PDF: страницы A4 (150 dpi) с текстом"""
+    images = []
+    for page_number in range(1, pages + 1):
+        image = Image.new('RGB', (1240, 1754), 'white')
+        draw = ImageDraw.Draw(image)
+        for line in range(40):
+            draw.text((100, 100 + line * 38), f"Seite {page_number}, Zeile {line + 1}: Sehr geehrte Damen und Herren", fill='black')
+        images.append(image)
+    path = os.path.join(tempfile.mkdtemp(prefix="pdf_bench_"), f"synthetic_{pages}.pdf")
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=150)
+    return path
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss в Linux - килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_mode(mode: str, pdf_path: str, pages: int, dpi: int, result_queue):
+    from pdf2image import convert_from_path
+    from page_rasterizer import iter_pdf_pages
+
+    baseline_mb = _max_rss_mb()
+    started = time.perf_counter()
+    rendered = 0
+    if mode == "batch":
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=1, last_page=pages)
+        for image in images:
+            image.convert('L')
+            rendered += 1
+        del images
+    else:
+        for _, image in iter_pdf_pages(pdf_path, dpi=dpi, first_page=1, last_page=pages):
+            image.convert('L')
+            rendered += 1
+            del image
+    result_queue.put((rendered, time.perf_counter() - started, _max_rss_mb() - baseline_mb))
+
+
+def measure(mode: str, pdf_path: str, pages: int, dpi: int):
+    """Прогон одного режима в отдельном процессе: (страниц, секунды, прирост max RSS в МБ)"""
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_run_mode, args=(mode, pdf_path, pages, dpi, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of PDF rasterization")
+    parser.add_argument('pdf_path', nargs='?', help="PDF file (synthetic PDF if omitted)")
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 5, 10, 20], help="Page counts to render")
+    parser.add_argument('--dpi', type=int, default=300)
+    args = parser.parse_args()
+
+    print("🧠 БЕНЧМАРК ПАМЯТИ РАСТЕРИЗАЦИИ PDF")
+    print("=" * 60)
+
+    for pages in args.pages:
+        pdf_path = args.pdf_path or create_synthetic_pdf(pages)
+        print(f"\n📄 {pdf_path}, страниц: {pages}, dpi: {args.dpi}")
+        for mode in ("batch", "streaming"):
+            rendered, seconds, peak_mb = measure(mode, pdf_path, pages, args.dpi)
+            print(f"   {mode:10s}: {rendered} стр, {seconds:.2f}s, пик памяти +{peak_mb:.0f} МБ")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
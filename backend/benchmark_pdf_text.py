@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк бэкендов текстового слоя PDF (PDF_TEXT_BACKEND).
+Для каждого доступного бэкенда: страниц в секунду и точность текста (CER по эталону,
+порядок чтения колонок учитывается).
+
+Запуск:
+    python benchmark_pdf_text.py [каталог_с_pdf] [--backends pypdf2 pdfium] [--pages 50] [--repeat 3]
+Для каждого PDF в каталоге может лежать эталон <имя>.txt (страницы разделены символом \\f).
+Без каталога используются синтетические PDF с текстовым слоем: письмо в одну колонку
+и страница с двумя колонками.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.append('.')
+
+from pdf_text_backends import PDF_TEXT_BACKENDS
+from document_artifact import DocumentArtifact
+from benchmark_utils import character_error_rate, SAMPLE_LETTERS
+
+# CER считается по первым страницам каждого PDF (расстояние Левенштейна на чистом Python)
+CER_MAX_PAGES = 10
+
+BODY_LINES = [
+    "Sehr geehrte Damen und Herren,",
+    "für das Jahr 2023 wird die Einkommensteuer wie folgt festgesetzt.",
+    "Bitte überweisen Sie den Betrag bis zum 15.03.2024 auf unser Konto.",
+    "Gegen diesen Bescheid können Sie innerhalb eines Monats Einspruch einlegen.",
+]
+LEFT_COLUMN = ["Bankverbindung", "Deutsche Bundesbank", "IBAN DE12 3456 7890 1234", "BIC MARKDEF1100"]
+RIGHT_COLUMN = ["Öffnungszeiten", "Mo - Fr 8:00 - 12:00", "Do 13:00 - 18:00", "Telefon 030 1234 5678"]
+
+
+def _pdf_string(text: str) -> str:
+    """Строка PDF в WinAnsiEncoding (умлауты - восьмеричные коды)"""
+    result = ""
+    for byte in text.encode('cp1252'):
+        char = chr(byte)
+        if char in '()\\':
+            result += '\\' + char
+        elif byte > 126:
+            result += f"\\{byte:03o}"
+        else:
+            result += char
+    return f"({result})"
+
+
+def _page_stream(lines) -> bytes:
+    """Поток страницы: строки (x, y, текст) шрифтом Helvetica 11pt"""
+    commands = ["BT", "/F1 11 Tf"]
+    for x, y, text in lines:
+        commands.append(f"1 0 0 1 {x} {y} Tm {_pdf_string(text)} Tj")
+    commands.append("ET")
+    return "\n".join(commands).encode('latin-1')
+
+
+def write_text_pdf(path: str, pages):
+    """Минимальный PDF с текстовым слоем (без внешних библиотек): pages - списки (x, y, текст)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        stream = _page_stream(lines)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('latin-1')
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+def create_synthetic_pdfs(pages: int):
+    """
+    Синтетические PDF: письмо в одну колонку и страницы с двумя колонками (подвал письма).
+    Колонки записаны в поток PDF по очереди, а эталон - строки так, как они видны на странице.
+    """
+    corpus_dir = tempfile.mkdtemp(prefix="pdf_text_bench_")
+    letter_lines = SAMPLE_LETTERS['deu'].split("\n") + BODY_LINES * 4
+
+    letter_pages, letter_reference = [], []
+    for page_number in range(1, pages + 1):
+        lines = [f"Seite {page_number}"] + letter_lines
+        letter_pages.append([(72, 780 - index * 16, text) for index, text in enumerate(lines)])
+        letter_reference.append("\n".join(lines))
+
+    column_pages, column_reference = [], []
+    for page_number in range(1, pages + 1):
+        lines = [(72, 780 - index * 16, text) for index, text in enumerate(LEFT_COLUMN)]
+        lines += [(320, 780 - index * 16, text) for index, text in enumerate(RIGHT_COLUMN)]
+        column_pages.append(lines)
+        column_reference.append("\n".join(f"{left} {right}" for left, right in zip(LEFT_COLUMN, RIGHT_COLUMN)))
+
+    corpus = []
+    for name, pdf_pages, reference in (("letter", letter_pages, letter_reference),
+                                       ("two_columns", column_pages, column_reference)):
+        path = os.path.join(corpus_dir, f"{name}.pdf")
+        write_text_pdf(path, pdf_pages)
+        corpus.append((path, reference))
+    return corpus
+
+
+def load_pdf_corpus(corpus_dir: str):
+    """PDF из каталога и эталоны <имя>.txt (страницы разделены \\f)"""
+    corpus = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith('.pdf'):
+            continue
+        path = os.path.join(corpus_dir, name)
+        reference_path = os.path.splitext(path)[0] + '.txt'
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, 'r', encoding='utf-8') as f:
+                reference = f.read().split('\f')
+        corpus.append((path, reference))
+    return corpus
+
+
+def run_backend(backend, corpus, repeat: int):
+    """Прогон корпуса: (страниц в секунду, средний CER по страницам или None)"""
+    total_pages, total_seconds, cers = 0, 0.0, []
+    for path, reference in corpus:
+        page_texts = []
+        for _ in range(repeat):
+            # Новый документ на каждый прогон: кэш текстового слоя DocumentArtifact не используется
+            document = DocumentArtifact(path, 'application/pdf')
+            started = time.perf_counter()
+            page_texts = backend.extract_page_texts(document)
+            total_seconds += time.perf_counter() - started
+            total_pages += len(page_texts)
+            document.close()
+        if reference:
+            for page_reference, page_text in list(zip(reference, page_texts))[:CER_MAX_PAGES]:
+                cers.append(character_error_rate(page_reference, page_text))
+            # Пропущенные бэкендом страницы - полная ошибка
+            cers.extend([1.0] * max(0, min(len(reference), CER_MAX_PAGES) - len(page_texts)))
+    pages_per_second = total_pages / total_seconds if total_seconds else 0.0
+    return pages_per_second, (sum(cers) / len(cers) if cers else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF text-layer backends")
+    parser.add_argument('corpus_dir', nargs='?', help="Directory with PDFs and <name>.txt references")
+    parser.add_argument('--backends', nargs='+', default=list(PDF_TEXT_BACKENDS), choices=list(PDF_TEXT_BACKENDS))
+    parser.add_argument('--pages', type=int, default=50, help="Pages per synthetic PDF")
+    parser.add_argument('--repeat', type=int, default=3, help="Extraction runs per PDF")
+    args = parser.parse_args()
+
+    print("📄 БЕНЧМАРК БЭКЕНДОВ ТЕКСТОВОГО СЛОЯ PDF")
+    print("=" * 60)
+
+    corpus = load_pdf_corpus(args.corpus_dir) if args.corpus_dir else create_synthetic_pdfs(args.pages)
+    print(f"PDF: {len(corpus)}, повторов: {args.repeat}")
+
+    results = {}
+    for name in args.backends:
+        backend = PDF_TEXT_BACKENDS[name]
+        if not backend.is_available():
+            print(f"⚠️ {name}: не установлен, пропускается")
+            continue
+        try:
+            results[name] = run_backend(backend, corpus, args.repeat)
+        except Exception as e:
+            print(f"❌ {name}: ошибка {e}")
+            continue
+        pages_per_second, mean_cer = results[name]
+        cer_text = f", средний CER={mean_cer:.3f}" if mean_cer is not None else ""
+        print(f"📊 {name}: {pages_per_second:.1f} страниц/с{cer_text}")
+
+    print("\n" + "=" * 60)
+    print(f"{'Бэкенд':12s} {'Страниц/с':>10s} {'CER':>8s} {'Ускорение':>10s}")
+    baseline = results.get("pypdf2", (None, None))[0]
+    for name, (pages_per_second, mean_cer) in results.items():
+        cer_text = f"{mean_cer:.3f}" if mean_cer is not None else "n/a"
+        speedup = f"x{pages_per_second / baseline:.1f}" if baseline else "n/a"
+        print(f"{name:12s} {pages_per_second:10.1f} {cer_text:>8s} {speedup:>10s}")
+    print("\nВыбор бэкенда: PDF_TEXT_BACKEND=<имя> (или список по приоритету через запятую)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
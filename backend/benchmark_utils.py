@@ -0,0 +1,104 @@
+"""
+Общие функции для бенчмарков OCR: корпус изображений с эталонным текстом и CER
+"""
+import os
+import tempfile
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.webp')
+
+# Шрифты с кириллицей (в Docker-образе python:slim их может не быть)
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+]
+
+SAMPLE_LETTERS = {
+    'deu': (
+        "Finanzamt Berlin Mitte\n"
+        "Steuernummer 12/345/67890\n"
+        "Bescheid über Einkommensteuer 2023\n"
+        "Sehr geehrte Damen und Herren,\n"
+        "bitte überweisen Sie den Betrag bis zum 15.03.2024."
+    ),
+    'rus': (
+        "Уважаемый господин Иванов,\n"
+        "просим предоставить документы до конца месяца.\n"
+        "Номер дела 12345, дата 15.03.2024."
+    ),
+    'ukr': (
+        "Шановний пане Шевченко,\n"
+        "просимо надати інформацію щодо вашої заяви.\n"
+        "Номер справи 12345, дата 15.03.2024."
+    ),
+}
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """CER = расстояние Левенштейна / длина эталона (пробелы нормализуются)"""
+    reference = " ".join(reference.split())
+    hypothesis = " ".join(hypothesis.split())
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_char != hyp_char)
+            ))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def _find_font(size: int):
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size), True
+    return ImageFont.load_default(), False
+
+
+def create_synthetic_corpus() -> List[Tuple[str, str]]:
+    """Синтетический корпус: страницы A4 (150 dpi) с немецким, русским и украинским текстом"""
+    font, has_cyrillic = _find_font(28)
+    corpus_dir = tempfile.mkdtemp(prefix="ocr_bench_")
+    corpus = []
+    for lang, text in SAMPLE_LETTERS.items():
+        if lang != 'deu' and not has_cyrillic:
+            continue
+        image = Image.new('RGB', (1240, 1754), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.multiline_text((100, 150), text, fill='black', font=font, spacing=14)
+        path = os.path.join(corpus_dir, f"synthetic_{lang}.png")
+        image.save(path)
+        corpus.append((path, text))
+    return corpus
+
+
+def load_corpus(corpus_dir: str = None) -> List[Tuple[str, str]]:
+    """
+    Корпус для бенчмарка: пары (путь к изображению, эталонный текст).
+    Эталон лежит рядом с изображением в файле с тем же именем и расширением .txt.
+    Без каталога используется синтетический корпус.
+    """
+    if not corpus_dir:
+        return create_synthetic_corpus()
+
+    corpus = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image_path = os.path.join(corpus_dir, name)
+        reference_path = os.path.splitext(image_path)[0] + '.txt'
+        reference = ""
+        if os.path.exists(reference_path):
+            with open(reference_path, 'r', encoding='utf-8') as f:
+                reference = f.read()
+        corpus.append((image_path, reference))
+    return corpus
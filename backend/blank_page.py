@@ -0,0 +1,77 @@
+import os
+import logging
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+OCR_BLANK_PAGE_DETECTION = os.environ.get('OCR_BLANK_PAGE_DETECTION', 'true').lower() == 'true'
+# Доля пикселей "чернил", ниже которой страница считается пустой: 0.01% - пылинки и точки от скана,
+# одна короткая строка текста ("Seite 2") уже больше
+OCR_BLANK_MAX_INK_RATIO = _env_number('OCR_BLANK_MAX_INK_RATIO', 0.0001)
+# Насколько пиксель должен быть темнее фона, чтобы считаться чернилами
+# (просвечивающий текст обратной стороны и тень от сканера светлее)
+OCR_BLANK_INK_DELTA = _env_number('OCR_BLANK_INK_DELTA', 80)
+# Стандартное отклонение яркости, ниже которого страница однотонная (пустая страница цифрового PDF)
+OCR_BLANK_MIN_STDDEV = _env_number('OCR_BLANK_MIN_STDDEV', 0.5)
+
+# Длинная сторона уменьшенной копии страницы для проверки
+BLANK_PROBE_MAX_SIDE = 600
+# Отступ от краев (доля стороны): края скана, дырки от дырокола, тень от крышки сканера
+BLANK_PROBE_MARGIN = 0.08
+
+# Суммарная статистика для /api/ocr-status
+blank_page_stats = {"checked": 0, "blank": 0}
+
+
+def page_ink_coverage(image: Image.Image) -> Tuple[float, float]:
+    """
+    (доля пикселей чернил, стандартное отклонение яркости) на уменьшенной копии страницы без полей.
+    Фон - 90-й перцентиль яркости, поэтому серая бумага и неравномерная засветка не считаются чернилами.
+    """
+    probe_image = image.convert('L')
+    factor = max(1, max(probe_image.size) // BLANK_PROBE_MAX_SIDE)
+    if factor > 1:
+        probe_image = probe_image.reduce(factor)
+
+    gray = np.asarray(probe_image, dtype=np.int16)
+    margin_y = int(gray.shape[0] * BLANK_PROBE_MARGIN)
+    margin_x = int(gray.shape[1] * BLANK_PROBE_MARGIN)
+    if gray.shape[0] > 2 * margin_y and gray.shape[1] > 2 * margin_x:
+        gray = gray[margin_y:gray.shape[0] - margin_y, margin_x:gray.shape[1] - margin_x]
+
+    stddev = float(gray.std())
+    if stddev < OCR_BLANK_MIN_STDDEV:
+        return 0.0, stddev
+    background = np.percentile(gray, 90)
+    ink_ratio = float(np.count_nonzero(gray < background - OCR_BLANK_INK_DELTA)) / gray.size
+    return ink_ratio, stddev
+
+
+def is_blank_page(image: Image.Image) -> bool:
+    """Пустая или почти пустая страница (обратная сторона дуплекс-скана, разделитель): OCR не нужен"""
+    if not OCR_BLANK_PAGE_DETECTION:
+        return False
+    try:
+        ink_ratio, stddev = page_ink_coverage(image)
+    except Exception as e:
+        logger.warning(f"Blank page check failed: {e}")
+        return False
+
+    blank = ink_ratio < OCR_BLANK_MAX_INK_RATIO
+    blank_page_stats["checked"] += 1
+    if blank:
+        blank_page_stats["blank"] += 1
+        logger.info(f"Blank page detected: ink {ink_ratio:.4%}, stddev {stddev:.1f}")
+    return blank
@@ -81,6 +81,15 @@ class SQLiteDatabase:
             )
         ''')
         
+        # Перцептивный хэш загруженного изображения (поиск повторных фото того же письма)
+        try:
+            cursor.execute('ALTER TABLE analyses ADD COLUMN image_hash TEXT')
+            logger.info("Added image_hash column to analyses table")
+        except sqlite3.OperationalError:
+            # Колонка уже существует
+            pass
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_analyses_user_timestamp ON analyses (user_id, timestamp)')
+        
         # Создание таблицы проверок статуса (для совместимости)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS status_checks (
@@ -180,8 +189,8 @@ class SQLiteDatabase:
         async with self.get_connection() as conn:
             await conn.execute('''
                 INSERT INTO analyses 
-                (id, user_id, file_name, file_type, analysis_result, analysis_language, llm_provider, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                (id, user_id, file_name, file_type, analysis_result, analysis_language, llm_provider, timestamp, image_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 analysis_data['id'],
                 analysis_data.get('user_id'),
@@ -190,10 +199,36 @@ class SQLiteDatabase:
                 json.dumps(analysis_data['analysis_result']),
                 analysis_data['analysis_language'],
                 analysis_data['llm_provider'],
-                analysis_data.get('timestamp', datetime.utcnow().isoformat())
+                analysis_data.get('timestamp', datetime.utcnow().isoformat()),
+                analysis_data.get('image_hash')
             ))
             await conn.commit()
 
+    async def get_analysis(self, analysis_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Получение анализа пользователя по ID"""
+        async with self.get_connection() as conn:
+            async with conn.execute(
+                'SELECT * FROM analyses WHERE id = ? AND user_id = ?', (analysis_id, user_id)
+            ) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    analysis = dict(row)
+                    analysis['analysis_result'] = json.loads(analysis['analysis_result'])
+                    return analysis
+                return None
+
+    async def get_user_image_hashes(self, user_id: str, limit: int = 500) -> List[Dict[str, Any]]:
+        """Перцептивные хэши последних загруженных изображений пользователя (от новых к старым)"""
+        async with self.get_connection() as conn:
+            async with conn.execute('''
+                SELECT id, file_name, analysis_language, timestamp, image_hash FROM analyses 
+                WHERE user_id = ? AND image_hash IS NOT NULL 
+                ORDER BY timestamp DESC 
+                LIMIT ?
+            ''', (user_id, limit)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
     async def get_user_analyses(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Получение анализов пользователя"""
         async with self.get_connection() as conn:
@@ -0,0 +1,269 @@
+import io
+import os
+import mmap
+import base64
+import hashlib
+import logging
+import mimetypes
+import threading
+from collections import Counter, OrderedDict
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import PyPDF2
+from PIL import Image
+
+from page_rasterizer import get_image_frame_count, get_pdf_page_count, iter_image_frames, render_pdf_page
+from pdf_text_backends import pdf_text_backend, PDF_TEXT_BACKENDS
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+# Файлы больше порога отображаются в память (mmap) вместо чтения в bytes
+DOCUMENT_MMAP_THRESHOLD = _env_int('DOCUMENT_MMAP_THRESHOLD', 8 * 1024 * 1024)
+# Лимит памяти на растеризованные страницы одного документа (0 - страницы не кэшируются)
+DOCUMENT_PAGE_CACHE_BYTES = _env_int('DOCUMENT_PAGE_CACHE_MB', 64) * 1024 * 1024
+
+# Сигнатуры форматов для определения MIME типа по содержимому
+_MAGIC_MIME_TYPES = (
+    (b'%PDF', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'BM', 'image/bmp'),
+)
+
+
+class DocumentArtifact:
+    """
+    Загруженный документ в рамках одного запроса.
+    Байты (mmap для больших файлов), SHA-256, MIME тип, PDF reader, текстовый слой страниц,
+    растеризованные страницы и base64 вычисляются лениво и один раз; все сервисы OCR
+    и провайдеры LLM получают один и тот же объект вместо повторного чтения файла.
+    """
+
+    def __init__(self, path: str, content_type: str = ""):
+        self.path = path
+        self.content_type = content_type or ""
+        self.size = os.path.getsize(path)
+        # Сколько раз выполнялось каждое дорогое преобразование (для логов и проверки)
+        self.computed = Counter()
+
+        self._lock = threading.RLock()
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._bytes: Optional[bytes] = None
+        self._sha256: Optional[str] = None
+        self._mime_type: Optional[str] = None
+        self._pdf_reader: Optional[PyPDF2.PdfReader] = None
+        self._page_texts: Optional[List[str]] = None
+        self._page_count: Optional[int] = None
+        self._frame_count: Optional[int] = None
+        self._base64: Optional[str] = None
+        self._pages: "OrderedDict[Tuple[int, int], Image.Image]" = OrderedDict()
+        self._pages_bytes = 0
+        # Области письма (адрес, реквизиты, текст, подвал) из анализа раскладки, если он выполнялся
+        self.layout_regions: Optional[List[dict]] = None
+
+    @property
+    def data(self) -> Union[bytes, mmap.mmap]:
+        """Содержимое файла: mmap для больших файлов, иначе bytes"""
+        with self._lock:
+            if self._mmap is not None:
+                return self._mmap
+            if self._bytes is not None:
+                return self._bytes
+            if self.size >= DOCUMENT_MMAP_THRESHOLD:
+                self._file = open(self.path, 'rb')
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.computed["mmap"] += 1
+                return self._mmap
+            with open(self.path, 'rb') as f:
+                self._bytes = f.read()
+            self.computed["read"] += 1
+            return self._bytes
+
+    @property
+    def content(self) -> bytes:
+        """Содержимое файла как bytes (для API, которым нужен именно bytes: PIL, HTTP, LLM)"""
+        data = self.data
+        if isinstance(data, bytes):
+            return data
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = data[:]
+                self.computed["read"] += 1
+            return self._bytes
+
+    @property
+    def sha256(self) -> str:
+        with self._lock:
+            if self._sha256 is None:
+                self._sha256 = hashlib.sha256(self.data).hexdigest()
+                self.computed["sha256"] += 1
+            return self._sha256
+
+    @property
+    def mime_type(self) -> str:
+        """MIME тип: заголовок загрузки, если он конкретный, иначе по сигнатуре и расширению"""
+        with self._lock:
+            if self._mime_type is None:
+                self._mime_type = self._detect_mime_type()
+            return self._mime_type
+
+    def _detect_mime_type(self) -> str:
+        if self.content_type and self.content_type != 'application/octet-stream':
+            return self.content_type
+        head = bytes(self.data[:16])
+        for signature, mime_type in _MAGIC_MIME_TYPES:
+            if head.startswith(signature):
+                return mime_type
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return 'image/webp'
+        return mimetypes.guess_type(self.path)[0] or 'application/octet-stream'
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.mime_type == 'application/pdf' or self.path.lower().endswith('.pdf')
+
+    @property
+    def pdf_reader(self) -> PyPDF2.PdfReader:
+        with self._lock:
+            if self._pdf_reader is None:
+                data = self.data
+                stream = data if isinstance(data, mmap.mmap) else io.BytesIO(data)
+                stream.seek(0)
+                self._pdf_reader = PyPDF2.PdfReader(stream)
+                self.computed["pdf_reader"] += 1
+            return self._pdf_reader
+
+    def pdf_page_texts(self) -> List[str]:
+        """
+        Текстовый слой PDF по страницам (пустая строка - страница без текста, например скан).
+        Извлекается бэкендом PDF_TEXT_BACKEND; при его ошибке - PyPDF2.
+        """
+        with self._lock:
+            if self._page_texts is None:
+                self._page_texts = self._extract_page_texts()
+                self.computed["pdf_page_texts"] += 1
+            return self._page_texts
+
+    def _extract_page_texts(self) -> List[str]:
+        backend = pdf_text_backend
+        try:
+            page_texts = backend.extract_page_texts(self)
+            logger.info(f"PDF text layer extracted with {backend.name}: {len(page_texts)} pages")
+            return page_texts
+        except Exception as e:
+            if backend.name == "pypdf2":
+                logger.error(f"PDF text layer extraction failed: {e}")
+                return []
+            logger.warning(f"PDF text backend {backend.name} failed, using PyPDF2: {e}")
+        try:
+            return PDF_TEXT_BACKENDS["pypdf2"].extract_page_texts(self)
+        except Exception as e:
+            logger.error(f"PDF text layer extraction failed: {e}")
+            return []
+
+    @property
+    def page_count(self) -> int:
+        """Количество страниц PDF (из уже разобранного PDF reader, при ошибке - pdfinfo)"""
+        with self._lock:
+            if self._page_count is None:
+                try:
+                    self._page_count = len(self.pdf_reader.pages)
+                except Exception as e:
+                    logger.warning(f"PyPDF2 page count failed, using pdfinfo: {e}")
+                    self._page_count = get_pdf_page_count(self.path)
+            return self._page_count
+
+    def render_page(self, page_number: int, dpi: int = 300) -> Optional[Image.Image]:
+        """
+        Растеризованная страница PDF. Страницы кэшируются в пределах DOCUMENT_PAGE_CACHE_MB,
+        поэтому fallback-сервис получает уже растеризованную страницу, а потоковый OCR
+        по-прежнему не держит в памяти весь документ.
+        """
+        key = (page_number, dpi)
+        with self._lock:
+            if key in self._pages:
+                self._pages.move_to_end(key)
+                return self._pages[key]
+
+            image = render_pdf_page(self.path, page_number, dpi)
+            if image is None:
+                return None
+            self.computed["render_page"] += 1
+
+            image_bytes = image.width * image.height * len(image.getbands())
+            if image_bytes <= DOCUMENT_PAGE_CACHE_BYTES:
+                self._pages[key] = image
+                self._pages_bytes += image_bytes
+                while self._pages_bytes > DOCUMENT_PAGE_CACHE_BYTES:
+                    _, evicted = self._pages.popitem(last=False)
+                    self._pages_bytes -= evicted.width * evicted.height * len(evicted.getbands())
+        return image
+
+    def iter_pages(self, page_numbers: Iterable[int], dpi: int = 300) -> Iterator[Tuple[int, Image.Image]]:
+        """Постраничная растеризация (как iter_pdf_pages), с повторным использованием кэша страниц"""
+        for page_number in page_numbers:
+            image = self.render_page(page_number, dpi)
+            if image is not None:
+                yield page_number, image
+
+    @property
+    def frame_count(self) -> int:
+        """Количество кадров изображения (страницы факса в TIFF, кадры GIF); 1 для одностраничных изображений"""
+        with self._lock:
+            if self._frame_count is None:
+                self._frame_count = get_image_frame_count(self.path)
+            return self._frame_count
+
+    def iter_frames(self, frame_numbers: Iterable[int]) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        Покадровое чтение многостраничного изображения (номера с 1). Кадры не кэшируются:
+        как и при потоковом OCR PDF, в памяти находится только текущий кадр.
+        """
+        for frame_number, image in iter_image_frames(self.path, frame_numbers):
+            self.computed["decode_frame"] += 1
+            yield frame_number, image
+
+    def base64(self) -> str:
+        """Содержимое файла в base64 (для JSON API)"""
+        with self._lock:
+            if self._base64 is None:
+                self._base64 = base64.b64encode(self.data).decode('utf-8')
+                self.computed["base64"] += 1
+            return self._base64
+
+    def close(self):
+        """Освобождение mmap и кэша страниц (до удаления временного файла)"""
+        with self._lock:
+            self._pdf_reader = None
+            self._pages.clear()
+            self._pages_bytes = 0
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __repr__(self) -> str:
+        return f"<DocumentArtifact {self.path} {self.size} bytes>"
+
+
+def as_document(source: Union[str, DocumentArtifact], content_type: str = "") -> DocumentArtifact:
+    """Документ запроса: переданный DocumentArtifact или новый для пути к файлу"""
+    if isinstance(source, DocumentArtifact):
+        return source
+    return DocumentArtifact(source, content_type)
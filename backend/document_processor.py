@@ -3,14 +3,15 @@ import logging
 import tempfile
 import shutil
 from typing import Optional, Tuple, Union
-import PyPDF2
 import pytesseract
-import cv2
-import numpy as np
 from PIL import Image
-from pdf2image import convert_from_path
+from page_rasterizer import PDFPageBudget
+from document_artifact import DocumentArtifact, as_document
+from image_normalizer import normalize_for_ocr
+from image_enhancement import enhancement_pipeline
 import io
 import base64
+from tesseract_pool import tesseract_pool
 
 logger = logging.getLogger(__name__)
 
@@ -118,26 +119,29 @@ class DocumentProcessor:
                 logger.warning("Tesseract not available for OCR call")
                 return ""
                 
-            result = pytesseract.image_to_string(image, config=config)
+            result = None
+            if tesseract_pool.enabled:
+                try:
+                    result = tesseract_pool.image_to_string(image, config)
+                except Exception as pool_error:
+                    logger.warning(f"Tesseract pool call failed, using subprocess: {pool_error}")
+            if result is None:
+                result = pytesseract.image_to_string(image, config=config)
             return result.strip() if result else ""
         except Exception as e:
             logger.warning(f"Tesseract call failed with config '{config}': {e}")
             return ""
         
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Извлечение текста из PDF файла"""
+    def extract_text_from_pdf(self, pdf_path: Union[str, DocumentArtifact], page_budget: Optional[PDFPageBudget] = None) -> str:
+        """Извлечение текста из PDF файла (page_budget - бюджет страниц/времени запроса)"""
+        pdf_path = as_document(pdf_path, 'application/pdf')
         try:
             extracted_text = ""
             
-            # Сначала пробуем извлечь текст напрямую
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    if text.strip():
-                        extracted_text += text + "\n"
+            # Сначала пробуем извлечь текст напрямую (текстовый слой документа разбирается один раз)
+            for text in pdf_path.pdf_page_texts():
+                if text.strip():
+                    extracted_text += text + "\n"
             
             # Если текст извлечен успешно, возвращаем его
             if extracted_text.strip():
@@ -146,23 +150,24 @@ class DocumentProcessor:
             
             # Если текст не извлечен, конвертируем PDF в изображения и используем OCR
             logger.info("Direct text extraction failed, trying OCR...")
-            return self._extract_text_from_pdf_with_ocr(pdf_path)
+            return self._extract_text_from_pdf_with_ocr(pdf_path, page_budget)
             
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             # Пробуем OCR как fallback
-            return self._extract_text_from_pdf_with_ocr(pdf_path)
+            return self._extract_text_from_pdf_with_ocr(pdf_path, page_budget)
     
-    def _extract_text_from_pdf_with_ocr(self, pdf_path: str) -> str:
-        """Извлечение текста из PDF с помощью OCR"""
+    def _extract_text_from_pdf_with_ocr(self, pdf_path: Union[str, DocumentArtifact], page_budget: Optional[PDFPageBudget] = None) -> str:
+        """Извлечение текста из PDF с помощью OCR (все страницы в пределах бюджета страниц/времени)"""
+        page_budget = page_budget or PDFPageBudget()
         try:
-            # Конвертируем PDF в изображения
-            images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=5)  # Ограничиваем 5 страницами
-            
+            # Конвертируем PDF в изображения по одной странице
             extracted_text = ""
-            for i, image in enumerate(images):
+            document = as_document(pdf_path, 'application/pdf')
+            page_numbers = page_budget.limit(range(1, document.page_count + 1))
+            for page_number, image in document.iter_pages(page_numbers, dpi=300):
                 # Улучшаем качество изображения для OCR
-                enhanced_image = self._enhance_image_for_ocr(image)
+                enhanced_image = enhancement_pipeline.enhance(image)
                 
                 # Извлекаем текст с помощью OCR (пробуем разные конфигурации)
                 text_results = []
@@ -173,7 +178,7 @@ class DocumentProcessor:
                     if text1:
                         text_results.append(text1)
                 except Exception as e:
-                    logger.warning(f"OCR document config failed for page {i+1}: {e}")
+                    logger.warning(f"OCR document config failed for page {page_number}: {e}")
                 
                 # Стандартная конфигурация
                 try:
@@ -181,12 +186,15 @@ class DocumentProcessor:
                     if text2:
                         text_results.append(text2)
                 except Exception as e:
-                    logger.warning(f"OCR standard config failed for page {i+1}: {e}")
+                    logger.warning(f"OCR standard config failed for page {page_number}: {e}")
                 
                 # Выбираем наиболее длинный результат
                 if text_results:
                     best_text = max(text_results, key=len)
-                    extracted_text += f"--- Страница {i+1} ---\n{best_text}\n\n"
+                    extracted_text += f"--- Страница {page_number} ---\n{best_text}\n\n"
+            
+            if page_budget.truncated:
+                extracted_text += page_budget.truncation_marker()
             
             logger.info(f"Extracted text from PDF with OCR: {len(extracted_text)} characters")
             return extracted_text.strip()
@@ -195,7 +203,7 @@ class DocumentProcessor:
             logger.error(f"Error extracting text from PDF with OCR: {e}")
             return "Ошибка при извлечении текста из PDF файла"
     
-    def extract_text_from_image(self, image_path: str) -> str:
+    def extract_text_from_image(self, image_path: Union[str, DocumentArtifact]) -> str:
         """Улучшенное извлечение текста из изображения с помощью OCR"""
         try:
             # Проверяем доступность tesseract
@@ -203,11 +211,17 @@ class DocumentProcessor:
                 logger.warning("Tesseract OCR is not available - cannot extract text from image")
                 return "OCR не доступен - не удалось извлечь текст из изображения"
             
-            # Открываем изображение
-            image = Image.open(image_path)
+            # Открываем изображение (байты документа уже прочитаны другими сервисами)
+            if isinstance(image_path, DocumentArtifact):
+                image = Image.open(io.BytesIO(image_path.content))
+            else:
+                image = Image.open(image_path)
+            
+            # Draft декодирование, EXIF ориентация и уменьшение до целевого DPI
+            image = normalize_for_ocr(image)
             
             # Улучшаем качество изображения для OCR
-            enhanced_image = self._enhance_image_for_ocr(image)
+            enhanced_image = enhancement_pipeline.enhance(image)
             
             # Пробуем разные конфигурации OCR
             text_results = []
@@ -249,66 +263,23 @@ class DocumentProcessor:
             logger.error(f"Error extracting text from image: {e}")
             return "Ошибка при извлечении текста из изображения"
     
-    def _enhance_image_for_ocr(self, image: Image.Image) -> Image.Image:
-        """Продвинутое улучшение изображения для супер-качественного OCR"""
-        try:
-            # Конвертируем в numpy array
-            img_array = np.array(image)
-            
-            # Если изображение цветное, конвертируем в серый
-            if len(img_array.shape) == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            
-            # Продвинутое улучшение качества
-            # 1. Адаптивная гауссова фильтрация для удаления шума
-            img_array = cv2.GaussianBlur(img_array, (3, 3), 0)
-            
-            # 2. Улучшение контраста с помощью CLAHE
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            img_array = clahe.apply(img_array)
-            
-            # 3. Морфологические операции для очистки текста
-            kernel = np.ones((2,2), np.uint8)
-            img_array = cv2.morphologyEx(img_array, cv2.MORPH_CLOSE, kernel)
-            img_array = cv2.morphologyEx(img_array, cv2.MORPH_OPEN, kernel)
-            
-            # 4. Адаптивная пороговая обработка
-            img_array = cv2.adaptiveThreshold(img_array, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-            
-            # 5. Дополнительное увеличение размера для лучшего OCR
-            height, width = img_array.shape
-            if width < 1500:  # Увеличиваем целевой размер
-                scale_factor = 1500 / width
-                new_width = int(width * scale_factor)
-                new_height = int(height * scale_factor)
-                img_array = cv2.resize(img_array, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-            
-            # 6. Дополнительное повышение резкости
-            kernel_sharpen = np.array([[-1,-1,-1], 
-                                     [-1, 9,-1], 
-                                     [-1,-1,-1]])
-            img_array = cv2.filter2D(img_array, -1, kernel_sharpen)
-            
-            # Конвертируем обратно в PIL Image
-            enhanced_image = Image.fromarray(img_array)
-            
-            return enhanced_image
-            
-        except Exception as e:
-            logger.error(f"Error enhancing image: {e}")
-            return image  # Возвращаем оригинальное изображение в случае ошибки
-    
-    def process_document(self, file_path: str, file_type: str) -> Tuple[str, str]:
-        """Обработка документа - извлечение текста и определение типа обработки"""
+    def process_document(self, file_path: Union[str, DocumentArtifact], file_type: str,
+                         page_budget: Optional[PDFPageBudget] = None) -> Tuple[str, str]:
+        """
+        Обработка документа - извлечение текста и определение типа обработки.
+        page_budget - бюджет страниц/времени запроса: при fallback продолжается, а не начинается заново.
+        """
+        document = as_document(file_path, file_type)
+        file_path = document.path
         try:
             extracted_text = ""
             processing_method = "unknown"
             
             if file_type.lower() == 'pdf' or file_path.lower().endswith('.pdf'):
-                extracted_text = self.extract_text_from_pdf(file_path)
+                extracted_text = self.extract_text_from_pdf(document, page_budget)
                 processing_method = "pdf_extraction"
             elif file_type.startswith('image/') or any(file_path.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']):
-                extracted_text = self.extract_text_from_image(file_path)
+                extracted_text = self.extract_text_from_image(document)
                 processing_method = "image_ocr"
             else:
                 # Пробуем как текстовый файл
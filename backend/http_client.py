@@ -0,0 +1,94 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+class SharedHTTPClient:
+    """
+    Общий асинхронный HTTP клиент для внешних OCR API (OCR.space, Azure Vision, Google Vision).
+    Соединения переиспользуются (keep-alive, без нового TLS рукопожатия на каждый запрос),
+    общее число соединений ограничено пулом httpx, а число одновременных запросов к одному
+    хосту - семафором OCR_HTTP_MAX_PER_HOST.
+    """
+
+    def __init__(self):
+        self.max_connections = _env_int('OCR_HTTP_MAX_CONNECTIONS', 20)
+        self.max_keepalive = _env_int('OCR_HTTP_MAX_KEEPALIVE', 10)
+        self.max_per_host = max(1, _env_int('OCR_HTTP_MAX_PER_HOST', 4))
+        self.keepalive_expiry = float(_env_int('OCR_HTTP_KEEPALIVE_EXPIRY', 30))
+        self.default_timeout = float(_env_int('OCR_HTTP_TIMEOUT', 30))
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {"requests": 0, "errors": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # Клиент привязан к event loop, в котором создан (важно для тестовых скриптов с asyncio.run)
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=self.default_timeout,
+            )
+            self._client_loop = loop
+            self._host_semaphores = {}
+        return self._client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_semaphores[host]
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """HTTP запрос через общий пул соединений"""
+        client = self._get_client()
+        async with self._host_semaphore(url):
+            self.stats["requests"] += 1
+            try:
+                return await client.request(method, url, **kwargs)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def get_status(self) -> Dict[str, int]:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "max_per_host": self.max_per_host,
+            **self.stats
+        }
+
+
+# Глобальный экземпляр HTTP клиента для внешних OCR API
+shared_http_client = SharedHTTPClient()
@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def _to_grayscale(img_array: np.ndarray) -> np.ndarray:
+    # Если изображение цветное, конвертируем в серый
+    if len(img_array.shape) == 3:
+        if img_array.shape[2] == 4:
+            return cv2.cvtColor(img_array, cv2.COLOR_RGBA2GRAY)
+        return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    return img_array
+
+
+def _denoise(img_array: np.ndarray) -> np.ndarray:
+    # Гауссова фильтрация для удаления шума
+    return cv2.GaussianBlur(img_array, (3, 3), 0)
+
+
+def _clahe(img_array: np.ndarray) -> np.ndarray:
+    # Улучшение контраста с помощью CLAHE
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe.apply(img_array)
+
+
+_MORPH_KERNEL = np.ones((2, 2), np.uint8)
+
+
+def _morph_close(img_array: np.ndarray) -> np.ndarray:
+    # Морфологическое закрытие: заполнение разрывов в штрихах
+    return cv2.morphologyEx(img_array, cv2.MORPH_CLOSE, _MORPH_KERNEL)
+
+
+def _morph_open(img_array: np.ndarray) -> np.ndarray:
+    # Морфологическое открытие: удаление мелких точек
+    return cv2.morphologyEx(img_array, cv2.MORPH_OPEN, _MORPH_KERNEL)
+
+
+def _adaptive_threshold(img_array: np.ndarray) -> np.ndarray:
+    # Адаптивная пороговая обработка (неравномерное освещение на фото)
+    return cv2.adaptiveThreshold(img_array, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+
+
+def _upscale(img_array: np.ndarray) -> np.ndarray:
+    # Увеличение узких изображений до ширины 1500 пикселей
+    height, width = img_array.shape[:2]
+    if width < 1500:
+        scale_factor = 1500 / width
+        return cv2.resize(img_array, (int(width * scale_factor), int(height * scale_factor)),
+                          interpolation=cv2.INTER_CUBIC)
+    return img_array
+
+
+_SHARPEN_KERNEL = np.array([[-1, -1, -1],
+                            [-1, 9, -1],
+                            [-1, -1, -1]])
+
+
+def _sharpen(img_array: np.ndarray) -> np.ndarray:
+    # Повышение резкости
+    return cv2.filter2D(img_array, -1, _SHARPEN_KERNEL)
+
+
+# Этапы улучшения изображения: имя -> функция над numpy массивом в градациях серого
+ENHANCEMENT_STAGES: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "grayscale": _to_grayscale,
+    "denoise": _denoise,
+    "clahe": _clahe,
+    "morph_close": _morph_close,
+    "morph_open": _morph_open,
+    "adaptive_threshold": _adaptive_threshold,
+    "upscale": _upscale,
+    "sharpen": _sharpen,
+}
+
+# Профили: последовательность этапов.
+# accurate - прежняя полная цепочка, balanced - без морфологии и повышения резкости,
+# fast - только градации серого и увеличение мелких изображений (чистые сканы, страницы PDF)
+ENHANCEMENT_PROFILES: Dict[str, List[str]] = {
+    "fast": ["grayscale", "upscale"],
+    "balanced": ["grayscale", "denoise", "clahe", "adaptive_threshold", "upscale"],
+    "accurate": ["grayscale", "denoise", "clahe", "morph_close", "morph_open",
+                 "adaptive_threshold", "upscale", "sharpen"],
+}
+
+DEFAULT_ENHANCEMENT_PROFILE = os.environ.get('OCR_ENHANCEMENT_PROFILE', 'accurate').lower()
+if DEFAULT_ENHANCEMENT_PROFILE not in ENHANCEMENT_PROFILES:
+    logger.warning(f"Unknown OCR_ENHANCEMENT_PROFILE '{DEFAULT_ENHANCEMENT_PROFILE}', using 'accurate'")
+    DEFAULT_ENHANCEMENT_PROFILE = 'accurate'
+
+
+class EnhancementPipeline:
+    """
+    Декларативная цепочка улучшения изображения для OCR.
+    Этапы выполняются по порядку из профиля; время каждого этапа накапливается
+    в статистике (для /api/ocr-status и бенчмарка).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_stats: Dict[str, Dict[str, float]] = {}
+        self.profile_runs: Dict[str, int] = {}
+
+    @staticmethod
+    def resolve_profile(profile: Optional[str]) -> str:
+        """Профиль запроса или профиль по умолчанию (OCR_ENHANCEMENT_PROFILE)"""
+        if profile and profile.lower() in ENHANCEMENT_PROFILES:
+            return profile.lower()
+        if profile:
+            logger.warning(f"Unknown enhancement profile '{profile}', using '{DEFAULT_ENHANCEMENT_PROFILE}'")
+        return DEFAULT_ENHANCEMENT_PROFILE
+
+    def run(self, image: Image.Image, profile: Optional[str] = None) -> Tuple[Image.Image, Dict[str, float]]:
+        """Улучшенное изображение и время каждого этапа (мс)"""
+        profile = self.resolve_profile(profile)
+        timings = {}
+        img_array = np.array(image)
+        for stage_name in ENHANCEMENT_PROFILES[profile]:
+            started = time.perf_counter()
+            img_array = ENHANCEMENT_STAGES[stage_name](img_array)
+            timings[stage_name] = (time.perf_counter() - started) * 1000
+        self._record(profile, timings)
+        return Image.fromarray(img_array), timings
+
+    def enhance(self, image: Image.Image, profile: Optional[str] = None) -> Image.Image:
+        """Улучшение изображения для OCR; при ошибке возвращается исходное изображение"""
+        try:
+            enhanced_image, _ = self.run(image, profile)
+            return enhanced_image
+        except Exception as e:
+            logger.error(f"Error enhancing image: {e}")
+            return image
+
+    def _record(self, profile: str, timings: Dict[str, float]):
+        with self._lock:
+            self.profile_runs[profile] = self.profile_runs.get(profile, 0) + 1
+            for stage_name, elapsed_ms in timings.items():
+                stats = self.stage_stats.setdefault(stage_name, {"runs": 0, "total_ms": 0.0})
+                stats["runs"] += 1
+                stats["total_ms"] += elapsed_ms
+
+    def merge_stats(self, profile_runs: Dict[str, int], stage_stats: Dict[str, Dict[str, float]]):
+        """Добавление статистики, накопленной в другом процессе (воркер пула страниц PDF)"""
+        with self._lock:
+            for profile, runs in profile_runs.items():
+                self.profile_runs[profile] = self.profile_runs.get(profile, 0) + runs
+            for stage_name, delta in stage_stats.items():
+                stats = self.stage_stats.setdefault(stage_name, {"runs": 0, "total_ms": 0.0})
+                stats["runs"] += delta["runs"]
+                stats["total_ms"] += delta["total_ms"]
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                "default_profile": DEFAULT_ENHANCEMENT_PROFILE,
+                "profiles": ENHANCEMENT_PROFILES,
+                "profile_runs": dict(self.profile_runs),
+                "avg_stage_ms": {
+                    stage_name: round(stats["total_ms"] / stats["runs"], 2)
+                    for stage_name, stats in self.stage_stats.items() if stats["runs"]
+                },
+            }
+
+
+# Глобальный экземпляр цепочки улучшения изображений
+enhancement_pipeline = EnhancementPipeline()
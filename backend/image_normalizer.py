@@ -0,0 +1,110 @@
+import os
+import logging
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+class ImageTooLargeError(ValueError):
+    """Изображение больше OCR_MAX_IMAGE_PIXELS (защита от decompression bomb)"""
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+OCR_NORMALIZE_ENABLED = os.environ.get('OCR_NORMALIZE_ENABLED', 'true').lower() == 'true'
+# Разрешение, до которого уменьшаются страницы для Tesseract (300 dpi - рекомендуемое для OCR)
+OCR_TARGET_DPI = _env_number('OCR_TARGET_DPI', 300)
+# Максимальное число пикселей изображения; больше - отказ до декодирования
+OCR_MAX_IMAGE_PIXELS = int(_env_number('OCR_MAX_IMAGE_PIXELS', 60_000_000))
+
+# Длинная сторона листа A4 в дюймах: у фото без DPI считаем, что письмо занимает весь кадр
+A4_LONG_SIDE_INCHES = 11.69
+# DPI из файла, при котором страница длиннее A3, - не разрешение скана
+MAX_PAGE_SIDE_INCHES = 17.0
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Pillow сам откажется декодировать изображения больше 2 * MAX_IMAGE_PIXELS во всех сервисах
+if OCR_MAX_IMAGE_PIXELS > 0:
+    Image.MAX_IMAGE_PIXELS = OCR_MAX_IMAGE_PIXELS
+
+
+def check_pixel_limit(size: Tuple[int, int]):
+    """ImageTooLargeError, если изображение больше OCR_MAX_IMAGE_PIXELS (размер известен из заголовка)"""
+    width, height = size
+    if OCR_MAX_IMAGE_PIXELS > 0 and width * height > OCR_MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Image {width}x{height} exceeds the {OCR_MAX_IMAGE_PIXELS} pixel limit"
+        )
+
+
+def _target_scale(image: Image.Image) -> float:
+    """Коэффициент уменьшения до OCR_TARGET_DPI (только уменьшение: увеличение делает улучшение изображения)"""
+    dpi = image.info.get('dpi')
+    try:
+        source_dpi = float(dpi[0]) if dpi else 0.0
+    except (TypeError, ValueError, IndexError):
+        source_dpi = 0.0
+
+    if source_dpi >= 150 and max(image.size) / source_dpi <= MAX_PAGE_SIDE_INCHES:
+        # Скан с известным разрешением (72/96 dpi в JPEG с камеры - значение по умолчанию, а не разрешение)
+        scale = OCR_TARGET_DPI / source_dpi
+    else:
+        # Фото: длинная сторона соответствует длинной стороне A4
+        scale = OCR_TARGET_DPI * A4_LONG_SIDE_INCHES / max(image.size)
+    return min(1.0, scale)
+
+
+def normalize_for_ocr(image: Image.Image) -> Image.Image:
+    """
+    Нормализация изображения перед улучшением и Tesseract:
+    1. проверка лимита пикселей до декодирования;
+    2. JPEG декодируется в draft режиме - сразу в градациях серого и в уменьшенном
+       масштабе (1/2, 1/4, 1/8), если целевое разрешение это позволяет;
+    3. поворот по EXIF ориентации (фото с телефона);
+    4. уменьшение до OCR_TARGET_DPI.
+    Изображения, которые уже в целевом разрешении (страницы PDF 300 dpi), не меняются.
+    """
+    if not OCR_NORMALIZE_ENABLED:
+        return image
+
+    check_pixel_limit(image.size)
+    original_size = image.size
+    scale = _target_scale(image)
+    target_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+
+    # Draft работает только до декодирования (tile еще не прочитан)
+    if image.format == 'JPEG' and getattr(image, 'tile', None):
+        try:
+            image.draft('L', target_size)
+        except Exception as e:
+            logger.debug(f"JPEG draft decoding unavailable: {e}")
+
+    orientation = _exif_orientation(image)
+    if orientation not in (None, 1):
+        image = ImageOps.exif_transpose(image)
+        if orientation in (5, 6, 7, 8):
+            target_size = (target_size[1], target_size[0])
+
+    if image.width > target_size[0] * 1.05:
+        # BOX (усреднение по области) при уменьшении сохраняет штрихи текста и в разы быстрее LANCZOS
+        image = image.resize(target_size, Image.BOX)
+
+    if image.size != original_size or orientation not in (None, 1):
+        logger.info(f"Image normalized for OCR: {original_size[0]}x{original_size[1]} -> "
+                    f"{image.width}x{image.height}, EXIF orientation {orientation or 1}")
+    return image
+
+
+def _exif_orientation(image: Image.Image) -> Optional[int]:
+    try:
+        return image.getexif().get(EXIF_ORIENTATION_TAG)
+    except Exception:
+        return None
@@ -0,0 +1,55 @@
+import io
+import os
+import mimetypes
+from typing import Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+# Изображение для OCR: путь к файлу, байты файла, PIL Image или numpy массив (RGB/градации серого)
+ImageSource = Union[str, bytes, Image.Image, np.ndarray]
+
+
+def to_pil_image(source: ImageSource) -> Image.Image:
+    """Изображение из любого источника как PIL Image (без копирования, если это уже PIL Image)"""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, np.ndarray):
+        return Image.fromarray(source)
+    if isinstance(source, bytes):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+
+def to_image_bytes(source: ImageSource) -> Tuple[bytes, str]:
+    """
+    Байты изображения и MIME тип для внешних API и LLM Vision.
+    Файлы и байты передаются как есть; изображения из памяти кодируются в PNG без записи на диск.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(), mimetypes.guess_type(str(source))[0] or 'image/jpeg'
+    if isinstance(source, bytes):
+        try:
+            image_format = Image.open(io.BytesIO(source)).format
+            return source, Image.MIME.get(image_format, 'image/jpeg')
+        except Exception:
+            return source, 'image/jpeg'
+
+    image = to_pil_image(source)
+    if image.mode not in ('1', 'L', 'LA', 'RGB', 'RGBA', 'P'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue(), 'image/png'
+
+
+def describe_image_source(source: ImageSource) -> str:
+    """Короткое описание источника для логов"""
+    if isinstance(source, (str, os.PathLike)):
+        return str(source)
+    if isinstance(source, bytes):
+        return f"<bytes {len(source)}>"
+    if isinstance(source, np.ndarray):
+        return f"<ndarray {source.shape}>"
+    return f"<image {source.size[0]}x{source.size[1]} {source.mode}>"
@@ -1,28 +1,51 @@
 import os
 import logging
-import tempfile
 import base64
-import requests
 import json
 import io
-from typing import Optional, Tuple, List
+import re
+from typing import Optional, Tuple, List, Dict, Iterator, AsyncIterator, Callable, Union
 from PIL import Image
-import PyPDF2
-from pdf2image import convert_from_path
+from page_rasterizer import PDFPageBudget
 import asyncio
+import threading
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 import mimetypes
 
 # Импорт Tesseract OCR
 import pytesseract
-import cv2
-import numpy as np
+from tesseract_pool import tesseract_pool
+from ocr_executor import ocr_executor, OCRQueueFullError
+from http_client import shared_http_client
+from image_source import ImageSource, to_pil_image, to_image_bytes, describe_image_source
+from vision_payload import VisionImage, vision_payload_stats
+from ocr_planner import OCRFallbackPlan
+from image_enhancement import enhancement_pipeline, ENHANCEMENT_PROFILES
+from document_artifact import DocumentArtifact, as_document
+from image_normalizer import (normalize_for_ocr, check_pixel_limit, ImageTooLargeError,
+                              OCR_NORMALIZE_ENABLED, OCR_TARGET_DPI, OCR_MAX_IMAGE_PIXELS)
+from blank_page import (is_blank_page, blank_page_stats, OCR_BLANK_PAGE_DETECTION,
+                        OCR_BLANK_MAX_INK_RATIO, OCR_BLANK_INK_DELTA, OCR_BLANK_MIN_STDDEV)
+from pdf_text_backends import pdf_text_backend
+from layout_analysis import segment_page, group_regions, foreign_blocks, crop_region, layout_text, OCR_LAYOUT_ANALYSIS
+from page_orientation import (estimate_skew_angle, rotate_page, OCR_ORIENTATION_ENABLED,
+                              OCR_OSD_MIN_CONFIDENCE, OCR_DESKEW_MAX_ANGLE, OCR_DESKEW_MIN_ANGLE)
 
 # Импорт LLM manager для Vision анализа
 from modern_llm_manager import modern_llm_manager
 
 logger = logging.getLogger(__name__)
 
+# Версия логики распознавания: увеличивается при изменениях, влияющих на результат OCR
+# (входит в ключ кэша результатов, см. ocr_cache.py)
+OCR_ENGINE_VERSION = "10"
+
 class ImprovedOCRService:
     """
     Улучшенный OCR сервис с множественными методами извлечения текста:
@@ -34,22 +57,56 @@ class ImprovedOCRService:
     
     def __init__(self):
         self.ocr_space_api_key = os.environ.get('OCR_SPACE_API_KEY')
+        self.ocr_space_url = os.environ.get('OCR_SPACE_API_URL', 'https://api.ocr.space/parse/image')
         self.azure_vision_key = os.environ.get('AZURE_COMPUTER_VISION_KEY')
         self.azure_vision_endpoint = os.environ.get('AZURE_COMPUTER_VISION_ENDPOINT')
         
+        # Настройка tesseract конфигурации (до проверки: она сужает набор языков до установленных)
+        self.tesseract_languages = ['ukr', 'rus', 'deu', 'eng']
+        self.tesseract_osd_available = False
+        self.tesseract_version = "not_installed"
+        self.tesseract_config = '--oem 3 --psm 6 -l ukr+rus+deu+eng'
+        self.tesseract_config_document = '--oem 3 --psm 4 -l ukr+rus+deu+eng'
+        self.tesseract_config_single_block = '--oem 3 --psm 6 -l ukr+rus+deu+eng'
+        
         # Проверяем доступность различных методов
         self.tesseract_available = self._check_tesseract_availability()
         self.llm_vision_available = self._check_llm_vision_availability()
         self.ocr_space_available = bool(self.ocr_space_api_key)
         self.azure_vision_available = bool(self.azure_vision_key and self.azure_vision_endpoint)
         
-        # Настройка tesseract конфигурации
-        self.tesseract_config = '--oem 3 --psm 6 -l ukr+rus+deu+eng'
-        self.tesseract_config_document = '--oem 3 --psm 4 -l ukr+rus+deu+eng'
-        self.tesseract_config_single_block = '--oem 3 --psm 6 -l ukr+rus+deu+eng'
+        # Предварительное определение письменности страницы для сужения набора языков Tesseract
+        self.language_detection_enabled = os.environ.get('OCR_LANGUAGE_DETECTION', 'true').lower() != 'false'
+        
+        # Порог оценки качества, ниже которого каскад Tesseract переходит к следующему этапу
+        self.cascade_min_score = float(os.environ.get('OCR_CASCADE_MIN_SCORE', '0.6'))
+        
+        # Опрос результата Azure Read API (секунды)
+        self.azure_poll_initial_delay = float(os.environ.get('AZURE_POLL_INITIAL_DELAY', '0.25'))
+        self.azure_poll_max_delay = float(os.environ.get('AZURE_POLL_MAX_DELAY', '4.0'))
+        self.azure_poll_backoff = float(os.environ.get('AZURE_POLL_BACKOFF', '2.0'))
+        self.azure_poll_deadline = float(os.environ.get('AZURE_POLL_DEADLINE', '30'))
+        self.azure_operations = deque(maxlen=50)
+        
+        # Hedged режим: LLM Vision запускается параллельно с Tesseract через OCR_HEDGE_DELAY секунд
+        # или сразу после этапа каскада с плохой оценкой; побеждает первый адекватный результат
+        self.hedged_mode = os.environ.get('OCR_HEDGED_MODE', 'false').lower() == 'true'
+        self.hedge_delay = float(os.environ.get('OCR_HEDGE_DELAY', '2.0'))
+        self.hedge_stats = {"hedged_requests": 0, "vision_started": 0, "tesseract_won": 0, "vision_won": 0, "no_winner": 0}
+        # Предварительный проход ориентации и наклона: сколько страниц повернуто и сколько из них
+        # затем распознал Tesseract (не доказывает, что без поворота страница ушла бы в LLM Vision)
+        self.orientation_stats = {"pages": 0, "rotated": 0, "deskewed": 0, "corrected_pages_with_text": 0, "total_ms": 0.0}
+        # Распознавание письма по областям (адрес, реквизиты, текст, подвал)
+        self.layout_stats = {"pages": 0, "accepted": 0, "regions": 0, "decorative_skipped": 0}
+        
+        # Параллельное распознавание страниц PDF (1 = последовательный режим)
+        self.pdf_page_workers = self._get_pdf_page_workers()
+        self._page_executor = None
+        self.page_timings = deque(maxlen=200)
         
         logger.info(f"Improved OCR Service initialized:")
         logger.info(f"  - Tesseract OCR available: {self.tesseract_available}")
+        logger.info(f"  - PDF page workers: {self.pdf_page_workers}")
         logger.info(f"  - LLM Vision available: {self.llm_vision_available}")
         logger.info(f"  - OCR.space available: {self.ocr_space_available}")
         logger.info(f"  - Azure Vision available: {self.azure_vision_available}")
@@ -66,11 +123,15 @@ class ImprovedOCRService:
             # Проверяем, что tesseract установлен
             version = pytesseract.get_tesseract_version()
             logger.info(f"Tesseract version: {version}")
+            self.tesseract_version = str(version)
             
             # Проверяем доступные языки
             languages = pytesseract.get_languages()
             logger.info(f"Available languages: {languages}")
             
+            # OSD нужен для быстрого определения письменности страницы
+            self.tesseract_osd_available = 'osd' in languages
+            
             # Проверяем наличие необходимых языков
             required_langs = ['rus', 'deu', 'eng', 'ukr']
             missing_langs = [lang for lang in required_langs if lang not in languages]
@@ -83,12 +144,14 @@ class ImprovedOCRService:
                     self.tesseract_config = f'--oem 3 --psm 6 -l {"+".join(available_langs)}'
                     self.tesseract_config_document = f'--oem 3 --psm 4 -l {"+".join(available_langs)}'
                     self.tesseract_config_single_block = f'--oem 3 --psm 6 -l {"+".join(available_langs)}'
+                    self.tesseract_languages = [lang for lang in self.tesseract_languages if lang in available_langs]
                     logger.info(f"Using available languages: {available_langs}")
                 else:
                     # Fallback to English only
                     self.tesseract_config = '--oem 3 --psm 6 -l eng'
                     self.tesseract_config_document = '--oem 3 --psm 4 -l eng'
                     self.tesseract_config_single_block = '--oem 3 --psm 6 -l eng'
+                    self.tesseract_languages = ['eng']
                     logger.warning("Fallback to English only OCR")
             else:
                 logger.info("All required language packs are available")
@@ -119,7 +182,47 @@ class ImprovedOCRService:
         except Exception as e:
             logger.warning(f"LLM Vision check failed: {e}")
             return False
-    
+
+    def _get_pdf_page_workers(self) -> int:
+        """Количество процессов для параллельного OCR страниц PDF (OCR_PDF_PAGE_WORKERS)"""
+        default_workers = min(4, os.cpu_count() or 1)
+        try:
+            workers = int(os.environ.get('OCR_PDF_PAGE_WORKERS', default_workers))
+        except ValueError:
+            logger.warning("Invalid OCR_PDF_PAGE_WORKERS value, using default")
+            workers = default_workers
+        return max(1, workers)
+
+    def _get_page_executor(self) -> Executor:
+        """
+        Ленивое создание ограниченного пула для страниц PDF.
+        Если работает пул теплых воркеров Tesseract, распознавание уже идет вне процесса,
+        и страницам достаточно потоков; иначе используется пул процессов.
+        Процессы запускаются через spawn, как в tesseract_pool: fork процесса с event loop
+        и потоками пулов может унаследовать захваченные блокировки.
+        """
+        if self._page_executor is None:
+            if tesseract_pool.enabled:
+                self._page_executor = ThreadPoolExecutor(max_workers=self.pdf_page_workers, thread_name_prefix="ocr-page")
+                logger.info(f"PDF page thread pool started with {self.pdf_page_workers} workers (Tesseract worker pool)")
+            else:
+                self._page_executor = ProcessPoolExecutor(max_workers=self.pdf_page_workers,
+                                                          mp_context=multiprocessing.get_context('spawn'))
+                logger.info(f"PDF page process pool started with {self.pdf_page_workers} workers")
+        return self._page_executor
+
+    def _merge_page_stats(self, stats: Dict):
+        """Добавление счетчиков, накопленных при распознавании страницы в воркере пула процессов"""
+        for key, value in stats["orientation"].items():
+            self.orientation_stats[key] += value
+        enhancement_pipeline.merge_stats(stats["profile_runs"], stats["stage_stats"])
+
+    def _reset_page_executor(self):
+        """Сброс пула процессов (например, после падения воркера)"""
+        if self._page_executor is not None:
+            self._page_executor.shutdown(wait=False, cancel_futures=True)
+            self._page_executor = None
+
     def _safe_tesseract_call(self, image, config):
         """Безопасный вызов tesseract с обработкой ошибок"""
         try:
@@ -127,121 +230,314 @@ class ImprovedOCRService:
                 logger.warning("Tesseract not available for OCR call")
                 return ""
                 
-            result = pytesseract.image_to_string(image, config=config)
+            result = None
+            if tesseract_pool.enabled:
+                try:
+                    result = tesseract_pool.image_to_string(image, config)
+                except Exception as pool_error:
+                    logger.warning(f"Tesseract pool call failed, using subprocess: {pool_error}")
+            if result is None:
+                result = pytesseract.image_to_string(image, config=config)
             return result.strip() if result else ""
         except Exception as e:
             logger.warning(f"Tesseract call failed with config '{config}': {e}")
             return ""
     
-    def _enhance_image_for_ocr(self, image: Image.Image) -> Image.Image:
-        """Продвинутое улучшение изображения для супер-качественного OCR"""
+    def _safe_tesseract_data_call(self, image, config) -> Tuple[str, List[Tuple[str, float]]]:
+        """Вызов tesseract с уверенностью по словам: (текст, [(слово, уверенность 0-100)])"""
         try:
-            # Конвертируем в numpy array
-            img_array = np.array(image)
-            
-            # Если изображение цветное, конвертируем в серый
-            if len(img_array.shape) == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            
-            # Продвинутое улучшение качества
-            # 1. Адаптивная гауссова фильтрация для удаления шума
-            img_array = cv2.GaussianBlur(img_array, (3, 3), 0)
-            
-            # 2. Улучшение контраста с помощью CLAHE
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            img_array = clahe.apply(img_array)
-            
-            # 3. Морфологические операции для очистки текста
-            kernel = np.ones((2,2), np.uint8)
-            img_array = cv2.morphologyEx(img_array, cv2.MORPH_CLOSE, kernel)
-            img_array = cv2.morphologyEx(img_array, cv2.MORPH_OPEN, kernel)
-            
-            # 4. Адаптивная пороговая обработка
-            img_array = cv2.adaptiveThreshold(img_array, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-            
-            # 5. Дополнительное увеличение размера для лучшего OCR
-            height, width = img_array.shape
-            if width < 1500:  # Увеличиваем целевой размер
-                scale_factor = 1500 / width
-                new_width = int(width * scale_factor)
-                new_height = int(height * scale_factor)
-                img_array = cv2.resize(img_array, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-            
-            # 6. Дополнительное повышение резкости
-            kernel_sharpen = np.array([[-1,-1,-1], 
-                                     [-1, 9,-1], 
-                                     [-1,-1,-1]])
-            img_array = cv2.filter2D(img_array, -1, kernel_sharpen)
-            
-            # Конвертируем обратно в PIL Image
-            enhanced_image = Image.fromarray(img_array)
-            
-            return enhanced_image
-            
+            if not self.tesseract_available:
+                logger.warning("Tesseract not available for OCR call")
+                return "", []
+
+            if tesseract_pool.enabled:
+                try:
+                    text, words = tesseract_pool.image_to_data(image, config)
+                    return text.strip(), words
+                except Exception as pool_error:
+                    logger.warning(f"Tesseract pool call failed, using subprocess: {pool_error}")
+
+            data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+            return _text_from_tesseract_data(data), [
+                (word, float(conf)) for word, conf in zip(data['text'], data['conf'])
+                if word.strip() and float(conf) >= 0
+            ]
         except Exception as e:
-            logger.error(f"Error enhancing image: {e}")
-            return image  # Возвращаем оригинальное изображение в случае ошибки
+            logger.warning(f"Tesseract data call failed with config '{config}': {e}")
+            return "", []
     
-    async def extract_text_with_tesseract(self, image_path: str) -> str:
+    async def extract_text_with_tesseract(self, image: ImageSource) -> str:
         """
-        Извлечение текста с помощью Tesseract OCR (основной метод)
+        Извлечение текста с помощью Tesseract OCR (основной метод).
+        Принимает путь к файлу, байты, PIL Image или numpy массив.
         """
+        text, _ = await self._extract_text_with_tesseract_detailed(image)
+        return text
+
+    async def _extract_text_with_tesseract_detailed(self, image: ImageSource,
+                                                    enhancement_profile: Optional[str] = None) -> Tuple[str, str]:
+        """Tesseract OCR с указанием этапа каскада, давшего итоговый текст"""
         try:
             if not self.tesseract_available:
                 logger.warning("Tesseract OCR is not available")
-                return ""
-            
-            # Открываем изображение
-            image = Image.open(image_path)
-            
+                return "", ""
+
+            # Изображение из памяти используется напрямую, файл открывается только для пути.
+            # Декодирование, OpenCV и Tesseract выполняются в пуле OCR, а не в event loop
+            text, stage, _ = await ocr_executor.run(
+                lambda: self._run_tesseract_cascade(to_pil_image(image), enhancement_profile=enhancement_profile)
+            )
+            return text, stage
+
+        except OCRQueueFullError:
+            # Очередь OCR заполнена: отказ (503), а не платные внешние fallback
+            raise
+        except Exception as e:
+            logger.error(f"Tesseract OCR failed: {e}")
+            return "", ""
+
+    def _run_tesseract_cascade(self, image: Image.Image, languages: Optional[str] = None,
+                               on_stage: Optional[Callable[[str, float], None]] = None,
+                               cancel_event: Optional[threading.Event] = None,
+                               enhancement_profile: Optional[str] = None) -> Tuple[str, str, float]:
+        """
+        Каскад Tesseract: один проход image_to_data с оценкой качества
+        (средняя уверенность слов + доля словарно-правдоподобных слов).
+        Следующий этап (другой PSM, затем другая подготовка изображения) запускается,
+        только если оценка ниже OCR_CASCADE_MIN_SCORE.
+        Языки берутся из предварительного определения письменности страницы; если суженный
+        набор не дал достаточной оценки, последним этапом идет полный набор языков.
+        Возвращает (текст, этап, оценка) лучшего из выполненных этапов.
+        on_stage(этап, оценка) вызывается после каждого этапа; cancel_event прерывает каскад
+        между этапами (используется в hedged режиме, когда победил другой метод).
+        enhancement_profile - профиль улучшения изображения (fast/balanced/accurate, см. image_enhancement.py).
+        """
+        try:
+            # Draft декодирование JPEG, EXIF ориентация и уменьшение до целевого DPI до любой обработки
+            image = normalize_for_ocr(image)
+            # Страницы, снятые боком или с наклоном, поворачиваются до распознавания
+            image, osd, corrected = self._correct_orientation(image)
+            
+            full_languages = "+".join(self.tesseract_languages)
+            if languages is None:
+                languages = self._detect_page_languages(image, osd)
+
             # Улучшаем качество изображения для OCR
-            enhanced_image = self._enhance_image_for_ocr(image)
-            
-            # Пробуем разные конфигурации OCR
-            text_results = []
-            
-            # Конфигурация для документов
-            try:
-                text1 = self._safe_tesseract_call(enhanced_image, self.tesseract_config_document)
-                if text1:
-                    text_results.append(text1)
-            except Exception as e:
-                logger.warning(f"Tesseract document config failed: {e}")
-            
-            # Конфигурация для одного блока
-            try:
-                text2 = self._safe_tesseract_call(enhanced_image, self.tesseract_config_single_block)
-                if text2:
-                    text_results.append(text2)
-            except Exception as e:
-                logger.warning(f"Tesseract single block config failed: {e}")
-            
-            # Стандартная конфигурация
-            try:
-                text3 = self._safe_tesseract_call(enhanced_image, self.tesseract_config)
-                if text3:
-                    text_results.append(text3)
-            except Exception as e:
-                logger.warning(f"Tesseract standard config failed: {e}")
-            
-            # Выбираем наиболее длинный результат
-            if text_results:
-                best_text = max(text_results, key=len)
-                logger.info(f"Tesseract OCR extracted {len(best_text)} characters")
-                return best_text
+            enhanced_image = enhancement_pipeline.enhance(image, enhancement_profile)
+
+            stages = [
+                ("tesseract_psm4", lambda: enhanced_image, _with_languages(self.tesseract_config_document, languages)),
+                ("tesseract_psm6", lambda: enhanced_image, _with_languages(self.tesseract_config_single_block, languages)),
+                ("tesseract_grayscale_psm3", lambda: image.convert('L'), _with_languages(re.sub(r'--psm\s+\d+', '--psm 3', self.tesseract_config), languages)),
+            ]
+            if languages != full_languages:
+                stages.append(("tesseract_all_languages", lambda: enhanced_image, self.tesseract_config_document))
+
+            best_text, best_stage, best_score = "", "", -1.0
+            for stage_name, get_stage_image, config in stages:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info("Tesseract cascade cancelled")
+                    break
+                text, words = self._safe_tesseract_data_call(get_stage_image(), config)
+                score = _score_ocr_words(words)
+                logger.info(f"Tesseract cascade stage {stage_name} [{config}]: score={score:.2f}, {len(text)} characters")
+                if on_stage is not None:
+                    on_stage(stage_name, score)
+                if text and score > best_score:
+                    best_text, best_stage, best_score = text, stage_name, score
+                if score >= self.cascade_min_score:
+                    break
+
+            if corrected and len(best_text.strip()) > 10:
+                self.orientation_stats["corrected_pages_with_text"] += 1
+            if best_text:
+                logger.info(f"Tesseract OCR extracted {len(best_text)} characters ({best_stage}, score={best_score:.2f})")
             else:
                 logger.warning("No text extracted with Tesseract")
-                return ""
-                
+            return best_text, best_stage, max(best_score, 0.0)
+
         except Exception as e:
             logger.error(f"Tesseract OCR failed: {e}")
-            return ""
-    
-    async def extract_text_with_llm_vision(self, image_path: str, user_providers: List = None) -> str:
+            return "", "", 0.0
+
+    def _correct_orientation(self, image: Image.Image) -> Tuple[Image.Image, Optional[dict], bool]:
+        """
+        Дешевый предварительный проход ориентации и наклона на уменьшенном изображении:
+        1. Tesseract OSD - поворот на 90/180/270 градусов (фото письма боком или вверх ногами);
+        2. проекционный профиль - наклон в пределах OCR_DESKEW_MAX_ANGLE.
+        Возвращает (изображение, результат OSD для определения языков, была ли исправлена ориентация).
+        Результат OSD ({} при неудаче) передается в _detect_page_languages, чтобы не вызывать OSD дважды.
+        """
+        if not OCR_ORIENTATION_ENABLED:
+            return image, None, False
+
+        started = time.perf_counter()
+        osd = None
+        rotate, skew = 0, 0.0
+        try:
+            probe_image = image.convert('L')
+            probe_image.thumbnail((LANGUAGE_PROBE_MAX_SIDE, LANGUAGE_PROBE_MAX_SIDE))
+
+            if self.tesseract_osd_available:
+                osd = self._safe_tesseract_osd_call(probe_image) or {}
+                if osd.get('orientation_conf', 0) >= OCR_OSD_MIN_CONFIDENCE:
+                    rotate = osd.get('rotate', 0) % 360
+                if rotate:
+                    probe_image = rotate_page(probe_image, rotate)
+
+            skew = estimate_skew_angle(probe_image)
+            if abs(skew) < OCR_DESKEW_MIN_ANGLE:
+                skew = 0.0
+
+            if rotate or skew:
+                logger.info(f"Page orientation corrected: rotate {rotate}°, deskew {skew:+.2f}°")
+                image = rotate_page(image, rotate, skew)
+        except Exception as e:
+            logger.warning(f"Orientation pre-pass failed: {e}")
+            rotate, skew = 0, 0.0
+
+        self.orientation_stats["pages"] += 1
+        self.orientation_stats["rotated"] += int(bool(rotate))
+        self.orientation_stats["deskewed"] += int(bool(skew))
+        self.orientation_stats["total_ms"] += (time.perf_counter() - started) * 1000
+        return image, osd, bool(rotate or skew)
+
+    def _prepare_layout_regions(self, image: ImageSource,
+                                enhancement_profile: Optional[str] = None) -> Tuple[List[dict], List[Tuple[Image.Image, str]], bool]:
+        """
+        Подготовка распознавания по областям (блокирующая, выполняется в пуле OCR):
+        нормализация, ориентация, сегментация страницы на блоки, объединение блоков в области
+        письма и вырезка областей из улучшенного изображения. Декоративные блоки (логотипы,
+        печати) не распознаются. Возвращает (области, [(изображение области, конфигурация)],
+        была ли исправлена ориентация).
+        """
+        image = normalize_for_ocr(to_pil_image(image))
+        image, osd, corrected = self._correct_orientation(image)
+        languages = self._detect_page_languages(image, osd)
+        enhanced_image = enhancement_pipeline.enhance(image, enhancement_profile)
+        scale = enhanced_image.width / image.width
+
+        text_blocks, decorative_blocks = segment_page(image)
+        regions = group_regions(text_blocks, image.size)
+        logger.info(f"Page layout: {len(text_blocks)} text blocks in {len(regions)} regions, "
+                    f"{len(decorative_blocks)} decorative blocks skipped")
+        self.layout_stats["decorative_skipped"] += len(decorative_blocks)
+
+        jobs = []
+        for region in regions:
+            config = _with_languages(re.sub(r'--psm\s+\d+', f"--psm {region['psm']}", self.tesseract_config), languages)
+            masked_blocks = decorative_blocks + foreign_blocks(regions, region)
+            jobs.append((crop_region(enhanced_image, region["bbox"], masked_blocks, scale), config))
+        for region in regions:
+            # Рамки блоков нужны только для вырезки - в ответ и кэш идут области без них
+            del region["boxes"]
+        return regions, jobs, corrected
+
+    async def extract_layout_regions(self, image: ImageSource,
+                                     enhancement_profile: Optional[str] = None) -> Tuple[List[dict], float]:
+        """
+        Распознавание письма по областям: шапка, адресное поле, блок реквизитов (Aktenzeichen, дата),
+        текст письма и подвал (банковские реквизиты), каждая со своим режимом PSM; области
+        распознаются параллельно в пуле OCR.
+        Возвращает (области с текстом и оценкой в порядке чтения, общая оценка качества).
+        """
+        regions, jobs, corrected = await ocr_executor.run(self._prepare_layout_regions, image, enhancement_profile)
+        self.layout_stats["pages"] += 1
+        if not regions:
+            return [], 0.0
+
+        results = await asyncio.gather(*(
+            ocr_executor.run(self._safe_tesseract_data_call, region_image, config) for region_image, config in jobs
+        ))
+        all_words = []
+        for region, (text, words) in zip(regions, results):
+            region["text"] = text.strip()
+            region["score"] = round(_score_ocr_words(words), 3)
+            all_words.extend(words)
+            logger.info(f"Layout region {region['role']} (psm {region['psm']}): score={region['score']:.2f}, {len(region['text'])} characters")
+        self.layout_stats["regions"] += len(regions)
+
+        score = _score_ocr_words(all_words)
+        if corrected and score >= self.cascade_min_score:
+            self.orientation_stats["corrected_pages_with_text"] += 1
+        return [region for region in regions if region["text"]], score
+
+    def _detect_page_languages(self, image: Image.Image, osd: Optional[dict] = None) -> str:
+        """
+        Дешевый предварительный проход для выбора языков Tesseract на странице.
+        1. OSD (определение письменности) на уменьшенном изображении:
+           Latin -> deu+eng, Cyrillic -> ukr+rus+deu (немецкие адреса и реквизиты остаются).
+           Результат OSD из прохода ориентации (osd) используется повторно.
+        2. Если OSD недоступен или не уверен - быстрый проход в низком разрешении с одним языком
+           каждой письменности (rus+deu): письменность определяется по распознанным словам.
+        При любой неопределенности возвращается полный набор языков.
+        """
+        full_languages = "+".join(self.tesseract_languages)
+        if not self.language_detection_enabled or len(self.tesseract_languages) <= 2:
+            return full_languages
+
+        try:
+            probe_image = image.convert('L')
+            probe_image.thumbnail((LANGUAGE_PROBE_MAX_SIDE, LANGUAGE_PROBE_MAX_SIDE))
+
+            script = None
+            if osd is None and self.tesseract_osd_available:
+                osd = self._safe_tesseract_osd_call(probe_image)
+            if osd and osd.get('script_conf', 0) >= LANGUAGE_PROBE_MIN_SCRIPT_CONFIDENCE:
+                script = osd.get('script')
+
+            if script is None:
+                # В пробном наборе должен быть кириллический язык: с deu+eng кириллица не распознается вовсе
+                probe_languages = [lang for lang in ('rus', 'ukr') if lang in self.tesseract_languages][:1]
+                probe_languages += [lang for lang in ('deu', 'eng') if lang in self.tesseract_languages][:1]
+                _, words = self._safe_tesseract_data_call(probe_image, f"--oem 3 --psm 6 -l {'+'.join(probe_languages)}")
+                script = _probe_script(words)
+                if script == 'Latin' and _score_ocr_words(words) < self.cascade_min_score:
+                    script = None
+
+            script_languages = {
+                'Latin': ['deu', 'eng'],
+                'Cyrillic': ['ukr', 'rus', 'deu'],
+            }.get(script)
+            if not script_languages:
+                return full_languages
+
+            languages = "+".join(lang for lang in script_languages if lang in self.tesseract_languages)
+            logger.info(f"Page script detected: {script} -> Tesseract languages {languages}")
+            return languages or full_languages
+
+        except Exception as e:
+            logger.warning(f"Page language detection failed: {e}")
+            return full_languages
+
+    def _safe_tesseract_osd_call(self, image) -> Optional[dict]:
+        """Определение ориентации и письменности (Tesseract OSD)"""
+        try:
+            if tesseract_pool.enabled:
+                try:
+                    return tesseract_pool.image_to_osd(image)
+                except Exception as pool_error:
+                    logger.warning(f"Tesseract pool OSD call failed, using subprocess: {pool_error}")
+            osd = pytesseract.image_to_osd(image, config='--psm 0', output_type=pytesseract.Output.DICT)
+            return {
+                'rotate': int(osd.get('rotate', 0)),
+                'orientation_conf': float(osd.get('orientation_conf', 0)),
+                'script': osd.get('script'),
+                'script_conf': float(osd.get('script_conf', 0)),
+            }
+        except Exception as e:
+            # Мало текста на изображении или нет osd.traineddata
+            logger.debug(f"Tesseract OSD failed: {e}")
+            return None
+
+    async def extract_text_with_llm_vision(self, image: ImageSource, user_providers: List = None,
+                                           plan: Optional[OCRFallbackPlan] = None, target: str = "image") -> str:
         """
         Извлечение текста с помощью LLM Vision (основной метод)
-        Использует Gemini Pro Vision, GPT-4V, Claude 3.5 Sonnet
+        Использует Gemini Pro Vision, GPT-4V, Claude 3.5 Sonnet.
+        Провайдеры, уже вызванные для этой цели в рамках плана запроса, пропускаются.
         """
+        plan = plan or OCRFallbackPlan()
         try:
             # Создаем специальный промпт для извлечения текста
             ocr_prompt = """
@@ -267,9 +563,12 @@ class ImprovedOCRService:
             # Если есть пользовательские провайдеры, используем их
             if user_providers:
                 for provider_type, model_name, api_key in user_providers:
+                    if not plan.should_try("llm_vision", provider_type, target):
+                        continue
                     try:
-                        provider = modern_llm_manager.create_user_provider(provider_type, model_name, api_key)
-                        result = await provider.generate_content(ocr_prompt, image_path)
+                        with plan.attempt("llm_vision", provider_type, target) as attempt:
+                            provider = modern_llm_manager.create_user_provider(provider_type, model_name, api_key)
+                            result = attempt["text"] = await provider.generate_content(ocr_prompt, image)
                         if result and len(result.strip()) > 20:  # Проверяем, что получили достаточно текста
                             logger.info(f"LLM Vision ({provider_type}) extracted {len(result)} characters")
                             return result.strip()
@@ -278,13 +577,16 @@ class ImprovedOCRService:
                         continue
             
             # Если пользовательские провайдеры не работают, используем системные
-            try:
-                result, provider_name = await modern_llm_manager.generate_content(ocr_prompt, image_path)
-                if result and len(result.strip()) > 20:
-                    logger.info(f"LLM Vision ({provider_name}) extracted {len(result)} characters")
-                    return result.strip()
-            except Exception as e:
-                logger.warning(f"System LLM Vision failed: {e}")
+            if plan.should_try("llm_vision", "system", target):
+                try:
+                    with plan.attempt("llm_vision", "system", target) as attempt:
+                        result, provider_name = await modern_llm_manager.generate_content(ocr_prompt, image)
+                        attempt["text"] = result
+                    if result and len(result.strip()) > 20:
+                        logger.info(f"LLM Vision ({provider_name}) extracted {len(result)} characters")
+                        return result.strip()
+                except Exception as e:
+                    logger.warning(f"System LLM Vision failed: {e}")
             
             return ""
             
@@ -292,7 +594,7 @@ class ImprovedOCRService:
             logger.error(f"LLM Vision OCR failed: {e}")
             return ""
     
-    async def extract_text_with_ocr_space(self, image_path: str) -> str:
+    async def extract_text_with_ocr_space(self, image: ImageSource) -> str:
         """
         Извлечение текста с помощью OCR.space API (бесплатный лимит: 25,000 запросов/месяц)
         """
@@ -301,15 +603,14 @@ class ImprovedOCRService:
                 logger.warning("OCR.space API key not available")
                 return ""
             
-            url = "https://api.ocr.space/parse/image"
+            url = self.ocr_space_url
             
-            # Читаем изображение
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            # Байты изображения (файл читается, изображение из памяти кодируется без записи на диск)
+            image_data, mime_type = await _external_image_bytes(image)
             
             # Подготавливаем данные для запроса
             files = {
-                'file': ('image.jpg', image_data, 'image/jpeg')
+                'file': (f"image{mimetypes.guess_extension(mime_type) or '.jpg'}", image_data, mime_type)
             }
             
             data = {
@@ -322,8 +623,8 @@ class ImprovedOCRService:
                 'isTable': True  # Лучше обрабатывать таблицы
             }
             
-            # Отправляем запрос
-            response = requests.post(url, files=files, data=data, timeout=30)
+            # Отправляем запрос (общий пул соединений, без блокировки event loop)
+            response = await shared_http_client.post(url, files=files, data={k: str(v) for k, v in data.items()}, timeout=30)
             response.raise_for_status()
             
             result = response.json()
@@ -343,7 +644,7 @@ class ImprovedOCRService:
             logger.error(f"OCR.space API failed: {e}")
             return ""
     
-    async def extract_text_with_azure_vision(self, image_path: str) -> str:
+    async def extract_text_with_azure_vision(self, image: ImageSource) -> str:
         """
         Извлечение текста с помощью Azure Computer Vision API (бесплатный лимит)
         """
@@ -352,9 +653,8 @@ class ImprovedOCRService:
                 logger.warning("Azure Computer Vision API not configured")
                 return ""
             
-            # Читаем изображение
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            # Байты изображения (файл читается, изображение из памяти кодируется без записи на диск)
+            image_data, _ = await _external_image_bytes(image)
             
             # URL для Read API
             read_url = f"{self.azure_vision_endpoint}/vision/v3.2/read/analyze"
@@ -365,7 +665,7 @@ class ImprovedOCRService:
             }
             
             # Отправляем изображение на анализ
-            response = requests.post(read_url, headers=headers, data=image_data, timeout=30)
+            response = await shared_http_client.post(read_url, headers=headers, content=image_data, timeout=30)
             response.raise_for_status()
             
             # Получаем ID операции
@@ -374,20 +674,36 @@ class ImprovedOCRService:
                 logger.error("Azure Vision: No Operation-Location header")
                 return ""
             
-            # Ждем завершения анализа
+            # Ждем завершения анализа: Retry-After сервера, иначе экспоненциальный backoff до общего дедлайна
             result_url = operation_location
-            max_attempts = 10
-            
-            for attempt in range(max_attempts):
-                await asyncio.sleep(1)  # Ждем 1 секунду
+            submitted = time.perf_counter()
+            deadline = submitted + self.azure_poll_deadline
+            delay = _parse_retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = self.azure_poll_initial_delay
+            polls = []
+            
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(delay, remaining))
                 
-                result_response = requests.get(result_url, headers={'Ocp-Apim-Subscription-Key': self.azure_vision_key})
+                poll_started = time.perf_counter()
+                result_response = await shared_http_client.get(result_url, headers={'Ocp-Apim-Subscription-Key': self.azure_vision_key})
                 result_response.raise_for_status()
                 
                 result = result_response.json()
                 status = result.get('status')
+                polls.append({
+                    "waited_seconds": round(delay, 3),
+                    "request_seconds": round(time.perf_counter() - poll_started, 3),
+                    "status": status
+                })
+                logger.info(f"Azure Vision poll {len(polls)}: waited {delay:.2f}s, status={status}")
                 
                 if status == 'succeeded':
+                    self._record_azure_operation(submitted, polls, result)
                     # Извлекаем текст
                     text_lines = []
                     if 'analyzeResult' in result:
@@ -399,76 +715,126 @@ class ImprovedOCRService:
                     if extracted_text:
                         logger.info(f"Azure Vision extracted {len(extracted_text)} characters")
                         return extracted_text.strip()
+                    return ""
                     
                 elif status == 'failed':
+                    self._record_azure_operation(submitted, polls, result)
                     logger.error("Azure Vision analysis failed")
                     return ""
-                elif status == 'running':
+                elif status in ('running', 'notStarted'):
+                    retry_after = _parse_retry_after(result_response.headers.get('Retry-After'))
+                    delay = retry_after if retry_after is not None else min(delay * self.azure_poll_backoff, self.azure_poll_max_delay)
                     continue
                 else:
                     logger.warning(f"Azure Vision unknown status: {status}")
                     return ""
             
-            logger.error("Azure Vision analysis timeout")
+            self._record_azure_operation(submitted, polls, None)
+            logger.error(f"Azure Vision analysis timeout after {self.azure_poll_deadline:.0f}s ({len(polls)} polls)")
             return ""
             
         except Exception as e:
             logger.error(f"Azure Vision API failed: {e}")
             return ""
     
-    def extract_text_from_pdf_direct(self, pdf_path: str) -> str:
+    def _record_azure_operation(self, submitted: float, polls: List[dict], result: Optional[dict]):
+        """Тайминги одной операции Azure Read: наше ожидание и фактическое время обработки на стороне Azure"""
+        self.azure_operations.append({
+            "wall_seconds": round(time.perf_counter() - submitted, 3),
+            "remote_seconds": _azure_remote_seconds(result) if result else None,
+            "status": result.get('status') if result else "timeout",
+            "polls": polls
+        })
+    
+    def extract_pdf_page_texts(self, pdf_path: Union[str, DocumentArtifact]) -> List[str]:
+        """Текстовый слой PDF по страницам (пустая строка - страница без текста, например скан)"""
+        return as_document(pdf_path, 'application/pdf').pdf_page_texts()
+    
+    def extract_text_from_pdf_direct(self, pdf_path: Union[str, DocumentArtifact]) -> str:
         """Прямое извлечение текста из PDF (без OCR)"""
-        try:
-            extracted_text = ""
-            
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    if text.strip():
-                        extracted_text += text + "\n"
-            
-            if extracted_text.strip():
-                logger.info(f"Direct PDF extraction: {len(extracted_text)} characters")
-                return extracted_text.strip()
-            
-            return ""
-            
-        except Exception as e:
-            logger.error(f"Direct PDF extraction failed: {e}")
-            return ""
+        extracted_text = "\n".join(text for text in self.extract_pdf_page_texts(pdf_path) if text.strip())
+        if extracted_text.strip():
+            logger.info(f"Direct PDF extraction: {len(extracted_text)} characters")
+            return extracted_text.strip()
+        return ""
     
-    async def extract_text_from_image(self, image_path: str, user_providers: List = None) -> str:
+    async def extract_text_from_image(self, image: ImageSource, user_providers: List = None,
+                                      plan: Optional[OCRFallbackPlan] = None,
+                                      enhancement_profile: Optional[str] = None) -> str:
         """
         Извлечение текста из изображения с использованием нескольких методов
         Приоритет: Tesseract OCR (основной) -> LLM Vision -> Online OCR APIs
+        Принимает путь к файлу, байты, PIL Image или numpy массив.
+        """
+        text, _ = await self._extract_text_from_image_detailed(image, user_providers, plan,
+                                                               enhancement_profile=enhancement_profile)
+        return text
+
+    async def _extract_text_from_image_detailed(self, image: ImageSource, user_providers: List = None,
+                                                plan: Optional[OCRFallbackPlan] = None,
+                                                target: str = "image",
+                                                enhancement_profile: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Извлечение текста из изображения: (текст, метод, давший результат).
+        План запроса пропускает методы, уже вызванные для этой цели (target),
+        и методы сверх бюджета времени и стоимости.
         """
+        plan = plan or OCRFallbackPlan()
         try:
-            logger.info(f"Starting image OCR for: {image_path}")
+            logger.info(f"Starting image OCR for: {describe_image_source(image)}")
             
+            # Слишком большие изображения отклоняются по заголовку, до декодирования
+            try:
+                check_pixel_limit(to_pil_image(image).size)
+            except (ImageTooLargeError, Image.DecompressionBombError) as e:
+                logger.warning(f"Image rejected: {e}")
+                return "Изображение слишком большое для распознавания. Уменьшите разрешение и попробуйте снова.", "image_too_large"
+            except Exception as e:
+                # Формат, который Pillow не читает, еще могут распознать внешние методы
+                logger.debug(f"Image header check skipped: {e}")
+            
+            vision_possible = bool(self.llm_vision_available or user_providers)
+            tesseract_possible = self.tesseract_available and plan.should_try("tesseract", target=target)
+            
+            # Методы 1 и 2 в hedged режиме: Tesseract и LLM Vision наперегонки
+            if self.hedged_mode and tesseract_possible and vision_possible:
+                try:
+                    text, method = await self._extract_text_hedged(image, user_providers, plan, target, enhancement_profile)
+                    if text:
+                        return text, method
+                except OCRQueueFullError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Hedged OCR failed: {e}")
             # Метод 1: Tesseract OCR (основной метод)
-            if self.tesseract_available:
+            elif tesseract_possible:
                 try:
-                    text = await self.extract_text_with_tesseract(image_path)
+                    with plan.attempt("tesseract", target=target) as attempt:
+                        text, stage = await self._extract_text_with_tesseract_detailed(image, enhancement_profile)
+                        attempt["text"] = text
                     if text and len(text.strip()) > 10:
-                        logger.info("✅ Tesseract OCR successful")
-                        return text
+                        logger.info(f"✅ Tesseract OCR successful ({stage})")
+                        return text, stage
                     else:
                         logger.info("Tesseract returned minimal text, trying fallback methods")
+                except OCRQueueFullError:
+                    raise
                 except Exception as e:
                     logger.warning(f"Tesseract OCR failed: {e}")
-            else:
+            elif not self.tesseract_available:
                 logger.info("Tesseract not available, using fallback methods")
             
+            # Изображение для внешних методов: уменьшенные JPEG/WebP для LLM Vision и исходные байты
+            # для OCR.space/Azure кодируются один раз на запрос и переиспользуются всеми fallback
+            image = VisionImage(image)
+            
             # Метод 2: LLM Vision (fallback)
-            if self.llm_vision_available or user_providers:
+            if vision_possible:
                 try:
-                    text = await self.extract_text_with_llm_vision(image_path, user_providers)
+                    text = await self.extract_text_with_llm_vision(image, user_providers, plan, target)
                     if text and len(text.strip()) > 20:
                         logger.info("✅ LLM Vision OCR successful")
-                        return text
+                        return text, "llm_vision"
                     else:
                         logger.info("LLM Vision returned minimal text, trying other fallback methods")
                 except Exception as e:
@@ -477,127 +843,378 @@ class ImprovedOCRService:
                 logger.info("LLM Vision not available, trying online OCR")
             
             # Метод 3: OCR.space API
-            if self.ocr_space_available:
+            if self.ocr_space_available and plan.should_try("ocr_space", target=target):
                 try:
-                    text = await self.extract_text_with_ocr_space(image_path)
+                    with plan.attempt("ocr_space", target=target) as attempt:
+                        text = attempt["text"] = await self.extract_text_with_ocr_space(image)
                     if text and len(text.strip()) > 10:
                         logger.info("✅ OCR.space API successful")
-                        return text
+                        return text, "ocr_space"
                 except Exception as e:
                     logger.warning(f"OCR.space API failed: {e}")
             
             # Метод 4: Azure Computer Vision
-            if self.azure_vision_available:
+            if self.azure_vision_available and plan.should_try("azure_vision", target=target):
                 try:
-                    text = await self.extract_text_with_azure_vision(image_path)
+                    with plan.attempt("azure_vision", target=target) as attempt:
+                        text = attempt["text"] = await self.extract_text_with_azure_vision(image)
                     if text and len(text.strip()) > 10:
                         logger.info("✅ Azure Vision API successful")
-                        return text
+                        return text, "azure_vision"
                 except Exception as e:
                     logger.warning(f"Azure Vision API failed: {e}")
             
             # Метод 5: Последний fallback - передать изображение в LLM с базовым запросом
+            # (только провайдерам, которые еще не вызывались для этой цели)
             if (self.llm_vision_available or user_providers):
                 try:
                     logger.info("Trying LLM Vision fallback with simple prompt")
                     simple_prompt = "Извлеките весь текст из этого изображения. Отвечайте только текстом, который видите."
                     if user_providers:
                         for provider_type, model_name, api_key in user_providers:
+                            if not plan.should_try("llm_vision", provider_type, target):
+                                continue
                             try:
-                                provider = modern_llm_manager.create_user_provider(provider_type, model_name, api_key)
-                                result = await provider.generate_content(simple_prompt, image_path)
+                                with plan.attempt("llm_vision", provider_type, target) as attempt:
+                                    provider = modern_llm_manager.create_user_provider(provider_type, model_name, api_key)
+                                    result = attempt["text"] = await provider.generate_content(simple_prompt, image)
                                 if result and len(result.strip()) > 5:
                                     logger.info("✅ LLM Vision fallback successful")
-                                    return result.strip()
+                                    return result.strip(), "llm_vision_simple_prompt"
                             except Exception as e:
                                 logger.warning(f"LLM Vision fallback failed for {provider_type}: {e}")
                                 continue
-                    else:
+                    elif plan.should_try("llm_vision", "system", target):
                         # Пробуем системные провайдеры
                         try:
-                            result, provider_name = await modern_llm_manager.generate_content(simple_prompt, image_path)
+                            with plan.attempt("llm_vision", "system", target) as attempt:
+                                result, provider_name = await modern_llm_manager.generate_content(simple_prompt, image)
+                                attempt["text"] = result
                             if result and len(result.strip()) > 5:
                                 logger.info(f"✅ LLM Vision fallback successful with {provider_name}")
-                                return result.strip()
+                                return result.strip(), "llm_vision_simple_prompt"
                         except Exception as e:
                             logger.warning(f"System LLM Vision fallback failed: {e}")
                 except Exception as e:
                     logger.warning(f"LLM Vision fallback completely failed: {e}")
             
             logger.warning("❌ All OCR methods failed for meaningful text extraction")
-            return "Не удалось извлечь текст из изображения. Попробуйте изображение лучшего качества."
+            return "Не удалось извлечь текст из изображения. Попробуйте изображение лучшего качества.", "failed"
             
+        except OCRQueueFullError:
+            raise
         except Exception as e:
             logger.error(f"Image OCR completely failed: {e}")
-            return "Ошибка при обработке изображения"
+            return "Ошибка при обработке изображения", "error"
     
-    async def extract_text_from_pdf(self, pdf_path: str, user_providers: List = None) -> str:
+    async def _extract_text_hedged(self, image: ImageSource, user_providers: List,
+                                   plan: OCRFallbackPlan, target: str,
+                                   enhancement_profile: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Hedged OCR: Tesseract запускается сразу, LLM Vision - через hedge_delay секунд
+        или раньше, если этап каскада получил оценку ниже порога.
+        Возвращает первый адекватный результат, проигравший отменяется
+        (задача LLM Vision - через cancel, каскад Tesseract - между этапами).
+        Обе попытки записываются в план запроса, поэтому после гонки они не повторяются.
+        """
+        loop = asyncio.get_running_loop()
+        poor_quality = asyncio.Event()
+        cancel_tesseract = threading.Event()
+        self.hedge_stats["hedged_requests"] += 1
+        
+        def on_stage(stage_name: str, score: float):
+            if score < self.cascade_min_score:
+                loop.call_soon_threadsafe(poor_quality.set)
+        
+        async def run_tesseract():
+            with plan.attempt("tesseract", target=target) as attempt:
+                result = await ocr_executor.run(
+                    lambda: self._run_tesseract_cascade(to_pil_image(image), on_stage=on_stage, cancel_event=cancel_tesseract,
+                                                        enhancement_profile=enhancement_profile)
+                )
+                attempt["text"] = result[0]
+                return result
+        
+        tesseract_task = asyncio.ensure_future(run_tesseract())
+        poor_quality_task = asyncio.ensure_future(poor_quality.wait())
+        vision_task = None
+        tesseract_result = None
+        
+        try:
+            # Ждем Tesseract до hedge_delay или до первого плохого этапа каскада
+            await asyncio.wait({tesseract_task, poor_quality_task}, timeout=self.hedge_delay,
+                               return_when=asyncio.FIRST_COMPLETED)
+            
+            pending = {tesseract_task}
+            if not tesseract_task.done() or not _tesseract_result_adequate(tesseract_task, self.cascade_min_score):
+                # Кодирование для провайдера идет в пуле event loop, а не в пуле OCR:
+                # его потоки могут быть заняты тем самым Tesseract, который мы обгоняем
+                vision_image = VisionImage(image)
+                logger.info("Hedged OCR: starting LLM Vision in parallel with Tesseract")
+                self.hedge_stats["vision_started"] += 1
+                vision_task = asyncio.ensure_future(self.extract_text_with_llm_vision(vision_image, user_providers, plan, target))
+                pending.add(vision_task)
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if tesseract_task in done:
+                    if isinstance(tesseract_task.exception(), OCRQueueFullError):
+                        raise tesseract_task.exception()
+                    if tesseract_task.exception() is None:
+                        tesseract_result = tesseract_task.result()
+                    if _tesseract_result_adequate(tesseract_task, self.cascade_min_score):
+                        text, stage, score = tesseract_result
+                        self.hedge_stats["tesseract_won"] += 1
+                        logger.info(f"✅ Hedged OCR: Tesseract won ({stage}, score={score:.2f})")
+                        return text, stage
+                if vision_task is not None and vision_task in done and vision_task.exception() is None:
+                    text = vision_task.result()
+                    if text and len(text.strip()) > 20:
+                        self.hedge_stats["vision_won"] += 1
+                        logger.info("✅ Hedged OCR: LLM Vision won")
+                        return text, "llm_vision"
+            
+            # Адекватного результата нет: текст Tesseract с низкой оценкой лучше, чем ничего
+            self.hedge_stats["no_winner"] += 1
+            if tesseract_result and len(tesseract_result[0].strip()) > 10:
+                return tesseract_result[0], tesseract_result[1]
+            return "", ""
+        
+        finally:
+            poor_quality_task.cancel()
+            if vision_task is not None and not vision_task.done():
+                vision_task.cancel()
+            if not tesseract_task.done():
+                cancel_tesseract.set()
+                # Поток пула завершит текущий этап сам; исключение не должно остаться необработанным
+                tesseract_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    
+    async def _ocr_pdf_pages(self, pages: Iterator[Tuple[int, Image.Image]],
+                             enhancement_profile: Optional[str] = None) -> AsyncIterator[Tuple[int, Image.Image, str, str]]:
+        """
+        Потоковый Tesseract OCR страниц PDF и кадров многостраничных изображений:
+        (номер страницы, изображение, текст, этап каскада).
+        Страницы берутся из генератора по одной; при OCR_PDF_PAGE_WORKERS > 1 одновременно
+        распознается не больше pdf_page_workers страниц, поэтому память ограничена окном,
+        а не числом страниц. Результаты выдаются в исходном порядке страниц.
+        Пустые страницы (обратные стороны дуплекс-скана) не распознаются: этап "blank_page".
+        """
+        loop = asyncio.get_running_loop()
+        window = self.pdf_page_workers if self.pdf_page_workers > 1 else 1
+        in_flight = deque()
+        started = time.perf_counter()
+        page_seconds = []
+        
+        async def next_page():
+            # Растеризация (poppler) и проверка пустой страницы тоже блокирующие - выполняем в пуле OCR
+            return await ocr_executor.run(_next_pdf_page, pages)
+        
+        async def finish(page_number, image, future, in_process_pool):
+            result = None
+            if future is not None:
+                try:
+                    result = await future
+                    if in_process_pool:
+                        # Счетчики дочернего процесса родителю не видны - добавляем приращения за страницу
+                        self._merge_page_stats(result[4])
+                except BrokenProcessPool as e:
+                    logger.warning(f"Parallel Tesseract OCR failed for page {page_number}: {e}")
+                    self._reset_page_executor()
+                except Exception as e:
+                    logger.warning(f"Parallel Tesseract OCR failed for page {page_number}: {e}")
+            if result is None:
+                # Последовательный режим и повтор страниц, упавших в пуле процессов
+                result = await ocr_executor.run(_ocr_pdf_page_worker, page_number, image, enhancement_profile)
+            _, text, stage, elapsed, _ = result
+            self.page_timings.append(elapsed)
+            page_seconds.append(elapsed)
+            logger.info(f"PDF page {page_number}: Tesseract {elapsed:.2f}s ({stage or 'no text'}), {len(text)} characters")
+            return page_number, image, text, stage
+        
+        page = await next_page()
+        while page is not None or in_flight:
+            if page is not None and len(in_flight) < window:
+                page_number, image, blank = page
+                future, in_process_pool = None, False
+                if self.tesseract_available and window > 1 and not blank:
+                    executor = self._get_page_executor()
+                    in_process_pool = isinstance(executor, ProcessPoolExecutor)
+                    future = loop.run_in_executor(executor, _ocr_pdf_page_worker, page_number, image, enhancement_profile)
+                in_flight.append((page_number, image, blank, future, in_process_pool))
+                page = await next_page()
+                continue
+            
+            page_number, image, blank, future, in_process_pool = in_flight.popleft()
+            if blank:
+                yield page_number, image, "", "blank_page"
+                continue
+            if not self.tesseract_available:
+                yield page_number, image, "", ""
+                continue
+            yield await finish(page_number, image, future, in_process_pool)
+        
+        if page_seconds:
+            logger.info(
+                f"PDF Tesseract OCR: {len(page_seconds)} pages, workers={self.pdf_page_workers}, "
+                f"wall={time.perf_counter() - started:.2f}s, sum of pages={sum(page_seconds):.2f}s"
+            )
+    
+    async def extract_text_from_pdf(self, pdf_path: str, user_providers: List = None,
+                                    page_budget: Optional[PDFPageBudget] = None) -> str:
         """
         Извлечение текста из PDF с использованием нескольких методов
         Приоритет: Прямое извлечение -> Tesseract OCR -> LLM Vision -> Online OCR
         """
+        text, _ = await self._extract_text_from_pdf_detailed(pdf_path, user_providers, page_budget)
+        return text
+
+    async def _extract_text_from_pdf_detailed(self, pdf_path: Union[str, DocumentArtifact], user_providers: List = None,
+                                              page_budget: Optional[PDFPageBudget] = None,
+                                              plan: Optional[OCRFallbackPlan] = None,
+                                              enhancement_profile: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Извлечение текста из PDF: (текст, методы, давшие результат по страницам).
+        Число страниц не ограничено; OCR останавливается по бюджету страниц/времени,
+        и тогда в конец текста добавляется пометка о частичной обработке.
+        """
+        page_budget = page_budget or PDFPageBudget()
+        plan = plan or OCRFallbackPlan()
+        document = as_document(pdf_path, 'application/pdf')
         try:
-            logger.info(f"Starting PDF OCR for: {pdf_path}")
-            
-            # Метод 1: Прямое извлечение текста из PDF
-            direct_text = self.extract_text_from_pdf_direct(pdf_path)
-            if direct_text and len(direct_text.strip()) > 50:
+            logger.info(f"Starting PDF OCR for: {document.path}")
+            
+            # Метод 1: текстовый слой PDF, отдельно для каждой страницы
+            with plan.attempt("pdf_text_layer") as attempt:
+                page_texts = await ocr_executor.run(document.pdf_page_texts)
+                attempt["text"] = "".join(page_texts)
+            text_pages = [i + 1 for i, text in enumerate(page_texts) if len(text.strip()) >= PDF_TEXT_LAYER_MIN_CHARS]
+            if page_texts and len(text_pages) == len(page_texts):
                 logger.info("✅ Direct PDF text extraction successful")
-                return direct_text
-            
-            # Метод 2: Конвертация PDF в изображения и OCR с Tesseract
-            logger.info("Direct PDF extraction failed, converting to images...")
+                return "\n".join(text.strip() for text in page_texts if text.strip()), "direct_text"
             
+            # Метод 2: растеризация и OCR только страниц без текстового слоя (сканы)
+            results = {page: (page_texts[page - 1], "direct_text") for page in text_pages}
             try:
-                # Конвертируем PDF в изображения (ограничиваем 5 страницами)
-                images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=5)
-                
-                extracted_text = ""
-                for i, image in enumerate(images):
-                    # Сохраняем изображение во временный файл
-                    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_img:
-                        image.save(temp_img.name, 'PNG')
-                        temp_img_path = temp_img.name
-                    
-                    try:
-                        # Сначала пробуем Tesseract OCR
-                        if self.tesseract_available:
-                            try:
-                                page_text = await self.extract_text_with_tesseract(temp_img_path)
-                                if page_text and len(page_text.strip()) > 10:
-                                    extracted_text += f"--- Страница {i+1} ---\n{page_text}\n\n"
-                                    continue
-                            except Exception as e:
-                                logger.warning(f"Tesseract OCR failed for page {i+1}: {e}")
-                        
-                        # Fallback к извлечению текста из изображения (включая LLM Vision)
-                        page_text = await self.extract_text_from_image(temp_img_path, user_providers)
-                        if page_text and len(page_text.strip()) > 10:
-                            extracted_text += f"--- Страница {i+1} ---\n{page_text}\n\n"
-                            
-                    finally:
-                        # Удаляем временный файл
-                        if os.path.exists(temp_img_path):
-                            os.unlink(temp_img_path)
-                
-                if extracted_text.strip():
-                    logger.info(f"✅ PDF OCR successful: {len(extracted_text)} characters")
-                    return extracted_text.strip()
-                
+                # Страницы растеризуются по одной, пока позволяет бюджет, и сразу распознаются Tesseract
+                if page_texts:
+                    image_pages = [page for page in range(1, len(page_texts) + 1) if page not in results]
+                    logger.info(f"PDF text layer on {len(text_pages)}/{len(page_texts)} pages, {len(image_pages)} pages need OCR")
+                else:
+                    logger.info("PDF text layer unavailable, converting all pages to images...")
+                    image_pages = list(range(1, await ocr_executor.run(lambda: document.page_count) + 1))
+                pages = document.iter_pages(page_budget.limit(image_pages), dpi=300)
+                await self._ocr_page_images(pages, results, user_providers, plan, enhancement_profile)
+            except OCRQueueFullError:
+                raise
             except Exception as e:
                 logger.error(f"PDF to images conversion failed: {e}")
             
+            # Короткий текстовый слой лучше, чем ничего, если OCR страницы не удался
+            for page, text in enumerate(page_texts, 1):
+                if page not in results and text.strip():
+                    results[page] = (text, "direct_text")
+            
+            extracted_text, method = self._join_page_results(results, page_budget)
+            if extracted_text:
+                logger.info(f"✅ PDF OCR successful: {len(extracted_text)} characters")
+                return extracted_text, method
+            
             logger.warning("❌ All PDF OCR methods failed")
-            return "PDF содержит изображения, но не удалось извлечь текст"
+            return "PDF содержит изображения, но не удалось извлечь текст", "failed"
             
+        except OCRQueueFullError:
+            raise
         except Exception as e:
             logger.error(f"PDF OCR completely failed: {e}")
-            return "Ошибка при обработке PDF файла"
+            return "Ошибка при обработке PDF файла", "error"
     
-    async def process_document(self, file_path: str, file_type: str, user_providers: List = None) -> Tuple[str, str]:
+    async def _ocr_page_images(self, pages: Iterator[Tuple[int, Image.Image]], results: Dict[int, Tuple[str, str]],
+                               user_providers: List = None, plan: Optional[OCRFallbackPlan] = None,
+                               enhancement_profile: Optional[str] = None, target_prefix: str = "page"):
         """
-        Основной метод обработки документов
+        Потоковый OCR страниц (страницы PDF или кадры многостраничного изображения) с fallback
+        для каждой страницы; результаты записываются в results[номер] = (текст, метод).
         """
+        plan = plan or OCRFallbackPlan()
+        async for page_number, image, page_text, page_method in self._ocr_pdf_pages(pages, enhancement_profile):
+            target = f"{target_prefix} {page_number}"
+            if page_method == "blank_page":
+                # Пустая страница отмечается в тексте и не отправляется ни в Tesseract, ни в LLM Vision
+                results[page_number] = (BLANK_PAGE_MARKER, page_method)
+                continue
+            if self.tesseract_available:
+                plan.mark_tried("tesseract", target=target, text=page_text)
+            if page_text and len(page_text.strip()) > 10:
+                results[page_number] = (page_text, page_method)
+                continue
+            
+            # Fallback к извлечению текста из изображения (включая LLM Vision) прямо из памяти;
+            # Tesseract для этой страницы уже выполнен и повторно не запускается
+            page_text, page_method = await self._extract_text_from_image_detailed(image, user_providers, plan, target, enhancement_profile)
+            if page_text and len(page_text.strip()) > 10:
+                results[page_number] = (page_text, page_method)
+    
+    @staticmethod
+    def _join_page_results(results: Dict[int, Tuple[str, str]], page_budget: PDFPageBudget,
+                           heading: str = "Страница") -> Tuple[str, str]:
+        """Текст документа из результатов по страницам с заголовками и методы (пустая строка, если текста нет)"""
+        extracted_text = ""
+        page_methods = []
+        for page_number in sorted(results):
+            page_text, page_method = results[page_number]
+            extracted_text += f"--- {heading} {page_number} ---\n{page_text.strip()}\n\n"
+            page_methods.append(page_method)
+        
+        if page_budget.truncated:
+            extracted_text += page_budget.truncation_marker()
+            page_methods.append("truncated")
+        
+        if not extracted_text.strip():
+            return "", ""
+        return extracted_text.strip(), "+".join(dict.fromkeys(page_methods))
+    
+    async def _extract_text_from_frames_detailed(self, document: DocumentArtifact, user_providers: List = None,
+                                                 page_budget: Optional[PDFPageBudget] = None,
+                                                 plan: Optional[OCRFallbackPlan] = None,
+                                                 enhancement_profile: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Многостраничное изображение (факс в TIFF, GIF с несколькими кадрами): кадры читаются по одному
+        и распознаются тем же потоковым OCR, что и страницы PDF (параллельно, с ограничением памяти,
+        бюджетом страниц и пропуском пустых страниц). Текст размечается номерами кадров.
+        """
+        page_budget = page_budget or PDFPageBudget()
+        plan = plan or OCRFallbackPlan()
+        results: Dict[int, Tuple[str, str]] = {}
+        try:
+            frame_count = await ocr_executor.run(lambda: document.frame_count)
+            logger.info(f"Starting multi-frame image OCR for: {document.path}, {frame_count} frames")
+            frames = document.iter_frames(page_budget.limit(range(1, frame_count + 1)))
+            await self._ocr_page_images(frames, results, user_providers, plan, enhancement_profile, target_prefix="frame")
+        except OCRQueueFullError:
+            raise
+        except Exception as e:
+            logger.error(f"Multi-frame image OCR failed: {e}")
+        
+        extracted_text, method = self._join_page_results(results, page_budget, heading="Кадр")
+        if extracted_text:
+            logger.info(f"✅ Multi-frame image OCR successful: {len(results)} frames, {len(extracted_text)} characters")
+            return extracted_text, method
+        logger.warning("❌ All multi-frame image OCR methods failed")
+        return "Не удалось извлечь текст из многостраничного изображения", "failed"
+    
+    async def process_document(self, file_path: Union[str, DocumentArtifact], file_type: str, user_providers: List = None,
+                               page_budget: Optional[PDFPageBudget] = None,
+                               plan: Optional[OCRFallbackPlan] = None,
+                               enhancement_profile: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Основной метод обработки документов.
+        plan - план fallback запроса: общий для всех сервисов OCR, которые обрабатывают этот документ.
+        enhancement_profile - профиль улучшения изображений для запроса (по умолчанию OCR_ENHANCEMENT_PROFILE).
+        file_path - путь или DocumentArtifact запроса (файл читается и разбирается один раз для всех сервисов).
+        """
+        document = as_document(file_path, file_type)
+        file_path = document.path
+        plan = plan or OCRFallbackPlan()
         try:
             logger.info(f"Processing document: {file_path}, type: {file_type}")
             
@@ -606,12 +1223,39 @@ class ImprovedOCRService:
             
             # Определяем тип файла и выбираем метод обработки
             if file_type.lower() == 'pdf' or file_path.lower().endswith('.pdf'):
-                extracted_text = await self.extract_text_from_pdf(file_path, user_providers)
-                processing_method = "improved_pdf_ocr"
+                extracted_text, method = await self._extract_text_from_pdf_detailed(document, user_providers, page_budget, plan, enhancement_profile)
+                processing_method = f"improved_pdf_ocr:{method}"
                 
-            elif file_type.startswith('image/') or any(file_path.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.gif']):
-                extracted_text = await self.extract_text_from_image(file_path, user_providers)
-                processing_method = "improved_image_ocr"
+            elif (file_type.startswith('image/') or any(file_path.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp', '.gif'])) \
+                    and await ocr_executor.run(lambda: document.frame_count) > 1:
+                # Многостраничный TIFF/GIF - покадрово, как PDF (без конвертации в PDF на клиенте)
+                extracted_text, method = await self._extract_text_from_frames_detailed(document, user_providers, page_budget, plan, enhancement_profile)
+                processing_method = f"improved_multiframe_ocr:{method}"
+                
+            elif file_type.startswith('image/') or any(file_path.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp', '.gif']):
+                image_content = await ocr_executor.run(lambda: document.content)
+                method = ""
+                # Письмо распознается по областям; при низкой оценке - обычный путь (каскад и fallback)
+                if OCR_LAYOUT_ANALYSIS and self.tesseract_available and plan.should_try("tesseract_layout", target="image"):
+                    try:
+                        with plan.attempt("tesseract_layout", target="image") as attempt:
+                            regions, score = await self.extract_layout_regions(image_content, enhancement_profile)
+                            attempt["text"] = layout_text(regions)
+                        if score >= self.cascade_min_score and len(attempt["text"]) > 10:
+                            logger.info(f"✅ Layout OCR successful: {len(regions)} regions, score={score:.2f}")
+                            self.layout_stats["accepted"] += 1
+                            document.layout_regions = regions
+                            extracted_text, method = attempt["text"], "tesseract_layout"
+                        else:
+                            logger.info(f"Layout OCR score {score:.2f} too low, using full-page OCR")
+                    except OCRQueueFullError:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"Layout OCR failed: {e}")
+                if not method:
+                    extracted_text, method = await self._extract_text_from_image_detailed(image_content, user_providers, plan,
+                                                                                  enhancement_profile=enhancement_profile)
+                processing_method = f"improved_image_ocr:{method}"
                 
             else:
                 # Пробуем как текстовый файл
@@ -637,10 +1281,32 @@ class ImprovedOCRService:
             
             return extracted_text, processing_method
             
+        except OCRQueueFullError:
+            raise
         except Exception as e:
             logger.error(f"Document processing failed: {e}")
             return "Ошибка при обработке документа", "error"
     
+    def get_cache_fingerprint(self, enhancement_profile: Optional[str] = None) -> str:
+        """Версия и конфигурация OCR для ключа кэша: при их изменении старые результаты не используются"""
+        profile = enhancement_pipeline.resolve_profile(enhancement_profile)
+        return "|".join([
+            OCR_ENGINE_VERSION,
+            self.tesseract_version,
+            self.tesseract_config,
+            self.tesseract_config_document,
+            self.tesseract_config_single_block,
+            "+".join(self.tesseract_languages),
+            str(self.language_detection_enabled),
+            str(self.cascade_min_score),
+            f"{OCR_NORMALIZE_ENABLED}:{OCR_TARGET_DPI:g}:{OCR_MAX_IMAGE_PIXELS}",
+            f"{profile}:{'+'.join(ENHANCEMENT_PROFILES[profile])}",
+            f"{OCR_ORIENTATION_ENABLED}:{OCR_OSD_MIN_CONFIDENCE:g}:{OCR_DESKEW_MAX_ANGLE:g}:{OCR_DESKEW_MIN_ANGLE:g}",
+            f"layout:{OCR_LAYOUT_ANALYSIS}",
+            f"pdf_text:{pdf_text_backend.name}",
+            f"{OCR_BLANK_PAGE_DETECTION}:{OCR_BLANK_MAX_INK_RATIO:g}:{OCR_BLANK_INK_DELTA:g}:{OCR_BLANK_MIN_STDDEV:g}",
+        ])
+
     def get_service_status(self) -> dict:
         """Получение статуса сервиса"""
         return {
@@ -664,14 +1330,215 @@ class ImprovedOCRService:
                 },
                 "direct_pdf": {
                     "available": True,
+                    "backend": pdf_text_backend.name,
                     "description": "Прямое извлечение текста из PDF"
                 }
             },
+            "pdf_page_parallelism": {
+                "workers": self.pdf_page_workers,
+                "recent_pages": len(self.page_timings),
+                "avg_page_seconds": round(sum(self.page_timings) / len(self.page_timings), 3) if self.page_timings else None,
+                "max_page_seconds": round(max(self.page_timings), 3) if self.page_timings else None
+            },
+            "tesseract_pool": tesseract_pool.get_status(),
+            "azure_polling": {
+                "recent_operations": len(self.azure_operations),
+                "avg_polls": round(sum(len(op["polls"]) for op in self.azure_operations) / len(self.azure_operations), 2) if self.azure_operations else None,
+                "avg_wall_seconds": round(sum(op["wall_seconds"] for op in self.azure_operations) / len(self.azure_operations), 3) if self.azure_operations else None,
+                "last_operation": self.azure_operations[-1] if self.azure_operations else None
+            },
+            "vision_payload": vision_payload_stats,
+            "image_enhancement": enhancement_pipeline.get_status(),
+            "layout_analysis": {
+                "enabled": OCR_LAYOUT_ANALYSIS,
+                **self.layout_stats
+            },
+            "blank_pages": {
+                "enabled": OCR_BLANK_PAGE_DETECTION,
+                **blank_page_stats
+            },
+            "orientation": {
+                "enabled": OCR_ORIENTATION_ENABLED,
+                "osd_available": self.tesseract_osd_available,
+                "pages": self.orientation_stats["pages"],
+                "rotated": self.orientation_stats["rotated"],
+                "deskewed": self.orientation_stats["deskewed"],
+                "corrected_pages_with_text": self.orientation_stats["corrected_pages_with_text"],
+                "avg_ms": round(self.orientation_stats["total_ms"] / self.orientation_stats["pages"], 2) if self.orientation_stats["pages"] else None
+            },
+            "hedged_ocr": {
+                "enabled": self.hedged_mode,
+                "delay_seconds": self.hedge_delay,
+                **self.hedge_stats
+            },
             "primary_method": "tesseract_ocr" if self.tesseract_available else "llm_vision",
             "tesseract_dependency": True,
-            "tesseract_version": "5.3.0" if self.tesseract_available else "not_installed",
+            "tesseract_version": self.tesseract_version,
             "production_ready": True
         }
 
+# Минимум символов текстового слоя, чтобы страница PDF не отправлялась на OCR
+PDF_TEXT_LAYER_MIN_CHARS = 30
+# Текст пустой страницы в результате
+BLANK_PAGE_MARKER = "[Пустая страница]"
+
+# Предварительное определение языков страницы
+LANGUAGE_PROBE_MAX_SIDE = 1600
+LANGUAGE_PROBE_MIN_SCRIPT_CONFIDENCE = 1.0
+_CYRILLIC_CHAR_RE = re.compile(r"[А-ЯЁІЇЄҐа-яёіїєґ]")
+# Доля слов с кириллицей в пробном проходе, с которой страница считается кириллической
+LANGUAGE_PROBE_MIN_CYRILLIC_SHARE = 0.1
+
+
+def _probe_script(words: List[Tuple[str, float]]) -> Optional[str]:
+    """
+    Письменность страницы по словам пробного прохода: Latin - кириллицы нет, Cyrillic - заметная
+    доля кириллических слов (немецкий остается в наборе для адресов), None - единичные совпадения.
+    """
+    alpha_words = [word for word, _ in words if any(ch.isalpha() for ch in word)]
+    if not alpha_words:
+        return None
+    cyrillic_words = sum(1 for word in alpha_words if _CYRILLIC_CHAR_RE.search(word))
+    if cyrillic_words == 0:
+        return 'Latin'
+    if cyrillic_words >= LANGUAGE_PROBE_MIN_CYRILLIC_SHARE * len(alpha_words):
+        return 'Cyrillic'
+    return None
+
+
+def _with_languages(config: str, languages: str) -> str:
+    """Замена набора языков (-l) в строке конфигурации Tesseract"""
+    return re.sub(r'-l\s+\S+', f'-l {languages}', config)
+
+
+# Слова из букв одного алфавита с хотя бы одной гласной - признак нормального слова, а не шума OCR
+_LATIN_WORD_RE = re.compile(r"^[A-Za-zÄÖÜäöüß][a-zäöüß]*$|^[A-ZÄÖÜ]+$")
+_CYRILLIC_WORD_RE = re.compile(r"^[А-ЯЁІЇЄҐа-яёіїєґ][а-яёіїєґ'ʼ]*$|^[А-ЯЁІЇЄҐ]+$")
+_VOWELS = set("aeiouyäöüAEIOUYÄÖÜаеёиоуыэюяіїєАЕЁИОУЫЭЮЯІЇЄ")
+
+
+def _is_dictionary_like_word(token: str) -> bool:
+    """Проверка, похоже ли слово на словарное (без внешнего словаря)"""
+    word = token.strip(".,;:!?()[]{}«»\"'„“”-–")
+    if len(word) < 2:
+        return False
+    if not (_LATIN_WORD_RE.match(word) or _CYRILLIC_WORD_RE.match(word)):
+        return False
+    return any(ch in _VOWELS for ch in word)
+
+
+def _score_ocr_words(words: List[Tuple[str, float]]) -> float:
+    """Оценка результата OCR 0..1: средняя уверенность слов и доля словарно-правдоподобных слов"""
+    if not words:
+        return 0.0
+    mean_confidence = sum(conf for _, conf in words) / len(words) / 100.0
+    alpha_tokens = [word for word, _ in words if any(ch.isalpha() for ch in word)]
+    if not alpha_tokens:
+        return 0.0
+    dictionary_ratio = sum(1 for word in alpha_tokens if _is_dictionary_like_word(word)) / len(alpha_tokens)
+    return 0.6 * mean_confidence + 0.4 * dictionary_ratio
+
+
+def _text_from_tesseract_data(data: dict) -> str:
+    """Сборка текста из результата image_to_data с сохранением строк и абзацев"""
+    lines = []
+    current_key, current_words, last_block = None, [], None
+    for i, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        if key != current_key:
+            if current_words:
+                lines.append(" ".join(current_words))
+            if last_block is not None and key[:2] != last_block:
+                lines.append("")
+            current_key, current_words, last_block = key, [], key[:2]
+        current_words.append(word)
+    if current_words:
+        lines.append(" ".join(current_words))
+    return "\n".join(lines).strip()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After: число секунд или HTTP-дата"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _azure_remote_seconds(result: dict) -> Optional[float]:
+    """Время обработки на стороне Azure: lastUpdatedDateTime - createdDateTime"""
+    try:
+        created = datetime.fromisoformat(result['createdDateTime'].replace('Z', '+00:00'))
+        updated = datetime.fromisoformat(result['lastUpdatedDateTime'].replace('Z', '+00:00'))
+        return round((updated - created).total_seconds(), 3)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+def _tesseract_result_adequate(task: "asyncio.Future", min_score: float) -> bool:
+    """Результат каскада Tesseract достаточен, чтобы не ждать LLM Vision"""
+    if not task.done() or task.cancelled() or task.exception() is not None:
+        return False
+    text, _, score = task.result()
+    return bool(text) and len(text.strip()) > 10 and score >= min_score
+
+
+async def _external_image_bytes(image) -> Tuple[bytes, str]:
+    """Исходные байты изображения и MIME тип для OCR.space/Azure (без записи на диск)"""
+    if isinstance(image, VisionImage):
+        return await asyncio.get_running_loop().run_in_executor(None, image.source_bytes)
+    return await asyncio.get_running_loop().run_in_executor(None, to_image_bytes, image)
+
+
+def _next_pdf_page(pages: Iterator[Tuple[int, Image.Image]]) -> Optional[Tuple[int, Image.Image, bool]]:
+    """Следующая растеризованная страница PDF и признак пустой страницы (None, если страниц больше нет)"""
+    page = next(pages, None)
+    if page is None:
+        return None
+    page_number, image = page
+    return page_number, image, is_blank_page(image)
+
+def _page_worker_stats() -> Dict:
+    """Счетчики, которые обновляет каскад Tesseract: ориентация страниц и этапы улучшения изображения"""
+    return {
+        "orientation": dict(improved_ocr_service.orientation_stats),
+        "profile_runs": dict(enhancement_pipeline.profile_runs),
+        "stage_stats": {stage_name: dict(stats) for stage_name, stats in enhancement_pipeline.stage_stats.items()},
+    }
+
+def _ocr_pdf_page_worker(page_number: int, image: Image.Image,
+                         enhancement_profile: Optional[str] = None) -> Tuple[int, str, str, float, Dict]:
+    """
+    Распознавание одной страницы PDF (воркер пула процессов или последовательный режим).
+    Функция самодостаточна: все входные данные передаются аргументами, а процесс, запущенный через
+    spawn, импортирует модуль заново и получает собственный экземпляр сервиса.
+    Возвращает (номер страницы, текст, этап каскада, время, приращения счетчиков за страницу);
+    приращения добавляет в статистику родитель - только для результатов из пула процессов,
+    в своем процессе счетчики уже обновлены.
+    """
+    before = _page_worker_stats()
+    started = time.perf_counter()
+    text, stage, _ = improved_ocr_service._run_tesseract_cascade(image, enhancement_profile=enhancement_profile)
+    elapsed = time.perf_counter() - started
+    after = _page_worker_stats()
+    stats = {
+        "orientation": {key: value - before["orientation"][key] for key, value in after["orientation"].items()},
+        "profile_runs": {profile: runs - before["profile_runs"].get(profile, 0)
+                         for profile, runs in after["profile_runs"].items()},
+        "stage_stats": {stage_name: {key: value - before["stage_stats"].get(stage_name, {}).get(key, 0)
+                                     for key, value in stage_stats.items()}
+                        for stage_name, stage_stats in after["stage_stats"].items()},
+    }
+    return page_number, text, stage, elapsed, stats
+
 # Глобальный экземпляр улучшенного OCR сервиса
 improved_ocr_service = ImprovedOCRService()
\ No newline at end of file
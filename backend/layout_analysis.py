@@ -0,0 +1,170 @@
+import os
+import logging
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Выключено по умолчанию: при низкой оценке областей каскад для всей страницы заново выполняет
+# нормализацию, ориентацию и определение языка (почти двойная работа Tesseract на плохих фото),
+# а hedged режим (Tesseract и LLM Vision наперегонки) для распознавания по областям не используется
+OCR_LAYOUT_ANALYSIS = os.environ.get('OCR_LAYOUT_ANALYSIS', 'false').lower() == 'true'
+
+# Области делового письма (DIN 5008) в порядке чтения
+REGION_ROLES = ["header", "address", "reference", "body", "footer"]
+
+# Режим сегментации Tesseract для каждой области:
+# 6 - один блок (адресное поле, блок реквизитов с Aktenzeichen/датой),
+# 4 - одна колонка строк разного размера (текст письма),
+# 3 - автоматическая разметка (шапка и подвал с банковскими реквизитами в несколько колонок)
+REGION_PSM = {"header": 3, "address": 6, "reference": 6, "body": 4, "footer": 3}
+
+# Ширина, до которой уменьшается страница для сегментации (~150 dpi для A4)
+LAYOUT_WORK_WIDTH = 1240
+# Блоки меньше этой доли страницы - шум (точки, пятна)
+LAYOUT_MIN_BLOCK_AREA = 0.0002
+# Доля пикселей чернил в рамке блока, выше которой блок - логотип, печать или фото
+LAYOUT_MAX_TEXT_FILL = 0.45
+# Поля вокруг вырезанной области для Tesseract (пиксели исходного изображения)
+LAYOUT_CROP_PADDING = 12
+
+
+def _binarize(gray: np.ndarray) -> np.ndarray:
+    """Чернила - 255, фон - 0; адаптивный порог устойчив к неравномерному освещению фото"""
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    # Длинные линии (рамки, линии сгиба, разделители) склеивают соседние блоки - убираем их
+    height, width = binary.shape
+    horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, width // 8), 1)))
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(1, height // 8))))
+    return cv2.subtract(binary, cv2.bitwise_or(horizontal, vertical))
+
+
+def _is_decorative(binary: np.ndarray, box: Tuple[int, int, int, int], page_height: int) -> bool:
+    """Логотип, печать, фото или графика: плотная заливка или мало крупных связных компонент вместо букв"""
+    x, y, w, h = box
+    block = binary[y:y + h, x:x + w]
+    fill = cv2.countNonZero(block) / float(w * h)
+    if fill > LAYOUT_MAX_TEXT_FILL:
+        return True
+    count, _, stats, _ = cv2.connectedComponentsWithStats(block, connectivity=8)
+    component_heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    if len(component_heights) < 3:
+        return True
+    # Буквы в письме не выше ~3% страницы; у логотипа и графики компоненты крупные
+    return float(np.median(component_heights)) > page_height * 0.03
+
+
+def segment_page(image: Image.Image) -> Tuple[List[Tuple[int, int, int, int]], List[Tuple[int, int, int, int]]]:
+    """
+    Сегментация страницы на текстовые блоки (OpenCV): бинаризация, удаление линий,
+    дилатация (буквы - в строки, строки - в абзацы), внешние контуры.
+    Возвращает (текстовые блоки, декоративные блоки) - рамки (x, y, w, h) в пикселях исходного изображения.
+    """
+    gray = np.array(image.convert('L'))
+    scale = min(1.0, LAYOUT_WORK_WIDTH / gray.shape[1])
+    if scale < 1.0:
+        gray = cv2.resize(gray, (LAYOUT_WORK_WIDTH, max(1, int(gray.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    height, width = gray.shape
+
+    binary = _binarize(gray)
+    # Горизонтально склеиваются слова строки (колонки адреса и реквизитов разделены шире),
+    # вертикально - строки абзаца (пустая строка между абзацами не склеивается)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, width // 50), max(3, height // 160)))
+    merged = cv2.dilate(binary, kernel)
+    contours, _ = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    text_blocks, decorative_blocks = [], []
+    for contour in contours:
+        box = cv2.boundingRect(contour)
+        if box[2] * box[3] < width * height * LAYOUT_MIN_BLOCK_AREA:
+            continue
+        original_box = tuple(int(round(value / scale)) for value in box)
+        if _is_decorative(binary, box, height):
+            decorative_blocks.append(original_box)
+        else:
+            text_blocks.append(original_box)
+    return text_blocks, decorative_blocks
+
+
+def classify_block(box: Tuple[int, int, int, int], page_size: Tuple[int, int]) -> str:
+    """
+    Роль блока по положению на листе A4 (DIN 5008): адресное поле - слева в верхней трети,
+    информационный блок (Aktenzeichen, дата) - справа вверху, подвал (банковские реквизиты) - внизу.
+    """
+    page_width, page_height = page_size
+    x, y, w, h = box
+    left, right = x / page_width, (x + w) / page_width
+    top, bottom = y / page_height, (y + h) / page_height
+    center_y = (top + bottom) / 2
+
+    if top >= 0.88:
+        return "footer"
+    if left >= 0.5 and top < 0.4 and bottom < 0.45:
+        return "reference"
+    if 0.09 <= center_y <= 0.33 and left < 0.45 and right <= 0.6:
+        return "address"
+    if bottom <= 0.12:
+        return "header"
+    return "body"
+
+
+def group_regions(text_blocks: List[Tuple[int, int, int, int]], page_size: Tuple[int, int]) -> List[Dict]:
+    """
+    Объединение блоков одной роли в область: {'role', 'bbox', 'psm', 'blocks', 'boxes'} в порядке чтения.
+    bbox - общая рамка блоков роли, поэтому рамки разных ролей могут перекрываться (текст письма
+    во всю ширину накрывает блок реквизитов справа); boxes - рамки самих блоков, см. foreign_blocks.
+    """
+    grouped: Dict[str, List[Tuple[int, int, int, int]]] = {}
+    for box in text_blocks:
+        grouped.setdefault(classify_block(box, page_size), []).append(box)
+
+    regions = []
+    for role in REGION_ROLES:
+        boxes = grouped.get(role)
+        if not boxes:
+            continue
+        left = min(x for x, _, _, _ in boxes)
+        top = min(y for _, y, _, _ in boxes)
+        right = max(x + w for x, _, w, _ in boxes)
+        bottom = max(y + h for _, y, _, h in boxes)
+        regions.append({
+            "role": role,
+            "bbox": [left, top, right - left, bottom - top],
+            "psm": REGION_PSM[role],
+            "blocks": len(boxes),
+            "boxes": boxes,
+        })
+    return regions
+
+
+def foreign_blocks(regions: List[Dict], region: Dict) -> List[Tuple[int, int, int, int]]:
+    """Блоки других областей: внутри рамки области они закрашиваются, чтобы их текст не распознавался дважды"""
+    return [box for other in regions if other is not region for box in other["boxes"]]
+
+
+def crop_region(image: Image.Image, bbox: List[int], masked_blocks: List[Tuple[int, int, int, int]],
+                scale: float = 1.0) -> Image.Image:
+    """
+    Вырезка области для Tesseract: попавшие внутрь masked_blocks (декоративные блоки и блоки
+    других областей) закрашиваются белым, вокруг добавляются поля. scale - отношение размера image
+    к размеру страницы сегментации (этап upscale улучшения изображения меняет размер).
+    """
+    left, top, width, height = (int(round(value * scale)) for value in bbox)
+    padding = int(LAYOUT_CROP_PADDING * scale)
+    box = (max(0, left - padding), max(0, top - padding),
+           min(image.width, left + width + padding), min(image.height, top + height + padding))
+    region = np.array(image.convert('L').crop(box))
+    for x, y, w, h in masked_blocks:
+        x0, y0 = int(x * scale) - box[0], int(y * scale) - box[1]
+        x1, y1 = int((x + w) * scale) - box[0], int((y + h) * scale) - box[1]
+        if x1 > 0 and y1 > 0 and x0 < region.shape[1] and y0 < region.shape[0]:
+            region[max(0, y0):max(0, y1), max(0, x0):max(0, x1)] = 255
+    return Image.fromarray(region)
+
+
+def layout_text(regions: List[Dict]) -> str:
+    """Текст страницы из областей в порядке чтения (области разделены пустой строкой)"""
+    return "\n\n".join(region["text"].strip() for region in regions if region.get("text", "").strip())
@@ -1,12 +1,12 @@
 import os
 import asyncio
 import logging
-import mimetypes
 from typing import Dict, Any, Optional, Tuple
 from abc import ABC, abstractmethod
 import tempfile
-import base64
 from PIL import Image
+from image_source import ImageSource
+from vision_payload import vision_payload_for, vision_payload_base64_for
 import google.generativeai as genai
 import openai
 from anthropic import Anthropic
@@ -46,7 +46,7 @@ class ModernLLMProvider(ABC):
         self.name = self.__class__.__name__
 
     @abstractmethod
-    async def generate_content(self, prompt: str, image_path: Optional[str] = None) -> str:
+    async def generate_content(self, prompt: str, image: Optional[ImageSource] = None) -> str:
         """Генерация контента с опциональным изображением"""
         pass
 
@@ -62,7 +62,7 @@ class ModernGeminiProvider(ModernLLMProvider):
         super().__init__(api_key, model_name)
         self.session_id = f"gemini_session_{hash(api_key)}"
 
-    async def generate_content(self, prompt: str, image_path: Optional[str] = None) -> str:
+    async def generate_content(self, prompt: str, image: Optional[ImageSource] = None) -> str:
         try:
             if not EMERGENT_INTEGRATIONS_AVAILABLE:
                 # Fallback mode - возвращаем информативное сообщение
@@ -72,7 +72,7 @@ class ModernGeminiProvider(ModernLLMProvider):
                     "Для полного анализа документов необходимо установить emergentintegrations. "
                     "Пожалуйста, обратитесь к администратору для настройки системы."
                 )
-                if image_path:
+                if image is not None:
                     fallback_message += "\n\n📄 Обнаружен файл изображения, но анализ изображений недоступен в текущем режиме."
                 return fallback_message
                 
@@ -90,12 +90,10 @@ class ModernGeminiProvider(ModernLLMProvider):
             user_message = UserMessage(text=prompt)
 
             # Если есть изображение, добавляем его в сообщение (используем FileContentWithMimeType для Gemini)
-            if image_path:
-                with open(image_path, 'rb') as file:
-                    file_content = file.read()
-                    mime_type = mimetypes.guess_type(image_path)[0] or 'image/jpeg'
-                    file_content_obj = FileContentWithMimeType(content=file_content, mime_type=mime_type)
-                    user_message.attachments = [file_content_obj]
+            if image is not None:
+                file_content, mime_type = await asyncio.get_running_loop().run_in_executor(None, vision_payload_for, image, "gemini")
+                file_content_obj = FileContentWithMimeType(content=file_content, mime_type=mime_type)
+                user_message.attachments = [file_content_obj]
 
             # Отправляем сообщение и получаем ответ
             response = await chat.send_message(user_message)
@@ -123,7 +121,7 @@ class ModernOpenAIProvider(ModernLLMProvider):
         super().__init__(api_key, model_name)
         self.session_id = f"openai_session_{hash(api_key)}"
 
-    async def generate_content(self, prompt: str, image_path: Optional[str] = None) -> str:
+    async def generate_content(self, prompt: str, image: Optional[ImageSource] = None) -> str:
         try:
             if not EMERGENT_INTEGRATIONS_AVAILABLE:
                 # Fallback mode - возвращаем информативное сообщение
@@ -133,7 +131,7 @@ class ModernOpenAIProvider(ModernLLMProvider):
                     "Для полного анализа документов необходимо установить emergentintegrations. "
                     "Пожалуйста, обратитесь к администратору для настройки системы."
                 )
-                if image_path:
+                if image is not None:
                     fallback_message += "\n\n📄 Обнаружен файл изображения, но анализ изображений недоступен в текущем режиме."
                 return fallback_message
                 
@@ -151,13 +149,10 @@ class ModernOpenAIProvider(ModernLLMProvider):
             user_message = UserMessage(text=prompt)
 
             # Если есть изображение, добавляем его в сообщение (используем base64 для OpenAI)
-            if image_path:
-                with open(image_path, 'rb') as file:
-                    file_content = file.read()
-                    base64_content = base64.b64encode(file_content).decode('utf-8')
-                    mime_type = mimetypes.guess_type(image_path)[0] or 'image/jpeg'
-                    image_content = ImageContent(base64_content=base64_content, mime_type=mime_type)
-                    user_message.attachments = [image_content]
+            if image is not None:
+                base64_content, mime_type = await asyncio.get_running_loop().run_in_executor(None, vision_payload_base64_for, image, "openai")
+                image_content = ImageContent(base64_content=base64_content, mime_type=mime_type)
+                user_message.attachments = [image_content]
 
             # Отправляем сообщение и получаем ответ
             response = await chat.send_message(user_message)
@@ -185,7 +180,7 @@ class ModernAnthropicProvider(ModernLLMProvider):
         super().__init__(api_key, model_name)
         self.session_id = f"anthropic_session_{hash(api_key)}"
 
-    async def generate_content(self, prompt: str, image_path: Optional[str] = None) -> str:
+    async def generate_content(self, prompt: str, image: Optional[ImageSource] = None) -> str:
         try:
             if not EMERGENT_INTEGRATIONS_AVAILABLE:
                 # Fallback mode - возвращаем информативное сообщение
@@ -195,7 +190,7 @@ class ModernAnthropicProvider(ModernLLMProvider):
                     "Для полного анализа документов необходимо установить emergentintegrations. "
                     "Пожалуйста, обратитесь к администратору для настройки системы."
                 )
-                if image_path:
+                if image is not None:
                     fallback_message += "\n\n📄 Обнаружен файл изображения, но анализ изображений недоступен в текущем режиме."
                 return fallback_message
                 
@@ -213,13 +208,10 @@ class ModernAnthropicProvider(ModernLLMProvider):
             user_message = UserMessage(text=prompt)
 
             # Если есть изображение, добавляем его в сообщение (используем base64 для Anthropic)
-            if image_path:
-                with open(image_path, 'rb') as file:
-                    file_content = file.read()
-                    base64_content = base64.b64encode(file_content).decode('utf-8')
-                    mime_type = mimetypes.guess_type(image_path)[0] or 'image/jpeg'
-                    image_content = ImageContent(base64_content=base64_content, mime_type=mime_type)
-                    user_message.attachments = [image_content]
+            if image is not None:
+                base64_content, mime_type = await asyncio.get_running_loop().run_in_executor(None, vision_payload_base64_for, image, "anthropic")
+                image_content = ImageContent(base64_content=base64_content, mime_type=mime_type)
+                user_message.attachments = [image_content]
 
             # Отправляем сообщение и получаем ответ
             response = await chat.send_message(user_message)
@@ -356,7 +348,7 @@ class ModernLLMManager:
             logger.error(f"API key test failed for {provider_type}: {e}")
             return False
 
-    async def generate_content(self, prompt: str, image_path: Optional[str] = None) -> Tuple[str, str]:
+    async def generate_content(self, prompt: str, image: Optional[ImageSource] = None) -> Tuple[str, str]:
         """Генерация контента с автоматическим выбором провайдера"""
         active_providers = [name for name, provider in self.providers.items() if provider.is_available()]
 
@@ -370,7 +362,7 @@ class ModernLLMManager:
             if provider_name in active_providers:
                 try:
                     provider = self.providers[provider_name]
-                    response = await provider.generate_content(prompt, image_path)
+                    response = await provider.generate_content(prompt, image)
                     return response, f"{provider_name.title()} (Modern)"
                 except Exception as e:
                     logger.warning(f"Modern provider {provider_name} failed: {e}")
@@ -0,0 +1,300 @@
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from database import db
+from document_artifact import DocumentArtifact
+from page_orientation import estimate_skew_angle
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+# Режим по умолчанию: off - не искать, offer - сообщить о похожем письме в ответе,
+# reuse - вернуть прошлый анализ вместо OCR и нового анализа
+NEAR_DUPLICATE_MODES = ("off", "offer", "reuse")
+OCR_NEAR_DUPLICATE_MODE = os.environ.get('OCR_NEAR_DUPLICATE_MODE', 'offer').lower()
+# Расстояние Хэмминга (из 256 бит), до которого фото считается тем же письмом.
+# Повторные фото одного письма (другой угол, свет, кадр) - обычно до ~25 бит, разные письма
+# в среднем ~40, но письма одного ведомства по одному шаблону бывают ближе (benchmark_near_duplicate.py)
+OCR_NEAR_DUPLICATE_MAX_DISTANCE = _env_int('OCR_NEAR_DUPLICATE_MAX_DISTANCE', 20)
+# Более строгий порог для автоматического повторного использования (режим reuse):
+# ошибка здесь - чужой анализ вместо нового, поэтому только почти совпадающие фото
+OCR_NEAR_DUPLICATE_REUSE_DISTANCE = _env_int('OCR_NEAR_DUPLICATE_REUSE_DISTANCE', 8)
+# Сколько последних загрузок пользователя участвует в поиске
+OCR_NEAR_DUPLICATE_MAX_ENTRIES = _env_int('OCR_NEAR_DUPLICATE_MAX_ENTRIES', 500)
+# Сколько пользователей держится в памяти (остальные загружаются из базы при следующей загрузке)
+OCR_NEAR_DUPLICATE_MEMORY_USERS = _env_int('OCR_NEAR_DUPLICATE_MEMORY_USERS', 256)
+
+# Методы OCR, результат которых нельзя выдавать повторно (ошибка, пусто, обработано частично)
+UNUSABLE_PROCESSING_METHODS = {"failed", "error", "truncated", "image_too_large", "ocr_budget_exhausted"}
+
+# Сетка хэша: 16x16 ячеек = 256 бит (4 слова uint64)
+HASH_GRID = 16
+HASH_WORDS = HASH_GRID * HASH_GRID // 64
+# Длинная сторона страницы при вычислении хэша
+HASH_PROBE_MAX_SIDE = 1000
+# Отступ от краев листа (доля стороны): тень, загнутые углы, край стола
+HASH_PAPER_MARGIN = 0.03
+# Доля выбросов с каждой стороны при поиске рамки текста (пятна и точки на полях)
+HASH_INK_OUTLIER_PERCENT = 0.5
+
+
+def _paper_crop(gray: np.ndarray) -> np.ndarray:
+    """Лист бумаги на фото: строки и столбцы, где светлых пикселей (порог Оцу) больше половины"""
+    _, bright = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    rows = np.flatnonzero(bright.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(bright.mean(axis=0) > 0.5)
+    if len(rows) < gray.shape[0] // 4 or len(cols) < gray.shape[1] // 4:
+        return gray
+    return gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def ink_density_grid(image: Image.Image, grid: int = HASH_GRID) -> np.ndarray:
+    """
+    Плотность текста на странице в сетке grid x grid. Перед этим фото приводится к самому письму:
+    EXIF поворот, обрезка фона вокруг листа, выравнивание наклона, адаптивная бинаризация
+    (неравномерный свет и тени не становятся "чернилами") и обрезка по рамке текста,
+    поэтому другой кадр, масштаб и яркость повторного фото почти не меняют сетку.
+    """
+    if image.format == 'JPEG':
+        # JPEG декодируется сразу в уменьшенном размере (в разы быстрее для фото 12+ Мп)
+        image.draft('L', (HASH_PROBE_MAX_SIDE, HASH_PROBE_MAX_SIDE))
+    gray = ImageOps.exif_transpose(image).convert('L')
+    gray.thumbnail((HASH_PROBE_MAX_SIDE, HASH_PROBE_MAX_SIDE))
+
+    page = Image.fromarray(_paper_crop(np.asarray(gray)))
+    angle = estimate_skew_angle(page)
+    if abs(angle) >= 0.3:
+        page = page.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+
+    pixels = np.asarray(page)
+    margin_y, margin_x = int(pixels.shape[0] * HASH_PAPER_MARGIN), int(pixels.shape[1] * HASH_PAPER_MARGIN)
+    pixels = np.ascontiguousarray(pixels[margin_y:pixels.shape[0] - margin_y, margin_x:pixels.shape[1] - margin_x])
+    ink = cv2.adaptiveThreshold(pixels, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+
+    ys, xs = np.nonzero(ink)
+    if len(ys) > 50:
+        y0, y1 = np.percentile(ys, [HASH_INK_OUTLIER_PERCENT, 100 - HASH_INK_OUTLIER_PERCENT]).astype(int)
+        x0, x1 = np.percentile(xs, [HASH_INK_OUTLIER_PERCENT, 100 - HASH_INK_OUTLIER_PERCENT]).astype(int)
+        ink = ink[y0:y1 + 1, x0:x1 + 1]
+    return cv2.resize(ink, (grid, grid), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    """
+    Перцептивный хэш письма (256 бит, hex): ячейка сетки плотнее средней - 1.
+    Для документов этот вариант average hash по плотности текста устойчивее dHash/pHash по яркости:
+    на почти белой странице соседние ячейки яркости отличаются шумом, а плотность текста - нет.
+    """
+    # Легкое сглаживание сетки: строка текста на границе ячеек при другом кадре не переключает оба бита
+    grid = cv2.GaussianBlur(ink_density_grid(image), (3, 3), 1.0)
+    bits = np.packbits((grid > grid.mean()).ravel())
+    return bits.tobytes().hex()
+
+
+def hash_words(image_hash: str) -> np.ndarray:
+    """Хэш в виде слов uint64 для векторного расстояния Хэмминга"""
+    return np.frombuffer(bytes.fromhex(image_hash), dtype='>u8').astype(np.uint64)
+
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount_rows(words: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+else:
+    def _popcount_rows(words: np.ndarray) -> np.ndarray:
+        # numpy < 2.0: подсчет бит по байтам
+        return np.unpackbits(words.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+def hamming_distances(hashes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Расстояния Хэмминга от query до всех хэшей индекса (матрица N x HASH_WORDS) одним векторным проходом"""
+    if not len(hashes):
+        return np.zeros(0, dtype=np.int64)
+    return _popcount_rows(np.bitwise_xor(hashes, query))
+
+
+def is_reusable_analysis(text_extracted: bool, processing_method: str) -> bool:
+    """
+    Анализ можно индексировать и выдавать для повторного фото: текст действительно распознан
+    (не заглушка "текст не был извлечен") и ни один метод OCR не завершился ошибкой.
+    Иначе более четкое повторное фото того же письма получило бы неудачный анализ без OCR.
+    """
+    return bool(text_extracted) and not UNUSABLE_PROCESSING_METHODS & set(re.split(r'[:+]', processing_method or ""))
+
+
+class _UserHashes:
+    """Последние загрузки одного пользователя: матрица хэшей и данные анализов в том же порядке"""
+
+    def __init__(self):
+        self.hashes = np.zeros((0, HASH_WORDS), dtype=np.uint64)
+        self.entries: List[Dict[str, Any]] = []
+
+    def add(self, words: np.ndarray, entry: Dict[str, Any], max_entries: int):
+        self.hashes = np.vstack([self.hashes, words[None, :]])[-max_entries:]
+        self.entries = (self.entries + [entry])[-max_entries:]
+
+
+class NearDuplicateIndex:
+    """
+    Индекс последних загрузок каждого пользователя по перцептивному хэшу.
+    Повторное фото того же письма имеет другие байты (кэш OCR по SHA-256 его не находит),
+    но близкий хэш: такое фото находится по расстоянию Хэмминга, и вместо OCR и нового анализа
+    можно предложить (или сразу вернуть) прошлый анализ.
+    Хэши хранятся в таблице анализов (analyses.image_hash); в памяти - матрица uint64
+    на пользователя, поиск - один векторный XOR + popcount по всей матрице.
+    """
+
+    def __init__(self):
+        self.mode = OCR_NEAR_DUPLICATE_MODE if OCR_NEAR_DUPLICATE_MODE in NEAR_DUPLICATE_MODES else "offer"
+        self.max_distance = OCR_NEAR_DUPLICATE_MAX_DISTANCE
+        self.reuse_distance = min(OCR_NEAR_DUPLICATE_REUSE_DISTANCE, OCR_NEAR_DUPLICATE_MAX_DISTANCE)
+        self.max_entries = max(1, OCR_NEAR_DUPLICATE_MAX_ENTRIES)
+        self.memory_users = max(1, OCR_NEAR_DUPLICATE_MEMORY_USERS)
+
+        self._users: "OrderedDict[str, _UserHashes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hashed": 0, "hash_errors": 0, "lookups": 0, "matches": 0, "reused": 0,
+                      "hash_ms": 0.0, "lookup_ms": 0.0}
+
+    def resolve_mode(self, requested: Optional[str] = None) -> str:
+        """Режим запроса: значение из формы, если оно допустимо, иначе OCR_NEAR_DUPLICATE_MODE"""
+        requested = (requested or "").lower()
+        return requested if requested in NEAR_DUPLICATE_MODES else self.mode
+
+    def compute_hash(self, document: Union[DocumentArtifact, Image.Image]) -> Optional[str]:
+        """
+        Хэш загруженного изображения (для многостраничного TIFF/GIF - первого кадра).
+        PDF и другие документы не хэшируются: None. Блокирующий вызов - выполнять в пуле OCR.
+        """
+        started = time.perf_counter()
+        try:
+            if isinstance(document, DocumentArtifact):
+                if not document.mime_type.startswith('image/'):
+                    return None
+                with Image.open(document.path) as image:
+                    image_hash = perceptual_hash(image)
+            else:
+                image_hash = perceptual_hash(document)
+        except Exception as e:
+            logger.warning(f"Perceptual hash failed: {e}")
+            self.stats["hash_errors"] += 1
+            return None
+        self.stats["hashed"] += 1
+        self.stats["hash_ms"] += (time.perf_counter() - started) * 1000
+        return image_hash
+
+    async def _user_hashes(self, user_id: str) -> _UserHashes:
+        """Индекс пользователя из памяти или из таблицы анализов (последние max_entries загрузок)"""
+        with self._lock:
+            user_hashes = self._users.get(user_id)
+            if user_hashes is not None:
+                self._users.move_to_end(user_id)
+                return user_hashes
+
+        user_hashes = _UserHashes()
+        try:
+            rows = await db.get_user_image_hashes(user_id, self.max_entries)
+            # Из базы - от новых к старым; в индексе - от старых к новым
+            entries = [self._entry(row) for row in reversed(rows)]
+            if entries:
+                user_hashes.hashes = np.vstack([hash_words(row["image_hash"]) for row in reversed(rows)])
+                user_hashes.entries = entries
+        except Exception as e:
+            logger.warning(f"Failed to load near-duplicate index for user {user_id}: {e}")
+
+        with self._lock:
+            # Пока шла загрузка, индекс мог появиться в другом запросе - используем его
+            existing = self._users.get(user_id)
+            if existing is not None:
+                return existing
+            self._users[user_id] = user_hashes
+            while len(self._users) > self.memory_users:
+                self._users.popitem(last=False)
+        return user_hashes
+
+    @staticmethod
+    def _entry(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "analysis_id": row["id"],
+            "file_name": row["file_name"],
+            "analysis_language": row["analysis_language"],
+            "timestamp": row["timestamp"],
+        }
+
+    async def find(self, user_id: str, image_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Самая близкая прошлая загрузка пользователя в пределах max_distance:
+        {'analysis_id', 'file_name', 'analysis_language', 'timestamp', 'distance', 'reusable'} или None.
+        reusable - расстояние не больше порога автоматического повторного использования.
+        """
+        if not image_hash or not user_id:
+            return None
+        user_hashes = await self._user_hashes(user_id)
+
+        started = time.perf_counter()
+        with self._lock:
+            hashes, entries = user_hashes.hashes, user_hashes.entries
+        distances = hamming_distances(hashes, hash_words(image_hash))
+        self.stats["lookups"] += 1
+        self.stats["lookup_ms"] += (time.perf_counter() - started) * 1000
+        if not len(distances):
+            return None
+
+        best = int(np.argmin(distances))
+        distance = int(distances[best])
+        if distance > self.max_distance:
+            return None
+        self.stats["matches"] += 1
+        logger.info(f"Near-duplicate upload for user {user_id}: {entries[best]['file_name']}, distance {distance}")
+        return {**entries[best], "distance": distance, "reusable": distance <= self.reuse_distance}
+
+    def add(self, user_id: str, image_hash: Optional[str], analysis: Dict[str, Any]):
+        """Новая загрузка в индексе пользователя (analysis - запись, сохраненная в таблице анализов)"""
+        if not image_hash or not user_id:
+            return
+        entry = self._entry({"id": analysis["id"], "file_name": analysis["file_name"],
+                             "analysis_language": analysis["analysis_language"],
+                             "timestamp": analysis.get("timestamp") or datetime.utcnow().isoformat()})
+        with self._lock:
+            user_hashes = self._users.get(user_id)
+            # Индекс пользователя, которого нет в памяти, будет загружен из базы вместе с этой записью
+            if user_hashes is not None:
+                user_hashes.add(hash_words(image_hash), entry, self.max_entries)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Статус индекса для /api/ocr-status"""
+        with self._lock:
+            indexed = sum(len(user_hashes.entries) for user_hashes in self._users.values())
+            users = len(self._users)
+        return {
+            "mode": self.mode,
+            "max_distance": self.max_distance,
+            "reuse_distance": self.reuse_distance,
+            "max_entries_per_user": self.max_entries,
+            "users_in_memory": users,
+            "indexed_uploads": indexed,
+            **self.stats,
+            "hash_ms": round(self.stats["hash_ms"], 1),
+            "lookup_ms": round(self.stats["lookup_ms"], 3),
+        }
+
+
+# Глобальный индекс почти-дубликатов
+near_duplicate_index = NearDuplicateIndex()
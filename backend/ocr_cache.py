@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import aiosqlite
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Union
+
+from document_artifact import DocumentArtifact
+
+logger = logging.getLogger(__name__)
+
+# Каталог кэша, если не заданы OCR_CACHE_DB_PATH и SQLITE_DB_PATH (том с данными в Docker образе)
+OCR_CACHE_DEFAULT_DIR = '/app/data'
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 содержимого файла (читается блоками, без загрузки целиком в память)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Кэш результатов OCR по содержимому загруженного файла.
+    Ключ: SHA-256 байтов файла + версия/конфигурация OCR движка,
+    поэтому смена настроек OCR автоматически делает старые записи неактуальными.
+    Два уровня: LRU в памяти процесса и постоянный SQLite с вытеснением по суммарному размеру.
+    """
+
+    def __init__(self, db_path: str = None):
+        if db_path is None:
+            # В кэше распознанный текст писем пользователей: только каталог данных (рядом с основной БД),
+            # а не рабочий каталог процесса, где файл легко попадает в репозиторий
+            data_dir = os.path.dirname(os.environ.get('SQLITE_DB_PATH', '')) or OCR_CACHE_DEFAULT_DIR
+            db_path = os.environ.get('OCR_CACHE_DB_PATH', os.path.join(data_dir, 'ocr_cache.db'))
+        self.db_path = db_path
+        self.enabled = os.environ.get('OCR_CACHE_ENABLED', 'true').lower() != 'false'
+        self.memory_max_items = int(os.environ.get('OCR_CACHE_MEMORY_ITEMS', '128'))
+        self.disk_max_bytes = int(os.environ.get('OCR_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self.disk_available = self._init_database()
+
+    def _init_database(self) -> bool:
+        """Создание таблицы кэша (при ошибке работает только уровень в памяти)"""
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    extracted_text TEXT NOT NULL,
+                    processing_method TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_access ON ocr_cache (last_access)')
+            # Области письма (JSON) из анализа раскладки - для ответа при попадании в кэш
+            try:
+                conn.execute('ALTER TABLE ocr_cache ADD COLUMN layout_regions TEXT')
+            except sqlite3.OperationalError:
+                # Колонка уже существует
+                pass
+            conn.commit()
+            conn.close()
+            logger.info(f"OCR cache initialized at {self.db_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"OCR cache database unavailable, using memory tier only: {e}")
+            return False
+
+    @asynccontextmanager
+    async def get_connection(self):
+        async with aiosqlite.connect(self.db_path) as conn:
+            yield conn
+
+    @staticmethod
+    def make_key(file_path: Union[str, DocumentArtifact], engine_fingerprint: str) -> str:
+        """Ключ кэша: хэш файла (для DocumentArtifact - его общий SHA-256) + версия/конфигурация OCR"""
+        engine_hash = hashlib.sha256(engine_fingerprint.encode('utf-8')).hexdigest()[:16]
+        if isinstance(file_path, DocumentArtifact):
+            return f"{file_path.sha256}:{engine_hash}"
+        return f"{file_sha256(file_path)}:{engine_hash}"
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        with self._memory_lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max_items:
+                self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Поиск результата OCR: {'text', 'processing_method', 'tier'} или None"""
+        if not self.enabled:
+            return None
+
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            self.stats["memory_hits"] += 1
+            return {**entry, "tier": "memory"}
+
+        if self.disk_available:
+            try:
+                async with self.get_connection() as conn:
+                    async with conn.execute(
+                        'SELECT extracted_text, processing_method, layout_regions FROM ocr_cache WHERE cache_key = ?', (key,)
+                    ) as cursor:
+                        row = await cursor.fetchone()
+                    if row:
+                        await conn.execute('UPDATE ocr_cache SET last_access = ? WHERE cache_key = ?', (time.time(), key))
+                        await conn.commit()
+                if row:
+                    entry = {"text": row[0], "processing_method": row[1],
+                             "layout_regions": json.loads(row[2]) if row[2] else None}
+                    self._remember(key, entry)
+                    self.stats["disk_hits"] += 1
+                    return {**entry, "tier": "disk"}
+            except Exception as e:
+                logger.warning(f"OCR cache lookup failed: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, text: str, processing_method: str, layout_regions: Optional[List[dict]] = None):
+        """
+        Сохранение результата OCR (ошибки, пустые и обрезанные по бюджету результаты не кэшируются).
+        layout_regions - области письма, если документ распознан по областям.
+        """
+        if not self.enabled or not text or len(text.strip()) < 10:
+            return
+        if {"failed", "error", "truncated"} & set(re.split(r'[:+]', processing_method)):
+            return
+
+        entry = {"text": text, "processing_method": processing_method, "layout_regions": layout_regions}
+        self._remember(key, entry)
+        self.stats["stores"] += 1
+
+        if not self.disk_available:
+            return
+        try:
+            now = time.time()
+            async with self.get_connection() as conn:
+                await conn.execute('''
+                    INSERT OR REPLACE INTO ocr_cache
+                    (cache_key, extracted_text, processing_method, size_bytes, created_at, last_access, layout_regions)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (key, text, processing_method, len(text.encode('utf-8')), now, now,
+                      json.dumps(layout_regions) if layout_regions else None))
+                await conn.commit()
+                await self._evict(conn)
+        except Exception as e:
+            logger.warning(f"OCR cache store failed: {e}")
+
+    async def _evict(self, conn):
+        """Удаление давно не использованных записей, пока кэш больше OCR_CACHE_MAX_BYTES"""
+        async with conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM ocr_cache') as cursor:
+            total_bytes = (await cursor.fetchone())[0]
+        if total_bytes <= self.disk_max_bytes:
+            return
+
+        evict_keys = []
+        async with conn.execute('SELECT cache_key, size_bytes FROM ocr_cache ORDER BY last_access ASC') as cursor:
+            async for cache_key, size_bytes in cursor:
+                if total_bytes <= self.disk_max_bytes:
+                    break
+                evict_keys.append(cache_key)
+                total_bytes -= size_bytes
+        await conn.executemany('DELETE FROM ocr_cache WHERE cache_key = ?', [(k,) for k in evict_keys])
+        await conn.commit()
+        self.stats["evictions"] += len(evict_keys)
+        logger.info(f"OCR cache evicted {len(evict_keys)} entries")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Статус кэша для /api/ocr-status"""
+        return {
+            "enabled": self.enabled,
+            "disk_available": self.disk_available,
+            "memory_items": len(self._memory),
+            "memory_max_items": self.memory_max_items,
+            "disk_max_bytes": self.disk_max_bytes,
+            **self.stats
+        }
+
+
+# Глобальный экземпляр кэша OCR
+ocr_cache = OCRCache()
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OCRQueueFullError(RuntimeError):
+    """Очередь OCR заполнена - задание отклонено"""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+class OCRExecutor:
+    """
+    Ограниченный пул для CPU-задач OCR (OpenCV, Tesseract, растеризация, разбор PDF).
+    Задания выполняются вне event loop, поэтому во время OCR сервер продолжает отвечать
+    на остальные запросы. Одновременно выполняется OCR_EXECUTOR_WORKERS заданий,
+    еще OCR_EXECUTOR_QUEUE_DEPTH ждут в очереди; сверх этого задания отклоняются.
+    """
+
+    def __init__(self):
+        self.max_workers = max(1, _env_int('OCR_EXECUTOR_WORKERS', os.cpu_count() or 1))
+        self.max_queue_depth = max(0, _env_int('OCR_EXECUTOR_QUEUE_DEPTH', 32))
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.wait_times = deque(maxlen=200)
+        self.run_times = deque(maxlen=200)
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr")
+        return self._executor
+
+    @property
+    def queue_length(self) -> int:
+        """Задания, ожидающие свободного потока"""
+        return max(0, self._pending - self._running)
+
+    def is_saturated(self) -> bool:
+        """Очередь заполнена: новые задания будут отклонены"""
+        return self._pending >= self.max_workers + self.max_queue_depth
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Выполнение func(*args) в пуле OCR; OCRQueueFullError, если очередь заполнена"""
+        if self.is_saturated():
+            self.stats["rejected"] += 1
+            raise OCRQueueFullError(
+                f"OCR queue is full ({self._pending} jobs, limit {self.max_workers + self.max_queue_depth})"
+            )
+
+        queued_at = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            self.wait_times.append(started - queued_at)
+            try:
+                return func(*args)
+            finally:
+                self.run_times.append(time.perf_counter() - started)
+                with self._lock:
+                    self._running -= 1
+
+        self._pending += 1
+        self.stats["submitted"] += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), job)
+            self.stats["completed"] += 1
+            return result
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def _summary(values) -> Dict[str, Optional[float]]:
+        if not values:
+            return {"avg": None, "p95": None, "max": None}
+        ordered = sorted(values)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max": round(ordered[-1], 3),
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """Метрики для /api/ocr-status: длина очереди, время ожидания и выполнения (секунды)"""
+        return {
+            "workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+            "running": self._running,
+            "queue_length": self.queue_length,
+            "saturated": self.is_saturated(),
+            "wait_seconds": self._summary(list(self.wait_times)),
+            "run_seconds": self._summary(list(self.run_times)),
+            **self.stats
+        }
+
+
+# Глобальный экземпляр пула OCR
+ocr_executor = OCRExecutor()
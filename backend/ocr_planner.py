@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Стоимость попытки в условных единицах: локальные методы бесплатны,
+# каждый вызов внешнего API или LLM провайдера - одна единица
+ENGINE_COSTS = {
+    "pdf_text_layer": 0,
+    "tesseract": 0,
+    "tesseract_layout": 0,
+    "document_processor": 0,
+    "llm_vision": 1,
+    "ocr_space": 1,
+    "azure_vision": 1,
+    "google_vision": 1,
+}
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+class OCRFallbackPlan:
+    """
+    План fallback для одного запроса на распознавание.
+    Запоминает, какие методы и провайдеры уже вызывались для каждой цели (изображение,
+    страница PDF), и не допускает повторного вызова того же провайдера для той же цели.
+    Ограничивает общее время (OCR_REQUEST_TIME_BUDGET, секунды) и стоимость
+    (OCR_REQUEST_MAX_COST, платные вызовы); 0 - без ограничения.
+    Все попытки и пропуски сохраняются в trace.
+    """
+
+    def __init__(self, max_seconds: Optional[float] = None, max_cost: Optional[float] = None):
+        if max_seconds is None:
+            max_seconds = _env_number('OCR_REQUEST_TIME_BUDGET', 180)
+        if max_cost is None:
+            max_cost = _env_number('OCR_REQUEST_MAX_COST', 8)
+        self.max_seconds = max_seconds if max_seconds > 0 else None
+        self.max_cost = max_cost if max_cost > 0 else None
+        self.started = time.monotonic()
+        self.cost = 0.0
+        self.trace: List[Dict[str, Any]] = []
+        self._tried = set()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def _skip(self, engine: str, provider: Optional[str], target: str, reason: str) -> bool:
+        self.trace.append({
+            "engine": engine, "provider": provider, "target": target,
+            "outcome": "skipped", "reason": reason, "at_seconds": round(self.elapsed(), 3)
+        })
+        logger.info(f"OCR plan: skipping {engine}{f'/{provider}' if provider else ''} for {target}: {reason}")
+        return False
+
+    def should_try(self, engine: str, provider: Optional[str] = None, target: str = "document") -> bool:
+        """Можно ли вызвать метод: не вызывался для этой цели и бюджет не исчерпан"""
+        if (engine, provider, target) in self._tried:
+            return self._skip(engine, provider, target, "already tried")
+        if self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+            return self._skip(engine, provider, target, f"time budget {self.max_seconds:.0f}s exhausted")
+        cost = ENGINE_COSTS.get(engine, 1)
+        if cost and self.max_cost is not None and self.cost + cost > self.max_cost:
+            return self._skip(engine, provider, target, f"cost budget {self.max_cost:g} exhausted")
+        return True
+
+    def mark_tried(self, engine: str, provider: Optional[str] = None, target: str = "document",
+                   text: str = "", seconds: float = 0.0):
+        """Запись попытки, выполненной вне attempt (например, Tesseract в потоковом OCR страниц PDF)"""
+        self._tried.add((engine, provider, target))
+        self.trace.append({
+            "engine": engine, "provider": provider, "target": target,
+            "outcome": "text" if text and text.strip() else "empty",
+            "chars": len(text.strip()) if text else 0,
+            "seconds": round(seconds, 3), "at_seconds": round(self.elapsed(), 3)
+        })
+
+    @contextmanager
+    def attempt(self, engine: str, provider: Optional[str] = None, target: str = "document"):
+        """
+        Учет одной попытки: время, стоимость и результат.
+        Вызывающий код записывает распознанный текст в record["text"].
+        """
+        self._tried.add((engine, provider, target))
+        self.cost += ENGINE_COSTS.get(engine, 1)
+        record = {"text": ""}
+        started = time.monotonic()
+        outcome = None
+        try:
+            yield record
+        except BaseException as e:
+            # Включая CancelledError: проигравший в hedged OCR отменяется
+            outcome = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+            raise
+        finally:
+            text = record.get("text") or ""
+            self.trace.append({
+                "engine": engine, "provider": provider, "target": target,
+                "outcome": outcome or ("text" if text.strip() else "empty"),
+                "chars": len(text.strip()),
+                "seconds": round(time.monotonic() - started, 3),
+                "at_seconds": round(self.elapsed(), 3)
+            })
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Трасса попыток для ответа API и логов"""
+        return {
+            "attempts": sum(1 for entry in self.trace if entry["outcome"] != "skipped"),
+            "skipped": sum(1 for entry in self.trace if entry["outcome"] == "skipped"),
+            "cost": self.cost,
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "trace": self.trace,
+        }
@@ -0,0 +1,176 @@
+import os
+import time
+import logging
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+import PyPDF2
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+logger = logging.getLogger(__name__)
+
+
+def get_pdf_page_count(pdf_path: str) -> int:
+    """Количество страниц PDF (pdfinfo, при ошибке - PyPDF2)"""
+    try:
+        return int(pdfinfo_from_path(pdf_path)["Pages"])
+    except Exception as e:
+        logger.warning(f"pdfinfo failed, counting pages with PyPDF2: {e}")
+    with open(pdf_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def iter_pdf_pages(pdf_path: str, dpi: int = 300, first_page: int = 1,
+                   last_page: Optional[int] = None,
+                   page_numbers: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Постраничная растеризация PDF: (номер страницы, изображение).
+    В отличие от convert_from_path для всего диапазона, в памяти одновременно
+    находится только текущая страница - пиковое потребление не зависит от числа страниц.
+    Вызывающий код должен отпустить изображение до запроса следующей страницы.
+    page_numbers (с 1) задает конкретные страницы вместо диапазона first_page..last_page.
+    """
+    if page_numbers is None:
+        page_count = get_pdf_page_count(pdf_path)
+        if last_page is None or last_page > page_count:
+            last_page = page_count
+        page_numbers = range(first_page, last_page + 1)
+
+    for page_number in page_numbers:
+        image = render_pdf_page(pdf_path, page_number, dpi)
+        if image is not None:
+            yield page_number, image
+
+
+def render_pdf_page(pdf_path: str, page_number: int, dpi: int = 300) -> Optional[Image.Image]:
+    """Растеризация одной страницы PDF (None, если страницу не удалось растеризовать)"""
+    try:
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    except Exception as e:
+        logger.error(f"Failed to rasterize PDF page {page_number}: {e}")
+        return None
+    if not images:
+        return None
+    # Разрешение растеризации нужно нормализации перед OCR (страница уже в целевом DPI)
+    images[0].info['dpi'] = (dpi, dpi)
+    return images[0]
+
+
+# Форматы, в которых кадры - это страницы документа. MPO / Ultra HDR фото с телефона Pillow
+# открывает с n_frames == 2 (JPEG и карта усиления), но это одно изображение
+MULTI_PAGE_IMAGE_FORMATS = {"TIFF", "GIF"}
+
+
+def get_image_frame_count(image_path: str) -> int:
+    """Количество кадров изображения (страницы многостраничного TIFF, кадры GIF); 1 для остальных форматов"""
+    try:
+        with Image.open(image_path) as image:
+            if image.format not in MULTI_PAGE_IMAGE_FORMATS:
+                return 1
+            return getattr(image, 'n_frames', 1)
+    except Exception as e:
+        logger.warning(f"Failed to count image frames: {e}")
+        return 1
+
+
+def _frame_to_page(frame: Image.Image) -> Image.Image:
+    """
+    Копия текущего кадра, независимая от файла. Факс (1 бит) и палитра переводятся в L/RGB;
+    у факса "normal" (204x98 dpi) пиксели вытянуты по вертикали - кадр приводится к квадратным пикселям.
+    """
+    # TIFF хранит разрешение как IFDRational
+    dpi = tuple(float(value) for value in frame.info.get('dpi') or ())
+    page = frame.convert('L' if frame.mode in ('1', 'L', 'I;16') else 'RGB')
+    if len(dpi) == 2 and min(dpi) > 0 and abs(dpi[0] - dpi[1]) > 0.1 * max(dpi):
+        x_dpi, y_dpi = dpi
+        page = page.resize((page.width, max(1, round(page.height * x_dpi / y_dpi))), Image.BILINEAR)
+        dpi = (x_dpi, x_dpi)
+    if dpi:
+        page.info['dpi'] = dpi
+    return page
+
+
+def iter_image_frames(image_path: str, frame_numbers: Iterable[int]) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Покадровое чтение многостраничного изображения: (номер кадра с 1, изображение).
+    Как и iter_pdf_pages, в памяти одновременно находится только текущий кадр:
+    файл открывается один раз, кадры декодируются по мере запроса (seek).
+    """
+    with Image.open(image_path) as image:
+        frame_count = getattr(image, 'n_frames', 1) if image.format in MULTI_PAGE_IMAGE_FORMATS else 1
+        for frame_number in frame_numbers:
+            if frame_number < 1 or frame_number > frame_count:
+                continue
+            try:
+                image.seek(frame_number - 1)
+                page = _frame_to_page(image)
+            except Exception as e:
+                logger.error(f"Failed to decode image frame {frame_number}: {e}")
+                continue
+            yield frame_number, page
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+class PDFPageBudget:
+    """
+    Лимит OCR на один PDF: число растеризуемых страниц и время обработки.
+    Верхние границы задает администратор (OCR_PDF_MAX_PAGES, OCR_PDF_TIME_BUDGET; 0 - без ограничения),
+    пользователь может только уменьшить их для своего запроса.
+    Бюджет проверяется перед растеризацией каждой следующей страницы.
+    """
+
+    def __init__(self, max_pages: Optional[int] = None, max_seconds: Optional[float] = None):
+        admin_pages = int(_env_number('OCR_PDF_MAX_PAGES', 100))
+        admin_seconds = _env_number('OCR_PDF_TIME_BUDGET', 300)
+        self.max_pages = self._clamp(max_pages, admin_pages)
+        self.max_seconds = self._clamp(max_seconds, admin_seconds)
+        self.started = time.monotonic()
+        self.pages_started = 0
+        self.total_pages = 0
+        self.truncated_at: Optional[int] = None
+        self.reason: Optional[str] = None
+
+    @staticmethod
+    def _clamp(requested, admin_limit):
+        if admin_limit and admin_limit > 0:
+            return min(requested, admin_limit) if requested and requested > 0 else admin_limit
+        return requested if requested and requested > 0 else None
+
+    @property
+    def truncated(self) -> bool:
+        return self.truncated_at is not None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def limit(self, page_numbers: Sequence[int]) -> Iterator[int]:
+        """Номера страниц, пока не исчерпан бюджет; при остановке запоминает первую пропущенную страницу"""
+        self.total_pages = len(page_numbers)
+        for page_number in page_numbers:
+            if self.max_pages is not None and self.pages_started >= self.max_pages:
+                self.reason = f"лимит {self.max_pages} стр."
+            elif self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+                self.reason = f"лимит времени {self.max_seconds:.0f} с"
+            if self.reason:
+                # Бюджет общий для fallback-сервисов запроса: страницу остановки задает первый, кто в него уперся
+                if self.truncated_at is None:
+                    self.truncated_at = page_number
+                logger.warning(f"PDF OCR truncated at page {page_number}: {self.reason}")
+                return
+            self.pages_started += 1
+            yield page_number
+
+    def truncation_marker(self) -> str:
+        """Пометка в тексте результата о том, что документ обработан не полностью"""
+        skipped = self.total_pages - self.pages_started
+        return (
+            f"--- Документ обработан частично: распознавание остановлено на странице {self.truncated_at} "
+            f"({self.reason}), не распознано страниц: {skipped} ---"
+        )
@@ -0,0 +1,142 @@
+import os
+import shutil
+import logging
+import threading
+import subprocess
+import importlib.util
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from document_artifact import DocumentArtifact
+
+logger = logging.getLogger(__name__)
+
+# Бэкенд текстового слоя PDF: имя или список по приоритету через запятую ("pdfium,pypdf2");
+# используется первый доступный, PyPDF2 - всегда последний запасной вариант
+PDF_TEXT_BACKEND = os.environ.get('PDF_TEXT_BACKEND', 'pypdf2').lower()
+PDFTOTEXT_TIMEOUT = 120
+
+
+class PDFTextBackend(ABC):
+    """
+    Извлечение текстового слоя PDF по страницам.
+    extract_page_texts возвращает текст каждой страницы (пустая строка - страница без текста).
+    """
+
+    name = ""
+
+    def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def extract_page_texts(self, document: "DocumentArtifact") -> List[str]:
+        """Текст каждой страницы PDF"""
+        pass
+
+
+class PyPDF2Backend(PDFTextBackend):
+    """PyPDF2 (чистый Python): всегда доступен, но медленный на больших PDF и теряет раскладку"""
+
+    name = "pypdf2"
+
+    def extract_page_texts(self, document: "DocumentArtifact") -> List[str]:
+        page_texts = []
+        for page in document.pdf_reader.pages:
+            try:
+                page_texts.append(page.extract_text() or "")
+            except Exception as e:
+                logger.warning(f"Text layer extraction failed for PDF page {len(page_texts) + 1}: {e}")
+                page_texts.append("")
+        return page_texts
+
+
+class PdfiumBackend(PDFTextBackend):
+    """pypdfium2 (PDFium из Chromium): в разы быстрее PyPDF2, порядок текста как при выделении в браузере"""
+
+    name = "pdfium"
+    # PDFium не потокобезопасен: документы из разных потоков пула OCR разбираются по очереди
+    _lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec('pypdfium2') is not None
+
+    def extract_page_texts(self, document: "DocumentArtifact") -> List[str]:
+        import pypdfium2
+
+        with self._lock:
+            pdf = pypdfium2.PdfDocument(document.path)
+            try:
+                page_texts = []
+                for page in pdf:
+                    text_page = page.get_textpage()
+                    try:
+                        page_texts.append(text_page.get_text_range().replace('\r\n', '\n'))
+                    finally:
+                        text_page.close()
+                        page.close()
+                return page_texts
+            finally:
+                pdf.close()
+
+
+class PyMuPDFBackend(PDFTextBackend):
+    """PyMuPDF (MuPDF): быстрый, блоки текста сортируются по положению на странице (колонки, таблицы)"""
+
+    name = "pymupdf"
+    # MuPDF также не рассчитан на одновременные вызовы из нескольких потоков
+    _lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec('fitz') is not None
+
+    def extract_page_texts(self, document: "DocumentArtifact") -> List[str]:
+        import fitz
+
+        with self._lock, fitz.open(document.path, filetype='pdf') as pdf:
+            return [page.get_text("text", sort=True) for page in pdf]
+
+
+class PdftotextBackend(PDFTextBackend):
+    """pdftotext -layout (poppler, уже нужен для pdf2image): сохраняет колонки и отступы, без Python зависимостей"""
+
+    name = "pdftotext"
+
+    def is_available(self) -> bool:
+        return shutil.which('pdftotext') is not None
+
+    def extract_page_texts(self, document: "DocumentArtifact") -> List[str]:
+        result = subprocess.run(
+            ['pdftotext', '-layout', '-enc', 'UTF-8', document.path, '-'],
+            capture_output=True, timeout=PDFTOTEXT_TIMEOUT, check=True
+        )
+        # Страницы разделены символом перевода страницы; после последней страницы он тоже есть
+        page_texts = result.stdout.decode('utf-8', errors='replace').split('\f')
+        if page_texts and page_texts[-1] == "":
+            page_texts.pop()
+        return page_texts
+
+
+PDF_TEXT_BACKENDS: Dict[str, PDFTextBackend] = {
+    backend.name: backend
+    for backend in (PyPDF2Backend(), PdfiumBackend(), PyMuPDFBackend(), PdftotextBackend())
+}
+
+
+def get_pdf_text_backend(preference: Optional[str] = None) -> PDFTextBackend:
+    """Первый доступный бэкенд из списка (по умолчанию PDF_TEXT_BACKEND); PyPDF2, если ни один не доступен"""
+    for name in (preference or PDF_TEXT_BACKEND).split(','):
+        name = name.strip()
+        backend = PDF_TEXT_BACKENDS.get(name)
+        if backend is None:
+            if name:
+                logger.warning(f"Unknown PDF text backend '{name}'")
+            continue
+        if backend.is_available():
+            return backend
+        logger.info(f"PDF text backend '{name}' is not installed")
+    return PDF_TEXT_BACKENDS["pypdf2"]
+
+
+# Бэкенд процесса (выбирается один раз при запуске)
+pdf_text_backend = get_pdf_text_backend()
@@ -36,6 +36,14 @@ from text_formatter import format_analysis_text, create_super_wow_analysis_promp
 from document_processor import document_processor
 from alternative_ocr_service import alternative_ocr_service
 from improved_ocr_service import improved_ocr_service
+from tesseract_pool import tesseract_pool
+from ocr_cache import ocr_cache
+from near_duplicate import near_duplicate_index, is_reusable_analysis
+from page_rasterizer import PDFPageBudget
+from ocr_planner import OCRFallbackPlan
+from document_artifact import DocumentArtifact
+from ocr_executor import ocr_executor, OCRQueueFullError
+from http_client import shared_http_client
 from google_api_key_service import google_api_service
 from super_analysis_engine import super_analysis_engine
 
@@ -656,6 +664,10 @@ async def get_ocr_status():
         return {
             "status": "success",
             "ocr_service": status,
+            "ocr_cache": ocr_cache.get_status(),
+            "near_duplicates": near_duplicate_index.get_status(),
+            "ocr_executor": ocr_executor.get_status(),
+            "ocr_http_client": shared_http_client.get_status(),
             "tesseract_required": False,
             "production_ready": True
         }
@@ -701,6 +713,10 @@ async def get_llm_status():
 async def analyze_file_authenticated(
     file: UploadFile = File(...),
     language: str = Form("ru"),  # Убираем выбор языка пользователем - будет использоваться из профиля
+    max_pages: Optional[int] = Form(None),  # Лимит страниц OCR для PDF (не больше OCR_PDF_MAX_PAGES)
+    time_budget_seconds: Optional[float] = Form(None),  # Лимит времени OCR для PDF (не больше OCR_PDF_TIME_BUDGET)
+    enhancement_profile: Optional[str] = Form(None),  # Профиль улучшения изображений: fast/balanced/accurate
+    near_duplicate: Optional[str] = Form(None),  # Повторное фото того же письма: off/offer/reuse
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     try:
@@ -730,29 +746,107 @@ async def analyze_file_authenticated(
             shutil.copyfileobj(file.file, temp_file)
             temp_file_path = temp_file.name
 
+        # Один объект документа на запрос: байты, хэш, PDF reader и страницы общие для всех сервисов OCR
+        document = DocumentArtifact(temp_file_path, file.content_type or "")
         try:
-            # Используем улучшенный OCR сервис как основной метод
+            # Повторное фото уже загруженного письма: байты другие, но перцептивный хэш близкий
+            near_duplicate_mode = near_duplicate_index.resolve_mode(near_duplicate)
+            image_hash = None
+            duplicate = None
+            if near_duplicate_mode != "off":
+                try:
+                    image_hash = await ocr_executor.run(near_duplicate_index.compute_hash, document)
+                    duplicate = await near_duplicate_index.find(current_user["id"], image_hash)
+                except Exception as duplicate_error:
+                    logger.warning(f"Near-duplicate lookup failed: {duplicate_error}")
+            
+            # Режим reuse: прошлый анализ того же письма возвращается без OCR и нового анализа
+            # (только если анализ был на том же языке)
+            if duplicate and near_duplicate_mode == "reuse" and duplicate["reusable"] \
+                    and duplicate["analysis_language"] == user_language:
+                previous_analysis = await db.get_analysis(duplicate["analysis_id"], current_user["id"])
+                previous_result = previous_analysis["analysis_result"] if previous_analysis else {}
+                if is_reusable_analysis(previous_result.get("text_extracted"), previous_result.get("processing_method")):
+                    near_duplicate_index.stats["reused"] += 1
+                    logger.info(f"Reusing analysis {duplicate['analysis_id']} for near-duplicate upload (distance {duplicate['distance']})")
+                    return {
+                        **previous_result,
+                        "near_duplicate": {**duplicate, "reused": True},
+                    }
+            
+            # Повторная загрузка того же файла не запускает OCR заново
+            cache_key = None
+            cached_ocr = None
             try:
-                extracted_text, processing_method = await improved_ocr_service.process_document(
-                    temp_file_path, 
-                    file.content_type or "",
-                    user_providers
+                cache_key = await asyncio.get_event_loop().run_in_executor(
+                    None, ocr_cache.make_key, document, improved_ocr_service.get_cache_fingerprint(enhancement_profile)
                 )
-                logger.info(f"Improved OCR processing method: {processing_method}, extracted text length: {len(extracted_text)}")
-            except Exception as ocr_error:
-                logger.warning(f"Improved OCR failed, falling back to alternative OCR: {ocr_error}")
-                # Fallback к альтернативному OCR сервису
+                cached_ocr = await ocr_cache.get(cache_key)
+            except Exception as cache_error:
+                logger.warning(f"OCR cache lookup failed: {cache_error}")
+
+            # Общий план fallback: сервисы OCR не повторяют уже выполненные вызовы провайдеров
+            ocr_plan = OCRFallbackPlan()
+            if cached_ocr:
+                extracted_text = cached_ocr["text"]
+                processing_method = cached_ocr["processing_method"]
+                ocr_cache_status = f"hit_{cached_ocr['tier']}"
+                document.layout_regions = cached_ocr.get("layout_regions")
+                logger.info(f"OCR cache hit ({cached_ocr['tier']}): {processing_method}, extracted text length: {len(extracted_text)}")
+            else:
+                ocr_cache_status = "miss"
+                # Очередь OCR заполнена - сразу отвечаем 503, а не копим запросы
+                if ocr_executor.is_saturated():
+                    raise HTTPException(
+                        status_code=503,
+                        detail="OCR service is busy, please retry in a moment"
+                    )
+                # Один бюджет страниц/времени на запрос: fallback-сервисы продолжают его, а не начинают заново
+                page_budget = PDFPageBudget(max_pages, time_budget_seconds)
+                # Используем улучшенный OCR сервис как основной метод
                 try:
-                    extracted_text, processing_method = alternative_ocr_service.process_document(temp_file_path, file.content_type or "")
-                    logger.info(f"Alternative OCR processing method: {processing_method}, extracted text length: {len(extracted_text)}")
-                except Exception as alt_ocr_error:
-                    logger.warning(f"Alternative OCR failed, falling back to document_processor: {alt_ocr_error}")
-                    # Последний fallback к основному document_processor
-                    extracted_text, processing_method = document_processor.process_document(temp_file_path, file.content_type or "")
-                    logger.info(f"Fallback processing method: {processing_method}, extracted text length: {len(extracted_text)}")
+                    extracted_text, processing_method = await improved_ocr_service.process_document(
+                        document, 
+                        file.content_type or "",
+                        user_providers,
+                        page_budget,
+                        ocr_plan,
+                        enhancement_profile
+                    )
+                    logger.info(f"Improved OCR processing method: {processing_method}, extracted text length: {len(extracted_text)}")
+                except OCRQueueFullError:
+                    # Очередь заполнилась во время обработки: 503, без fallback к внешним сервисам
+                    raise
+                except Exception as ocr_error:
+                    logger.warning(f"Improved OCR failed, falling back to alternative OCR: {ocr_error}")
+                    # Fallback к альтернативному OCR сервису
+                    try:
+                        extracted_text, processing_method = await alternative_ocr_service.process_document(
+                            document, file.content_type or "", ocr_plan, page_budget
+                        )
+                        logger.info(f"Alternative OCR processing method: {processing_method}, extracted text length: {len(extracted_text)}")
+                    except Exception as alt_ocr_error:
+                        logger.warning(f"Alternative OCR failed, falling back to document_processor: {alt_ocr_error}")
+                        # Последний fallback к основному document_processor (Tesseract и PyPDF2 без каскада)
+                        extracted_text, processing_method = "", "ocr_budget_exhausted"
+                        if ocr_plan.should_try("document_processor"):
+                            with ocr_plan.attempt("document_processor") as attempt:
+                                extracted_text, processing_method = await ocr_executor.run(
+                                    document_processor.process_document, document, file.content_type or "", page_budget
+                                )
+                                attempt["text"] = extracted_text
+                        logger.info(f"Fallback processing method: {processing_method}, extracted text length: {len(extracted_text)}")
+                
+                ocr_attempts = ocr_plan.get_summary()
+                logger.info(f"OCR attempts: {ocr_attempts['attempts']} made, {ocr_attempts['skipped']} skipped, "
+                            f"cost {ocr_attempts['cost']:g}, {ocr_attempts['elapsed_seconds']}s")
             
+                if cache_key:
+                    await ocr_cache.put(cache_key, extracted_text, processing_method, document.layout_regions)
+
             # Проверяем качество извлеченного текста
-            if not extracted_text or len(extracted_text.strip()) < 10:
+            text_extracted = bool(extracted_text) and len(extracted_text.strip()) >= 10
+            if not text_extracted:
                 logger.warning("Insufficient text extracted from document")
                 if file.content_type and file.content_type.startswith('image/'):
                     extracted_text = "Изображение получено, но текст не был извлечен. Возможно, изображение не содержит текста или качество недостаточное для распознавания."
@@ -791,10 +885,22 @@ async def analyze_file_authenticated(
                 "analysis_language": user_language,
                 "file_type": file_type,
                 "processing_method": processing_method,
+                "ocr_cache": ocr_cache_status,
+                "ocr_attempts": ocr_plan.get_summary(),
+                # Области письма (адрес, реквизиты, текст, подвал), если документ распознан по областям
+                "layout_regions": document.layout_regions,
+                # Похожая прошлая загрузка пользователя (клиент может предложить открыть прошлый анализ)
+                "near_duplicate": {**duplicate, "reused": False} if duplicate else None,
                 "extracted_text_length": len(extracted_text) if extracted_text else 0,
+                # False - вместо текста документа заглушка "текст не был извлечен"
+                "text_extracted": text_extracted,
                 "analysis_type": "super_wow_analysis"
             }
 
+            # Неудачный OCR не индексируется: повторное фото того же письма будет распознано заново
+            if not is_reusable_analysis(text_extracted, processing_method):
+                image_hash = None
+
             # Save analysis to database
             doc_analysis = {
                 "id": str(uuid.uuid4()),
@@ -803,19 +909,28 @@ async def analyze_file_authenticated(
                 "file_type": file_type,
                 "analysis_result": analysis_result,
                 "analysis_language": user_language,
-                "llm_provider": "AI Assistant"
+                "llm_provider": "AI Assistant",
+                "image_hash": image_hash
             }
             await db.save_analysis(doc_analysis)
+            near_duplicate_index.add(current_user["id"], image_hash, doc_analysis)
 
             return analysis_result
 
         finally:
             # Clean up temporary file
+            document.close()
             if os.path.exists(temp_file_path):
                 os.unlink(temp_file_path)
 
     except HTTPException:
         raise
+    except OCRQueueFullError as e:
+        logger.warning(f"OCR queue full during analysis: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="OCR service is busy, please retry in a moment"
+        )
     except Exception as e:
         logger.error(f"File analysis failed: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
@@ -1138,6 +1253,18 @@ async def send_push_notification(
         "body": message.body
     }
 
+# Пул теплых воркеров Tesseract: загружаем языковые модели при старте, а не на первом запросе
+@app.on_event("startup")
+async def start_tesseract_pool():
+    if tesseract_pool.enabled:
+        await asyncio.get_running_loop().run_in_executor(None, tesseract_pool.start)
+
+@app.on_event("shutdown")
+async def stop_tesseract_pool():
+    tesseract_pool.shutdown()
+    ocr_executor.shutdown()
+    await shared_http_client.aclose()
+
 # Include the router in the main app
 app.include_router(api_router)
 
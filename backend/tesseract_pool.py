@@ -0,0 +1,337 @@
+import os
+import re
+import time
+import queue
+import logging
+import threading
+import importlib.util
+import multiprocessing
+from typing import Optional, Tuple, Dict, Any
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# tesserocr (биндинги к libtesseract) позволяет держать языковые модели загруженными.
+# Без него каждый вызов pytesseract запускает новый процесс tesseract, и пул не нужен.
+TESSEROCR_AVAILABLE = importlib.util.find_spec('tesserocr') is not None
+
+DEFAULT_LANGS = 'ukr+rus+deu+eng'
+
+# Сколько разных наборов языков держит загруженными один воркер
+MAX_ENGINES_PER_WORKER = 3
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default {default}")
+        return default
+
+
+def parse_tesseract_config(config: str) -> Tuple[str, int, int]:
+    """Разбор строки конфигурации pytesseract ('--oem 3 --psm 6 -l deu+eng') -> (lang, oem, psm)"""
+    lang_match = re.search(r'-l\s+(\S+)', config or '')
+    oem_match = re.search(r'--oem\s+(\d+)', config or '')
+    psm_match = re.search(r'--psm\s+(\d+)', config or '')
+    lang = lang_match.group(1) if lang_match else 'eng'
+    oem = int(oem_match.group(1)) if oem_match else 3
+    psm = int(psm_match.group(1)) if psm_match else 3
+    return lang, oem, psm
+
+
+def _image_to_array(image) -> np.ndarray:
+    """Изображение -> компактный numpy массив для передачи через pipe"""
+    if isinstance(image, np.ndarray):
+        return image
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+
+def _worker_main(conn, preload_langs: str):
+    """Главный цикл воркера: держит движки tesserocr загруженными и обрабатывает задания из pipe"""
+    import tesserocr
+
+    engines: Dict[Tuple[str, int], Any] = {}
+    tessdata_path = os.environ.get('TESSDATA_PREFIX')
+
+    def get_engine(lang: str, oem: int):
+        key = (lang, oem)
+        if key not in engines:
+            if len(engines) >= MAX_ENGINES_PER_WORKER:
+                # Выгружаем самый старый набор языков
+                old_key = next(iter(engines))
+                engines.pop(old_key).End()
+            kwargs = {'lang': lang, 'oem': oem}
+            if tessdata_path:
+                kwargs['path'] = tessdata_path
+            engines[key] = tesserocr.PyTessBaseAPI(**kwargs)
+        return engines[key]
+
+    try:
+        get_engine(preload_langs, 3)
+    except Exception as e:
+        conn.send(('error', f"engine preload failed: {e}"))
+        return
+    conn.send(('ok', os.getpid()))
+
+    while True:
+        try:
+            op, payload = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if op == 'exit':
+            break
+
+        try:
+            if op == 'ping':
+                conn.send(('ok', os.getpid()))
+            elif op == 'ocr':
+                array, lang, oem, psm = payload
+                engine = get_engine(lang, oem)
+                engine.SetPageSegMode(psm)
+                engine.SetImage(Image.fromarray(array))
+                conn.send(('ok', engine.GetUTF8Text()))
+            elif op == 'data':
+                array, lang, oem, psm = payload
+                engine = get_engine(lang, oem)
+                engine.SetPageSegMode(psm)
+                engine.SetImage(Image.fromarray(array))
+                text = engine.GetUTF8Text()
+                words = [(word, float(conf)) for word, conf in engine.MapWordConfidences() if word.strip()]
+                conn.send(('ok', (text, words)))
+            elif op == 'osd':
+                array = payload
+                engine = get_engine('osd', 0)
+                engine.SetPageSegMode(0)
+                engine.SetImage(Image.fromarray(array))
+                osd = engine.DetectOrientationScript() or {}
+                conn.send(('ok', {
+                    'rotate': (360 - int(osd.get('orient_deg', 0))) % 360,
+                    'orientation_conf': float(osd.get('orient_conf', 0)),
+                    'script': osd.get('script_name'),
+                    'script_conf': float(osd.get('script_conf', 0)),
+                }))
+            else:
+                conn.send(('error', f"unknown operation: {op}"))
+        except Exception as e:
+            conn.send(('error', str(e)))
+
+    for engine in engines.values():
+        engine.End()
+
+
+class _PoolWorker:
+    """Один долгоживущий процесс tesseract с pipe для заданий"""
+
+    def __init__(self, ctx, preload_langs: str, start_timeout: float):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, preload_langs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        self.last_used = time.time()
+
+        # Ждем, пока воркер загрузит языковые модели
+        if not self.conn.poll(start_timeout):
+            self.stop()
+            raise TimeoutError("Tesseract worker did not start in time")
+        status, result = self.conn.recv()
+        if status != 'ok':
+            self.stop()
+            raise RuntimeError(result)
+
+    def request(self, op: str, payload, timeout: float):
+        self.conn.send((op, payload))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Tesseract worker {self.process.pid} timed out")
+        status, result = self.conn.recv()
+        self.last_used = time.time()
+        if status != 'ok':
+            raise RuntimeError(result)
+        return result
+
+    def stop(self):
+        try:
+            if self.process.is_alive():
+                self.conn.send(('exit', None))
+                self.process.join(1)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.conn.close()
+
+
+class TesseractWorkerPool:
+    """
+    Пул постоянных воркеров Tesseract.
+    Каждый воркер держит языковые модели загруженными (tesserocr) и получает изображения через pipe,
+    вместо запуска нового процесса tesseract на каждый вызов pytesseract.
+    Воркеры проверяются ping'ом после простоя и пересоздаются после TESSERACT_POOL_MAX_JOBS заданий.
+    """
+
+    def __init__(self):
+        self.size = max(0, _env_int('TESSERACT_POOL_SIZE', min(2, os.cpu_count() or 1)))
+        self.max_jobs_per_worker = max(1, _env_int('TESSERACT_POOL_MAX_JOBS', 200))
+        self.job_timeout = float(_env_int('TESSERACT_POOL_JOB_TIMEOUT', 60))
+        self.health_check_interval = float(_env_int('TESSERACT_POOL_HEALTH_INTERVAL', 30))
+        self.preload_langs = os.environ.get('TESSERACT_POOL_LANGS', DEFAULT_LANGS)
+
+        self._idle: "queue.Queue[_PoolWorker]" = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._ctx = None
+        self._owner_pid: Optional[int] = None
+        self.stats = {"jobs": 0, "errors": 0, "timeouts": 0, "recycled": 0, "restarted": 0}
+
+    @property
+    def enabled(self) -> bool:
+        """Пул используется только с tesserocr и только в процессе, который его создал"""
+        if not TESSEROCR_AVAILABLE or self.size <= 0:
+            return False
+        return self._owner_pid is None or self._owner_pid == os.getpid()
+
+    def start(self):
+        """Запуск воркеров (idempotent). Модели загружаются сразу, чтобы первый запрос был быстрым."""
+        with self._lock:
+            if self._owner_pid is not None:
+                return
+            self._ctx = multiprocessing.get_context('spawn')
+            self._owner_pid = os.getpid()
+            for _ in range(self.size):
+                try:
+                    self._add_worker(self._spawn_worker())
+                except Exception as e:
+                    logger.error(f"Failed to start Tesseract worker: {e}")
+            logger.info(f"Tesseract worker pool started: {len(self._workers)}/{self.size} workers, langs={self.preload_langs}")
+
+    def shutdown(self):
+        """Остановка всех воркеров"""
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._owner_pid = None
+
+    def _spawn_worker(self) -> _PoolWorker:
+        return _PoolWorker(self._ctx, self.preload_langs, self.job_timeout)
+
+    def _add_worker(self, worker: _PoolWorker):
+        self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker: _PoolWorker, reason: str) -> _PoolWorker:
+        """Остановка воркера и запуск нового на его месте"""
+        logger.info(f"Replacing Tesseract worker {worker.process.pid}: {reason}")
+        worker.stop()
+        try:
+            new_worker = self._spawn_worker()
+        except Exception:
+            # Замена не запустилась: остановленный воркер убирается из пула (см. _release)
+            with self._lock:
+                self._workers = [w for w in self._workers if w is not worker]
+            raise
+        with self._lock:
+            self._workers = [new_worker if w is worker else w for w in self._workers]
+        return new_worker
+
+    def _release(self, worker: _PoolWorker):
+        """Возврат воркера в очередь свободных; мертвый воркер в очередь не возвращается и удаляется из пула"""
+        if worker.process.is_alive():
+            self._idle.put(worker)
+            return
+        logger.warning(f"Tesseract worker {worker.process.pid} is not running, removing it from the pool")
+        with self._lock:
+            self._workers = [w for w in self._workers if w is not worker]
+
+    def _ensure_healthy(self, worker: _PoolWorker) -> _PoolWorker:
+        """Health check: мертвый воркер пересоздается, долго простаивавший - пингуется"""
+        if not worker.process.is_alive():
+            self.stats["restarted"] += 1
+            return self._replace(worker, "process died")
+        if time.time() - worker.last_used > self.health_check_interval:
+            try:
+                worker.request('ping', None, timeout=5)
+            except Exception as e:
+                self.stats["restarted"] += 1
+                return self._replace(worker, f"health check failed: {e}")
+        return worker
+
+    def _run(self, op: str, payload):
+        self.start()
+        if not self._workers:
+            raise RuntimeError("Tesseract worker pool has no running workers")
+
+        worker = self._idle.get(timeout=self.job_timeout)
+        try:
+            worker = self._ensure_healthy(worker)
+            result = worker.request(op, payload, self.job_timeout)
+            worker.jobs_done += 1
+            self.stats["jobs"] += 1
+            if worker.jobs_done >= self.max_jobs_per_worker:
+                self.stats["recycled"] += 1
+                worker = self._replace(worker, f"recycled after {worker.jobs_done} jobs")
+            return result
+        except RuntimeError:
+            # Ошибка распознавания - сам воркер исправен
+            self.stats["errors"] += 1
+            raise
+        except (TimeoutError, EOFError, OSError) as e:
+            self.stats["timeouts" if isinstance(e, TimeoutError) else "restarted"] += 1
+            worker = self._replace(worker, str(e) or e.__class__.__name__)
+            raise
+        finally:
+            self._release(worker)
+
+    def image_to_string(self, image, config: str) -> str:
+        """Аналог pytesseract.image_to_string, выполняемый в теплом воркере"""
+        lang, oem, psm = parse_tesseract_config(config)
+        return self._run('ocr', (_image_to_array(image), lang, oem, psm))
+
+    def image_to_data(self, image, config: str) -> Tuple[str, list]:
+        """Текст и уверенность по словам: (текст, [(слово, уверенность 0-100)])"""
+        lang, oem, psm = parse_tesseract_config(config)
+        return self._run('data', (_image_to_array(image), lang, oem, psm))
+
+    def image_to_osd(self, image) -> Dict[str, Any]:
+        """Ориентация и письменность страницы (Tesseract OSD)"""
+        return self._run('osd', _image_to_array(image))
+
+    def health_check(self) -> Dict[str, Any]:
+        """Проверка всех свободных воркеров"""
+        checked = 0
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker = self._ensure_healthy(worker)
+                checked += 1
+            finally:
+                self._release(worker)
+        return {"checked_workers": checked, **self.get_status()}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Статус пула для /api/ocr-status"""
+        return {
+            "enabled": self.enabled,
+            "engine": "tesserocr" if TESSEROCR_AVAILABLE else "pytesseract_subprocess",
+            "size": self.size,
+            "alive_workers": sum(1 for w in self._workers if w.process.is_alive()),
+            "idle_workers": self._idle.qsize(),
+            "max_jobs_per_worker": self.max_jobs_per_worker,
+            "preload_langs": self.preload_langs,
+            **self.stats
+        }
+
+
+# Глобальный экземпляр пула воркеров Tesseract
+tesseract_pool = TesseractWorkerPool()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тест определения пустых страниц (blank_page.py) на синтетических страницах A4 (150 dpi).
+Проверяется, что пороги OCR_BLANK_* пропускают OCR для белых и серых листов, пыли скана,
+тени сканера у края и просвечивающего текста обратной стороны, но не для страницы
+с одной короткой строкой ("Seite 2") и обычного письма.
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from blank_page import is_blank_page, page_ink_coverage, blank_page_stats
+from benchmark_utils import _find_font
+
+PAGE_SIZE = (1240, 1754)
+
+
+def _page(background: int = 255) -> Image.Image:
+    return Image.new('L', PAGE_SIZE, background)
+
+
+def _text_page(lines, fill: int = 0, background: int = 255) -> Image.Image:
+    font, _ = _find_font(28)
+    page = _page(background)
+    draw = ImageDraw.Draw(page)
+    for number, line in enumerate(lines):
+        draw.text((150, 400 + number * 40), line, font=font, fill=fill)
+    return page
+
+
+def synthetic_pages():
+    """{название: (страница, ожидается пустая)}"""
+    white = _page()
+
+    gray_paper = np.full(PAGE_SIZE[::-1], 225, dtype=np.float32)
+    gray_paper *= np.linspace(0.9, 1.05, PAGE_SIZE[0])[None, :]
+    gray_paper = Image.fromarray(np.clip(gray_paper, 0, 255).astype(np.uint8))
+
+    dust = _page()
+    draw = ImageDraw.Draw(dust)
+    for x, y in [(300, 500), (800, 900), (600, 1400)]:
+        draw.ellipse((x, y, x + 2, y + 2), fill=0)
+
+    shadow = _page()
+    ImageDraw.Draw(shadow).rectangle((0, 0, 60, PAGE_SIZE[1]), fill=30)
+
+    bleed_through = _text_page(["Sehr geehrte Damen und Herren,"] * 20, fill=200, background=240)
+
+    return {
+        "white": (white, True),
+        "gray_paper": (gray_paper, True),
+        "dust": (dust, True),
+        "scanner_shadow": (shadow, True),
+        "bleed_through": (bleed_through, True),
+        "one_line": (_text_page(["Seite 2"]), False),
+        "letter": (_text_page(["Finanzamt Berlin-Mitte", "Bescheid über Einkommensteuer 2023"] * 10), False),
+    }
+
+
+def run_blank_page_checks() -> bool:
+    """Проверки порогов пустой страницы"""
+
+    print("📃 ТЕСТ ОПРЕДЕЛЕНИЯ ПУСТЫХ СТРАНИЦ")
+    print("=" * 60)
+
+    results = {}
+    checked_before = blank_page_stats["checked"]
+    pages = synthetic_pages()
+    for name, (page, expected_blank) in pages.items():
+        ink_ratio, stddev = page_ink_coverage(page)
+        blank = is_blank_page(page)
+        results[name] = blank == expected_blank
+        print(f"   {'✅' if results[name] else '❌'} {name}: {'пустая' if blank else 'с текстом'} "
+              f"(чернила {ink_ratio:.4%}, stddev {stddev:.1f})")
+    results['stats_counted'] = blank_page_stats["checked"] - checked_before == len(pages)
+
+    print("\n" + "=" * 60)
+    passed = sum(results.values())
+    print(f"📊 Успешных проверок: {passed}/{len(results)}")
+    print("=" * 60)
+    return passed == len(results)
+
+
+def test_blank_page():
+    """Точка входа для pytest"""
+    assert run_blank_page_checks()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_blank_page_checks() else 1)
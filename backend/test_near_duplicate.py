@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Тест поиска повторных фото письма (near_duplicate.py) на временной SQLite базе.
+Проверяется: пороги по умолчанию (до 8 бит - использовать прошлый анализ автоматически,
+до 20 бит - предложить, дальше - новая загрузка), индекс отдельный для каждого пользователя
+и загружается из таблицы анализов после перезапуска, неудачный OCR не используется повторно,
+фото письма находит оригинал, а другое письмо по тому же шаблону - нет.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Пороги по умолчанию и отдельная база (индекс загружается из таблицы анализов)
+for _name in ('OCR_NEAR_DUPLICATE_MODE', 'OCR_NEAR_DUPLICATE_MAX_DISTANCE', 'OCR_NEAR_DUPLICATE_REUSE_DISTANCE'):
+    os.environ.pop(_name, None)
+os.environ['SQLITE_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix="near_duplicate_test_"), "german_ai.db")
+
+from database import db
+from near_duplicate import NearDuplicateIndex, perceptual_hash, is_reusable_analysis
+from benchmark_near_duplicate import synthetic_letter, photograph
+
+USER_ID = "user-near-duplicate"
+OTHER_USER_ID = "user-other"
+
+
+def flip_bits(image_hash: str, count: int) -> str:
+    """Хэш на расстоянии Хэмминга count от исходного"""
+    value = int(image_hash, 16)
+    for bit in range(count):
+        value ^= 1 << (bit * 7)
+    return format(value, f"0{len(image_hash)}x")
+
+
+def _analysis(analysis_id: str, user_id: str, image_hash: str) -> dict:
+    return {
+        "id": analysis_id, "user_id": user_id, "file_name": f"{analysis_id}.jpg", "file_type": "image/jpeg",
+        "analysis_result": {"text_extracted": True, "processing_method": "improved_ocr:tesseract_psm4"},
+        "analysis_language": "ru", "llm_provider": "gemini", "image_hash": image_hash,
+    }
+
+
+async def run_near_duplicate_checks() -> bool:
+    """Проверки порогов и индекса повторных загрузок"""
+
+    print("🔁 ТЕСТ ПОИСКА ПОВТОРНЫХ ФОТО ПИСЕМ")
+    print("=" * 60)
+
+    results = {}
+    index = NearDuplicateIndex()
+    results['default_thresholds'] = (index.reuse_distance, index.max_distance, index.mode) == (8, 20, "offer")
+    results['resolve_mode'] = (index.resolve_mode("REUSE") == "reuse" and index.resolve_mode("unknown") == "offer"
+                               and index.resolve_mode(None) == "offer")
+
+    letter = synthetic_letter(0)
+    letter_hash = perceptual_hash(letter)
+    analysis = _analysis("letter-0", USER_ID, letter_hash)
+    await db.save_analysis(analysis)
+    await index.find(USER_ID, letter_hash)
+    index.add(USER_ID, letter_hash, analysis)
+
+    # Границы порогов: 8 - повтор, 9..20 - предложить, 21 - новая загрузка
+    expected = {0: True, 8: True, 9: False, 20: False}
+    for distance, reusable in expected.items():
+        match = await index.find(USER_ID, flip_bits(letter_hash, distance))
+        results[f'distance_{distance}'] = (match is not None and match["analysis_id"] == "letter-0"
+                                           and match["distance"] == distance and match["reusable"] == reusable)
+    results['distance_21'] = await index.find(USER_ID, flip_bits(letter_hash, 21)) is None
+
+    # Загрузки другого пользователя не видны
+    results['per_user'] = await index.find(OTHER_USER_ID, letter_hash) is None
+
+    # После перезапуска индекс пользователя загружается из таблицы анализов
+    restarted = NearDuplicateIndex()
+    match = await restarted.find(USER_ID, flip_bits(letter_hash, 3))
+    results['loaded_from_db'] = match is not None and match["analysis_id"] == "letter-0" and match["reusable"]
+
+    # Фото того же письма находится, другое письмо по тому же шаблону - нет
+    match = await restarted.find(USER_ID, perceptual_hash(photograph(letter, 0)))
+    results['photo_matches_letter'] = match is not None and match["analysis_id"] == "letter-0"
+    results['other_letter_no_match'] = await restarted.find(USER_ID, perceptual_hash(synthetic_letter(10))) is None
+
+    # Неудачный или обрезанный OCR не индексируется и не используется повторно
+    results['reusable_analysis'] = is_reusable_analysis(True, "improved_ocr:tesseract_psm4")
+    results['unusable_analyses'] = not any((
+        is_reusable_analysis(False, "improved_ocr:tesseract_psm4"),
+        is_reusable_analysis(True, "failed"),
+        is_reusable_analysis(True, "improved_pdf_ocr:tesseract_psm4+truncated"),
+        is_reusable_analysis(True, "ocr_budget_exhausted"),
+    ))
+
+    for name, passed in results.items():
+        print(f"   {'✅' if passed else '❌'} {name}")
+
+    print("\n" + "=" * 60)
+    passed = sum(results.values())
+    print(f"📊 Успешных проверок: {passed}/{len(results)}")
+    print("=" * 60)
+    return passed == len(results)
+
+
+def test_near_duplicate():
+    """Точка входа для pytest"""
+    assert asyncio.run(run_near_duplicate_checks())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_near_duplicate_checks()) else 1)
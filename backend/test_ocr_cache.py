@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Тест кэша результатов OCR (ocr_cache.py) на временной SQLite базе.
+Проверяется: попадание из памяти и с диска, смена версии/конфигурации OCR меняет ключ,
+ошибки, пустые и обрезанные по бюджету результаты не кэшируются, области письма сохраняются.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Глобальный экземпляр кэша создается при импорте - не в каталоге данных сервера
+os.environ.setdefault('OCR_CACHE_DB_PATH', os.path.join(tempfile.gettempdir(), 'test_ocr_cache_global.db'))
+
+from ocr_cache import OCRCache
+
+LETTER_TEXT = "Finanzamt Berlin-Mitte\nBescheid über Einkommensteuer 2023"
+
+
+async def run_ocr_cache_checks() -> bool:
+    """Проверки кэша OCR"""
+
+    print("🗄️ ТЕСТ КЭША РЕЗУЛЬТАТОВ OCR")
+    print("=" * 60)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        document_path = os.path.join(data_dir, "letter.png")
+        with open(document_path, 'wb') as f:
+            f.write(b"letter image bytes")
+
+        cache = OCRCache(db_path=os.path.join(data_dir, "ocr_cache.db"))
+        key = cache.make_key(document_path, "engine=1")
+        results['disk_available'] = cache.disk_available
+        results['fingerprint_changes_key'] = key != cache.make_key(document_path, "engine=2")
+
+        # Результаты, которые нельзя отдавать повторно
+        rejected = {
+            "failed": (LETTER_TEXT, "failed"),
+            "error": (LETTER_TEXT, "improved_ocr:error"),
+            "truncated": (LETTER_TEXT, "improved_pdf_ocr:tesseract_psm4+truncated"),
+            "empty": ("", "improved_ocr:tesseract_psm4"),
+            "too_short": ("Seite 1", "improved_ocr:tesseract_psm4"),
+        }
+        for name, (text, processing_method) in rejected.items():
+            rejected_key = cache.make_key(document_path, f"rejected={name}")
+            await cache.put(rejected_key, text, processing_method)
+            results[f'skips_{name}'] = await cache.get(rejected_key) is None
+        results['nothing_stored'] = cache.stats["stores"] == 0
+
+        regions = [{"role": "address", "bbox": [100, 300, 500, 150], "text": "Herrn Max Mustermann"}]
+        await cache.put(key, LETTER_TEXT, "improved_ocr:tesseract_psm4", regions)
+        hit = await cache.get(key)
+        results['memory_hit'] = hit is not None and hit["tier"] == "memory" and hit["text"] == LETTER_TEXT
+
+        # Новый экземпляр (перезапуск процесса): память пуста, результат читается с диска
+        restarted = OCRCache(db_path=cache.db_path)
+        hit = await restarted.get(key)
+        results['disk_hit'] = hit is not None and hit["tier"] == "disk" and hit["layout_regions"] == regions
+        results['miss_after_engine_change'] = await restarted.get(cache.make_key(document_path, "engine=2")) is None
+
+    for name, passed in results.items():
+        print(f"   {'✅' if passed else '❌'} {name}")
+
+    print("\n" + "=" * 60)
+    passed = sum(results.values())
+    print(f"📊 Успешных проверок: {passed}/{len(results)}")
+    print("=" * 60)
+    return passed == len(results)
+
+
+def test_ocr_cache():
+    """Точка входа для pytest"""
+    assert asyncio.run(run_ocr_cache_checks())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_ocr_cache_checks()) else 1)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Тест общего HTTP клиента внешних OCR API на локальном stand-in сервере.
+Сервер имитирует OCR.space, Azure Read API и Google Vision, поэтому ключи и сеть не нужны.
+Проверяется: разбор ответов, адаптивный опрос Azure, переиспользование соединений (keep-alive),
+лимит одновременных запросов к хосту, то, что event loop не блокируется во время запросов,
+и пакетная отправка страниц PDF в Google Vision (порядок страниц, сэкономленные запросы).
+"""
+import os
+import sys
+import json
+import time
+import base64
+import struct
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append('.')
+
+RESPONSE_DELAY = 0.3
+
+
+class StandInState:
+    azure_polls = 0
+    google_requests = 0
+    google_images = 0
+    connections = set()
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Имитация OCR.space, Azure Read API и Google Vision"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _track(self):
+        StandInState.connections.add(self.client_address)
+        with StandInState.lock:
+            StandInState.active += 1
+            StandInState.max_active = max(StandInState.max_active, StandInState.active)
+        time.sleep(RESPONSE_DELAY)
+        with StandInState.lock:
+            StandInState.active -= 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/google/v1/images:annotate'):
+            self._google_annotate(json.loads(body))
+            return
+        self._track()
+        if self.path.startswith('/ocrspace/parse/image'):
+            self._send_json({"OCRExitCode": 1, "ParsedResults": [{"ParsedText": "Sehr geehrte Damen und Herren (OCR.space)"}]})
+        elif self.path.startswith('/vision/v3.2/read/analyze'):
+            host = self.headers.get('Host')
+            self._send_json({}, status=202, headers={'Operation-Location': f"http://{host}/vision/v3.2/read/analyzeResults/1"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _google_annotate(self, payload):
+        """
+        Google Vision: ответ на каждое изображение запроса в том же порядке.
+        Для PNG страниц тестового PDF текст - номер страницы (ширина PNG = 100 + номер страницы).
+        Пачка с первой страницей отвечает дольше остальных, чтобы ответы приходили не по порядку.
+        """
+        requests = payload.get("requests", [])
+        page_numbers = []
+        for request in requests:
+            content = base64.b64decode(request["image"]["content"])
+            width = struct.unpack('>I', content[16:20])[0] if content.startswith(b'\x89PNG') and len(content) >= 24 else 0
+            page_numbers.append(width - 100)
+        with StandInState.lock:
+            StandInState.google_requests += 1
+            StandInState.google_images += len(requests)
+        if 1 in page_numbers:
+            time.sleep(RESPONSE_DELAY)
+        self._track()
+        self._send_json({"responses": [
+            {"fullTextAnnotation": {"text": f"Seite {page_number}" if page_number > 0 else "Sehr geehrte Damen und Herren (Google Vision)"}}
+            for page_number in page_numbers
+        ]})
+
+    def do_GET(self):
+        self._track()
+        if self.path.startswith('/vision/v3.2/read/analyzeResults/'):
+            # Первый опрос - операция еще выполняется (с Retry-After), второй - готовый результат
+            StandInState.azure_polls += 1
+            if StandInState.azure_polls % 2 == 1:
+                self._send_json({"status": "running"}, headers={'Retry-After': '0'})
+                return
+            self._send_json({
+                "status": "succeeded",
+                "createdDateTime": "2024-03-15T10:00:00Z",
+                "lastUpdatedDateTime": "2024-03-15T10:00:01Z",
+                "analyzeResult": {"readResults": [{"lines": [{"text": "Sehr geehrte Damen und Herren (Azure)"}]}]}
+            })
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+def start_stand_in_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_ocr_http_client_checks() -> bool:
+    """Тест внешних OCR API через общий пул соединений"""
+
+    print("🌐 ТЕСТ ОБЩЕГО HTTP КЛИЕНТА ДЛЯ ВНЕШНИХ OCR API")
+    print("=" * 60)
+
+    server = start_stand_in_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update({
+        'OCR_SPACE_API_KEY': 'test', 'OCR_SPACE_API_URL': f"{base_url}/ocrspace/parse/image",
+        'AZURE_COMPUTER_VISION_KEY': 'test', 'AZURE_COMPUTER_VISION_ENDPOINT': base_url,
+        'GOOGLE_VISION_API_KEY': 'test', 'GOOGLE_VISION_API_URL': f"{base_url}/google/v1/images:annotate",
+        'OCR_HTTP_MAX_PER_HOST': '2',
+    })
+    print(f"   ✅ Stand-in сервер: {base_url}")
+
+    from improved_ocr_service import ImprovedOCRService
+    from alternative_ocr_service import AlternativeOCRService
+    from http_client import shared_http_client
+    shared_http_client.max_per_host = 2
+
+    ocr_service = ImprovedOCRService()
+    alternative_service = AlternativeOCRService()
+    image_bytes = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+    results = {}
+
+    print("\n1. 📄 РАЗБОР ОТВЕТОВ")
+    results['ocr_space'] = bool(await ocr_service.extract_text_with_ocr_space(image_bytes))
+    results['azure'] = bool(await ocr_service.extract_text_with_azure_vision(image_bytes))
+    results['google_vision'] = bool(await alternative_service.extract_text_with_google_vision(image_bytes, ['de']))
+    for name in ('ocr_space', 'azure', 'google_vision'):
+        print(f"   {'✅' if results[name] else '❌'} {name}")
+
+    azure_operation = ocr_service.azure_operations[-1] if ocr_service.azure_operations else {}
+    results['azure_polling'] = len(azure_operation.get('polls', [])) == 2 and azure_operation.get('remote_seconds') == 1.0
+    print(f"   {'✅' if results['azure_polling'] else '❌'} Опросы Azure: {azure_operation.get('polls')}, "
+          f"обработка на стороне Azure: {azure_operation.get('remote_seconds')}s")
+
+    print("\n2. 🔁 ПЕРЕИСПОЛЬЗОВАНИЕ СОЕДИНЕНИЙ И ЛИМИТ НА ХОСТ")
+    StandInState.connections.clear()
+    StandInState.max_active = 0
+    ticks = []
+
+    async def ticker():
+        while len(ticks) < 1000:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.ensure_future(ticker())
+    await asyncio.gather(*[ocr_service.extract_text_with_ocr_space(image_bytes) for _ in range(6)])
+    await asyncio.gather(*[ocr_service.extract_text_with_ocr_space(image_bytes) for _ in range(6)])
+    ticker_task.cancel()
+
+    max_gap = max(b - a for a, b in zip(ticks, ticks[1:])) if len(ticks) > 1 else 0.0
+    results['keep_alive'] = len(StandInState.connections) <= shared_http_client.max_per_host
+    results['per_host_limit'] = StandInState.max_active <= shared_http_client.max_per_host
+    results['event_loop_responsive'] = max_gap < RESPONSE_DELAY / 2
+    print(f"   {'✅' if results['keep_alive'] else '❌'} 12 запросов через {len(StandInState.connections)} соединений")
+    print(f"   {'✅' if results['per_host_limit'] else '❌'} Одновременно к хосту: {StandInState.max_active} (лимит {shared_http_client.max_per_host})")
+    print(f"   {'✅' if results['event_loop_responsive'] else '❌'} Максимальная пауза event loop: {max_gap * 1000:.0f} мс")
+
+    print("\n3. 📚 ПАКЕТНАЯ ОТПРАВКА СТРАНИЦ PDF В GOOGLE VISION")
+    from PIL import Image, ImageDraw
+    from ocr_planner import OCRFallbackPlan
+
+    def synthetic_pages(count):
+        for page_number in range(1, count + 1):
+            image = Image.new('L', (100 + page_number, 140), 255)
+            ImageDraw.Draw(image).rectangle((20, 20, 80, 120), fill=0)
+            yield page_number, image
+
+    page_count = 20
+    expected = {page_number: f"Seite {page_number}" for page_number in range(1, page_count + 1)}
+    round_trips = {}
+    wall_seconds = {}
+    for batch_size in (1, 8):
+        alternative_service.batch_size = batch_size
+        StandInState.google_requests = 0
+        StandInState.google_images = 0
+        started = time.perf_counter()
+        # Без лимита стоимости плана (по умолчанию OCR_REQUEST_MAX_COST=8 платных страниц)
+        page_texts = await alternative_service.annotate_pdf_pages(synthetic_pages(page_count), OCRFallbackPlan(max_cost=0))
+        wall_seconds[batch_size] = time.perf_counter() - started
+        round_trips[batch_size] = StandInState.google_requests
+        results[f'google_batch_{batch_size}_order'] = page_texts == expected and list(sorted(page_texts)) == list(expected)
+        print(f"   {'✅' if results[f'google_batch_{batch_size}_order'] else '❌'} Пачка {batch_size}: "
+              f"{StandInState.google_images} страниц за {round_trips[batch_size]} запросов, {wall_seconds[batch_size]:.2f}s")
+    results['google_round_trips_saved'] = round_trips[8] == -(-page_count // 8) and round_trips[8] < round_trips[1]
+    print(f"   {'✅' if results['google_round_trips_saved'] else '❌'} Сэкономлено запросов: {round_trips[1] - round_trips[8]}, "
+          f"ускорение x{wall_seconds[1] / wall_seconds[8]:.1f}")
+
+    await shared_http_client.aclose()
+    server.shutdown()
+
+    print("\n" + "=" * 60)
+    passed = sum(results.values())
+    print(f"📊 Успешных проверок: {passed}/{len(results)}")
+    print("=" * 60)
+    return passed == len(results)
+
+
+def test_ocr_http_client():
+    """Точка входа для pytest (без плагина для async тестов)"""
+    assert asyncio.run(run_ocr_http_client_checks())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_ocr_http_client_checks()) else 1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Тест бюджета страниц/времени OCR для PDF (PDFPageBudget в page_rasterizer.py).
+Проверяется: остановка по числу страниц и по времени, пометка о частичной обработке,
+ограничение запроса пользователя лимитами администратора и общий бюджет для fallback-сервисов
+(страница остановки не перезаписывается следующим сервисом).
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from page_rasterizer import PDFPageBudget
+
+
+def run_page_budget_checks() -> bool:
+    """Проверки бюджета страниц PDF"""
+
+    print("📄 ТЕСТ БЮДЖЕТА СТРАНИЦ PDF")
+    print("=" * 60)
+
+    saved_env = {name: os.environ.get(name) for name in ('OCR_PDF_MAX_PAGES', 'OCR_PDF_TIME_BUDGET')}
+    os.environ['OCR_PDF_MAX_PAGES'] = '100'
+    os.environ['OCR_PDF_TIME_BUDGET'] = '300'
+    results = {}
+    try:
+        # Документ короче бюджета обрабатывается полностью
+        budget = PDFPageBudget()
+        results['short_document_complete'] = list(budget.limit(range(1, 6))) == [1, 2, 3, 4, 5] and not budget.truncated
+
+        # Лимит страниц: остановка на первой непрочитанной странице и пометка в тексте
+        budget = PDFPageBudget(max_pages=3)
+        results['page_limit_stops'] = list(budget.limit(range(1, 11))) == [1, 2, 3] and budget.truncated_at == 4
+        marker = budget.truncation_marker()
+        results['marker_text'] = "на странице 4" in marker and "лимит 3 стр." in marker and "не распознано страниц: 7" in marker
+
+        # Пользователь может только уменьшить лимиты администратора
+        results['user_cannot_raise_limit'] = PDFPageBudget(max_pages=500).max_pages == 100
+        results['zero_means_admin_limit'] = PDFPageBudget(max_pages=0, max_seconds=0).max_seconds == 300
+        os.environ['OCR_PDF_MAX_PAGES'] = '0'
+        results['admin_unlimited'] = PDFPageBudget().max_pages is None and PDFPageBudget(max_pages=7).max_pages == 7
+        os.environ['OCR_PDF_MAX_PAGES'] = '100'
+
+        # Лимит времени: ни одна страница не начинается после исчерпания бюджета
+        budget = PDFPageBudget(max_seconds=10)
+        budget.started -= 11
+        results['time_limit_stops'] = list(budget.limit(range(1, 4))) == [] and budget.truncated_at == 1
+        results['time_marker'] = "лимит времени 10 с" in budget.truncation_marker()
+
+        # Общий бюджет запроса: fallback-сервис не перезаписывает страницу остановки
+        budget = PDFPageBudget(max_pages=2)
+        list(budget.limit(range(1, 6)))
+        fallback_pages = list(budget.limit(range(1, 6)))
+        results['shared_budget_exhausted'] = fallback_pages == []
+        results['shared_budget_keeps_page'] = budget.truncated_at == 3 and "на странице 3" in budget.truncation_marker()
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    for name, passed in results.items():
+        print(f"   {'✅' if passed else '❌'} {name}")
+
+    print("\n" + "=" * 60)
+    passed = sum(results.values())
+    print(f"📊 Успешных проверок: {passed}/{len(results)}")
+    print("=" * 60)
+    return passed == len(results)
+
+
+def test_page_budget():
+    """Точка входа для pytest"""
+    assert run_page_budget_checks()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_page_budget_checks() else 1)
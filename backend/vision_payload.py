@@ -0,0 +1,133 @@
+import io
+import os
+import base64
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from image_source import ImageSource, to_image_bytes, to_pil_image
+
+logger = logging.getLogger(__name__)
+
+# Эффективное разрешение изображений у провайдеров (длинная сторона, px):
+# больше провайдер все равно уменьшит на своей стороне, а загрузка и токены будут оплачены
+PROVIDER_MAX_SIDE = {
+    "gemini": 3072,
+    "openai": 2048,
+    "anthropic": 1568,
+}
+DEFAULT_MAX_SIDE = 2048
+
+VISION_IMAGE_FORMAT = os.environ.get('VISION_IMAGE_FORMAT', 'jpeg').lower()
+VISION_IMAGE_QUALITY = int(os.environ.get('VISION_IMAGE_QUALITY', '80'))
+VISION_GRAYSCALE = os.environ.get('VISION_GRAYSCALE', 'true').lower() != 'false'
+
+# Суммарная статистика для /api/ocr-status
+vision_payload_stats = {"payloads": 0, "original_bytes": 0, "payload_bytes": 0, "bytes_saved": 0}
+
+
+class VisionImage:
+    """
+    Изображение для LLM Vision в рамках одного запроса.
+    Для каждого разрешения провайдера изображение один раз уменьшается, переводится
+    в градации серого и кодируется в JPEG/WebP; результат кэшируется, поэтому цепочка
+    fallback по нескольким провайдерам не кодирует изображение повторно.
+    """
+
+    def __init__(self, source: ImageSource):
+        self.source = source
+        self._source_bytes: Optional[Tuple[bytes, str]] = None
+        self._payloads: Dict[int, Tuple[bytes, str]] = {}
+        self._payloads_base64: Dict[int, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def source_bytes(self) -> Tuple[bytes, str]:
+        """Исходные байты (файл как есть, изображение из памяти - PNG) для OCR.space/Azure"""
+        with self._lock:
+            if self._source_bytes is None:
+                self._source_bytes = to_image_bytes(self.source)
+            return self._source_bytes
+
+    def payload_for(self, provider_type: str) -> Tuple[bytes, str]:
+        """Подготовленные байты и MIME тип для провайдера"""
+        max_side = PROVIDER_MAX_SIDE.get(provider_type, DEFAULT_MAX_SIDE)
+        with self._lock:
+            if max_side in self._payloads:
+                return self._payloads[max_side]
+
+        original_bytes = None
+        if isinstance(self.source, (str, bytes, os.PathLike)):
+            original_bytes, original_mime = self.source_bytes()
+            image = to_pil_image(original_bytes)
+        else:
+            image = to_pil_image(self.source)
+
+        payload = _encode_for_vision(image, max_side)
+        if original_bytes is not None and len(payload[0]) >= len(original_bytes):
+            # Исходник уже компактнее (маленькое или сильно сжатое изображение)
+            payload = (original_bytes, original_mime)
+
+        payload_size = len(payload[0])
+        vision_payload_stats["payloads"] += 1
+        vision_payload_stats["payload_bytes"] += payload_size
+        if original_bytes is not None:
+            saved = len(original_bytes) - payload_size
+            vision_payload_stats["original_bytes"] += len(original_bytes)
+            vision_payload_stats["bytes_saved"] += saved
+            logger.info(f"Vision payload for {provider_type}: {payload_size} bytes ({payload[1]}), "
+                        f"original {len(original_bytes)} bytes, saved {saved} bytes")
+        else:
+            logger.info(f"Vision payload for {provider_type}: {payload_size} bytes ({payload[1]})")
+
+        with self._lock:
+            self._payloads[max_side] = payload
+        return payload
+
+    def payload_base64_for(self, provider_type: str) -> Tuple[str, str]:
+        """Подготовленное изображение в base64 (OpenAI, Anthropic), кодируется один раз на разрешение"""
+        max_side = PROVIDER_MAX_SIDE.get(provider_type, DEFAULT_MAX_SIDE)
+        with self._lock:
+            if max_side in self._payloads_base64:
+                return self._payloads_base64[max_side]
+        payload, mime_type = self.payload_for(provider_type)
+        encoded = (base64.b64encode(payload).decode('utf-8'), mime_type)
+        with self._lock:
+            self._payloads_base64[max_side] = encoded
+        return encoded
+
+
+def _encode_for_vision(image: Image.Image, max_side: int) -> Tuple[bytes, str]:
+    """Уменьшение до max_side, градации серого и JPEG/WebP кодирование"""
+    # Фото с телефона: применяем EXIF ориентацию до уменьшения
+    image = ImageOps.exif_transpose(image)
+    if VISION_GRAYSCALE:
+        image = image.convert('L')
+    elif image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if VISION_IMAGE_FORMAT == 'webp':
+        image.save(buffer, format='WEBP', quality=VISION_IMAGE_QUALITY, method=4)
+        return buffer.getvalue(), 'image/webp'
+    image.save(buffer, format='JPEG', quality=VISION_IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue(), 'image/jpeg'
+
+
+def vision_payload_for(image, provider_type: str) -> Tuple[bytes, str]:
+    """Байты изображения для провайдера LLM Vision (VisionImage переиспользует кэш запроса)"""
+    if not isinstance(image, VisionImage):
+        image = VisionImage(image)
+    return image.payload_for(provider_type)
+
+
+def vision_payload_base64_for(image, provider_type: str) -> Tuple[str, str]:
+    """Изображение в base64 для провайдера LLM Vision (VisionImage переиспользует кэш запроса)"""
+    if not isinstance(image, VisionImage):
+        image = VisionImage(image)
+    return image.payload_base64_for(provider_type)